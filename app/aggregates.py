@@ -0,0 +1,237 @@
+import numpy as np
+import pandas as pd
+from data_loader import memoize_on_version, resolve
+from bitsets import pack, popcount, and_counts
+from schema import QUESTIONS, MULTI_SELECT
+
+# respondent attributes every aggregate is broken down by (besides 'All')
+GROUPINGS = ['source', 'fleet_type']
+
+
+def group_indicators(data, groupings):
+    #for each row, its column in the respondent x group one-hot matrix for every grouping
+    #(-1 when missing); column 0 is 'All'. also returns the (by, group) labels of the columns
+    index = [('All', 'All')]
+    positions = []
+    for by in groupings:
+        codes, levels = pd.factorize(data[by], sort = True)
+        positions.append(np.where(codes >= 0, codes + len(index), -1))
+        index += [(by, str(level)) for level in levels]
+    positions = np.column_stack(positions) if positions else np.empty((len(data), 0), dtype = int)
+    return positions, pd.MultiIndex.from_tuples(index, names = ['by', 'group'])
+
+
+@memoize_on_version
+def packed_block(data, block):
+    #bitsets of a multi-select question, one row of words per item: who picked it and who
+    #answered. 2 bits per answer, against 8 (int8) or 32 (float32) in the table
+    columns, positions = resolve(data, block)
+    x = [data.iloc[:, p].to_numpy() for p in positions]
+    return columns, pack(np.vstack([c == 1 for c in x])), pack(np.vstack([~pd.isna(c) for c in x]))
+
+
+@memoize_on_version
+def _groups(data):
+    return group_indicators(data, [g for g in GROUPINGS if g in data.columns])
+
+
+@memoize_on_version
+def _group_bits(data):
+    #bitset of every group of _groups, 'All' first
+    positions, groups = _groups(data)
+    return pack(np.vstack([np.ones(len(data), dtype = bool)]
+                          + [(positions == g).any(axis = 1) for g in range(1, len(groups))]))
+
+
+def _merged_groups(old, new):
+    #union of two group indexes in group_indicators order: 'All', then each grouping's levels sorted
+    groups = old.append(new.difference(old, sort = False))
+    by = list(dict.fromkeys(groups.get_level_values('by')))
+    return pd.MultiIndex.from_tuples(sorted(groups, key = lambda g: (by.index(g[0]), g[0] != 'All', g[1])),
+                                     names = groups.names)
+
+
+def _merge_cube(old, new):
+    #block_cube of a table extended by new rows, from the cubes of the old table and the new rows
+    groups = _merged_groups(old['size'].index, new['size'].index)
+    return {k: old[k].reindex(groups, fill_value = 0) + new[k].reindex(groups, fill_value = 0)
+            for k in ('count', 'answered', 'size')}
+
+
+@memoize_on_version(merge = _merge_cube)
+def block_cube(data, block):
+    #counts, number of respondents who answered, and group sizes for one multi-select
+    #question, for all respondents and by each grouping in GROUPINGS
+    _, groups = _groups(data)
+    bits = _group_bits(data)
+    q, picked, answered = packed_block(data, block)
+    counts, answered = and_counts(bits, picked), and_counts(bits, answered)
+    size = pd.Series(popcount(bits), index = groups)
+    return {'count': pd.DataFrame(counts, index = groups, columns = q),
+            'answered': pd.DataFrame(answered, index = groups, columns = q),
+            'size': size}
+
+
+def build_cube(data):
+    #aggregate cube of every multi-select question present in data
+    return {q.key: block_cube(data, q.key) for q in QUESTIONS.values()
+            if q.kind == MULTI_SELECT and resolve(data, q.key)[0]}
+
+
+def block_shares(data, block, by = 'source', denominator = 'size'):
+    #percentage of each group selecting each item of a block, looked up in the cube.
+    #denominator 'size' uses every respondent of the group, 'answered' only those with an answer
+    b = block_cube(data, block)
+    counts = b['count'].loc[by]
+    if denominator == 'size':
+        return 100*counts.div(b['size'].loc[by], axis = 0)
+    return 100*counts/b[denominator].loc[by]
+
+
+def _merge_levels(old, new):
+    #level_counts of a table extended by new rows, from the old table's and the new rows' counts
+    groups = _merged_groups(old['groups'], new['groups'])
+    counts = np.zeros((len(groups),) + old['counts'].shape[1:], dtype = 'int64')
+    for part in (old, new):
+        counts[groups.get_indexer(part['groups'])] += part['counts']
+    return dict(old, groups = groups, counts = counts)
+
+
+@memoize_on_version(merge = _merge_levels)
+def level_counts(data, key, chunk = 1 << 16):
+    #group x item x level counts of a coded question (Likert, single-choice or rank), in one
+    #bincount over combined (group, item, level) indices. codes not registered for the
+    #question and missing answers are skipped
+    positions, groups = _groups(data)
+    columns, column_positions = resolve(data, key)
+    levels = list(QUESTIONS[key].codes)
+    m, n_levels = len(columns), len(levels)
+    lookup = np.full(max(levels) + 1, -1)
+    lookup[levels] = np.arange(n_levels)
+    items = np.arange(m)
+
+    answers = data.iloc[:, column_positions]
+    counts = np.zeros(len(groups)*m*n_levels, dtype = 'int64')
+    for start in range(0, len(data), chunk):
+        x = answers.iloc[start:start + chunk].to_numpy(dtype = float)
+        valid = ~np.isnan(x) & (x >= 0) & (x < len(lookup))
+        level = np.where(valid, lookup[np.where(valid, x, 0).astype(int)], -1)
+        valid &= level >= 0
+
+        pos = positions[start:start + chunk]
+        for p in [np.zeros(len(x), dtype = int)] + list(pos.T):
+            keep = valid & (p >= 0)[:, None]
+            index = (p[:, None]*m + items)*n_levels + level
+            counts += np.bincount(index[keep], minlength = len(counts))
+
+    return {'groups': groups, 'items': columns, 'levels': levels,
+            'counts': counts.reshape(len(groups), m, n_levels)}
+
+
+@memoize_on_version(merge = _merge_levels)
+def rank_pairs(data, key, chunk = 1 << 16):
+    #group x item x item counts of respondents ranking one item above another for a rank
+    #question: item i is above item j when i is ranked and j is ranked lower or not at all.
+    #one bincount over combined (group, i, j) indices, as in level_counts
+    positions, groups = _groups(data)
+    columns, column_positions = resolve(data, key)
+    m = len(columns)
+    pairs = np.arange(m*m)
+
+    answers = data.iloc[:, column_positions]
+    counts = np.zeros(len(groups)*m*m, dtype = 'int64')
+    for start in range(0, len(data), chunk):
+        x = answers.iloc[start:start + chunk].to_numpy(dtype = float)
+        x[~np.isin(x, list(QUESTIONS[key].codes))] = np.inf
+        above = (x[:, :, None] < x[:, None, :]).reshape(len(x), m*m)
+
+        pos = positions[start:start + chunk]
+        for p in [np.zeros(len(x), dtype = int)] + list(pos.T):
+            keep = above & (p >= 0)[:, None]
+            counts += np.bincount((p[:, None]*m*m + pairs)[keep], minlength = len(counts))
+
+    return {'groups': groups, 'items': columns, 'counts': counts.reshape(len(groups), m, m)}
+
+
+@memoize_on_version
+def answer_indicators(data, key):
+    #per-respondent 0/1 matrix whose column sums are the counts behind a question's
+    #percentages, and its columns for each item: picked and answered for multi-select
+    #questions, one per level for coded ones (codes not registered and missing answers
+    #give zeros)
+    columns, positions = resolve(data, key)
+    x = data.iloc[:, positions].to_numpy(dtype = float)
+    m = len(columns)
+    if QUESTIONS[key].kind == MULTI_SELECT:
+        y = np.hstack([x == 1, ~np.isnan(x)]).astype('int8')
+        return columns, None, y, [np.array([j, m + j]) for j in range(m)]
+
+    levels = list(QUESTIONS[key].codes)
+    lookup = np.full(max(levels) + 1, -1)
+    lookup[levels] = np.arange(len(levels))
+    valid = ~np.isnan(x) & (x >= 0) & (x < len(lookup))
+    level = np.where(valid, lookup[np.where(valid, x, 0).astype(int)], -1)
+    y = np.zeros((len(x), m, len(levels)), dtype = 'int8')
+    rows, items = np.nonzero(level >= 0)
+    y[rows, items, level[rows, items]] = 1
+    return columns, levels, y.reshape(len(x), -1), [j*len(levels) + np.arange(len(levels)) for j in range(m)]
+
+
+@memoize_on_version
+def group_rows(data, by):
+    #labels of the groups of a respondent attribute (see schema.BREAKDOWNS) and the rows of
+    #each, found once per dataset version so queries index rows instead of masking the table.
+    #coded attributes keep their registered groups in display order; multi-select ones put a
+    #respondent in every group picked
+    q = QUESTIONS[by]
+    columns, positions = resolve(data, by)
+    if q.kind == MULTI_SELECT:
+        shown = [(c, p) for c, p in zip(columns, positions) if c in q.labels]
+        return ([q.labels[c] for c, _ in shown],
+                [np.flatnonzero(data.iloc[:, p].to_numpy() == 1) for _, p in shown])
+
+    codes, levels = pd.factorize(data.iloc[:, positions[0]])
+    order = np.argsort(codes, kind = 'stable')
+    sizes = np.bincount(codes[codes >= 0], minlength = len(levels))
+    found = dict(zip(levels, np.split(order[(codes < 0).sum():], np.cumsum(sizes)[:-1])))
+    groups = [(label, found[code]) for code, label in q.codes.items() if code in found]
+    return [str(label).replace('<br>', ' ') for label, _ in groups], [rows for _, rows in groups]
+
+
+@memoize_on_version
+def group_bits(data, by):
+    #bitsets of the groups of group_rows(data, by)
+    rows = group_rows(data, by)[1]
+    mask = np.zeros((len(rows), len(data)), dtype = bool)
+    for g, r in enumerate(rows):
+        mask[g, r] = True
+    return pack(mask)
+
+
+@memoize_on_version
+def crosstab(data, question, by, denominator = 'size'):
+    #percentage of each group of a respondent attribute giving each answer to a question:
+    #group x item for multi-select questions (denominator 'size': every respondent of the
+    #group, 'answered': those who answered), group x (item, answer) for coded questions
+    #(shares of the registered answers to each item)
+    q = QUESTIONS[question]
+    labels, rows = group_rows(data, by)
+
+    with np.errstate(invalid = 'ignore', divide = 'ignore'):
+        if q.kind == MULTI_SELECT:
+            #popcount(group & item) over the bitsets of the groups and of the question
+            bits = group_bits(data, by)
+            columns, picked, answered = packed_block(data, question)
+            base = popcount(bits)[:, None] if denominator == 'size' else and_counts(bits, answered)
+            shares = pd.DataFrame(100*and_counts(bits, picked)/base, columns = columns)[q.shown()].rename(columns = q.labels)
+        else:
+            columns, levels, y, _ = answer_indicators(data, question)
+            m = len(columns)
+            totals = np.array([y[r].sum(axis = 0) for r in rows]).reshape(len(rows), y.shape[1])
+            t = totals.reshape(len(rows), m, len(levels))
+            shares = pd.DataFrame((100*t/t.sum(axis = 2, keepdims = True)).reshape(len(rows), -1),
+                                  columns = pd.MultiIndex.from_product([[q.labels.get(c, c) for c in columns],
+                                                                        [q.codes[l] for l in levels]],
+                                                                       names = [q.title or 'item', 'answer']))
+    shares.index = pd.Index(labels, name = QUESTIONS[by].title or by)
+    return shares
@@ -0,0 +1,289 @@
+"""Survey aggregates over HTTP, for tools that do not run the dashboard.
+
+A small threaded HTTP server, on localhost by default, answers GET requests with JSON built
+by data_processing and aggregates, the same functions (and memoized results) as the pages:
+
+    /v1/waves                      survey waves, latest last
+    /v1/questions                  registered questions: kind, title, items, answer codes
+    /v1/crosstab/<question>        percentage of each group giving each answer (multi-select,
+                                   Likert, single-choice and rank questions)
+                                   (?by=source|fleet_type|..., ?denominator=size|answered)
+    /v1/likert/<question>          Likert distribution of one group (?source=All|...)
+    /v1/ranks/<question>           rank shares, mean ranks, Borda shares and pairwise
+                                   preferences of one group (?source=All|...)
+
+Aggregate endpoints take ?wave= (the latest by default). Responses carry an ETag, a hash of
+their content: a request whose If-None-Match lists it gets 304 Not Modified and no body.
+Responses are cached in memory for the dataset version they were built from and rebuilt
+once the wave's file changes.
+
+    python app/api.py --port 8600
+    curl -i 'localhost:8600/v1/crosstab/barriers?by=fleet_type'
+"""
+import os
+import sys
+import json
+import math
+import hashlib
+import inspect
+import argparse
+import threading
+from collections import OrderedDict
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlsplit, parse_qsl
+import numpy as np
+import pandas as pd
+from data_loader import load_wave, waves, frame_version
+from aggregates import GROUPINGS, crosstab, level_counts
+from data_processing import likert_data, rank_summary
+from schema import QUESTIONS, BREAKDOWNS, MULTI_SELECT, LIKERT, SINGLE_CHOICE, RANK, columns_for
+
+#bytes of response bodies kept in memory; MHDV_API_CACHE_BYTES overrides it
+API_CACHE_BYTES = int(os.environ.get("MHDV_API_CACHE_BYTES", 16 << 20))
+
+_RESPONSES = OrderedDict()
+_LOCK = threading.Lock()
+_STATS = {'hits': 0, 'misses': 0, 'evictions': 0, 'bytes': 0}
+
+
+class ApiError(Exception):
+    """A request the API cannot answer, with its HTTP status."""
+
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+def _plain(value):
+    #JSON-ready copy of an aggregate: arrays as lists, missing numbers as null
+    if isinstance(value, np.ndarray):
+        return _plain(value.tolist())
+    if isinstance(value, (list, tuple, pd.Index)):
+        return [_plain(v) for v in value]
+    if isinstance(value, dict):
+        return {str(k): _plain(v) for k, v in value.items()}
+    if isinstance(value, np.generic):
+        value = value.item()
+    if isinstance(value, float) and not math.isfinite(value):
+        return None
+    return value
+
+
+def _question(key, kinds = None):
+    if key not in QUESTIONS:
+        raise ApiError(404, f'no question {key!r}')
+    if kinds and QUESTIONS[key].kind not in kinds:
+        raise ApiError(404, f'{key!r} is a {QUESTIONS[key].kind} question')
+    return QUESTIONS[key]
+
+
+def _group(groups, source):
+    #position of a source (or 'All') in an aggregate's group index
+    group = ('All', 'All') if source == 'All' else ('source', source)
+    if group not in groups:
+        raise ApiError(400, f'no group {source!r}')
+    return groups.get_loc(group)
+
+
+def crosstab_view(data, question, by = 'source', denominator = 'size'):
+    q = _question(question, (MULTI_SELECT, LIKERT, SINGLE_CHOICE, RANK))
+    if question in GROUPINGS:
+        #respondent attributes the survey is grouped by hold labels, not answer codes
+        raise ApiError(404, f'{question!r} is a grouping, not a question to break down')
+    if by not in BREAKDOWNS:
+        raise ApiError(400, f'by must be one of {", ".join(BREAKDOWNS)}')
+    if denominator not in ('size', 'answered'):
+        raise ApiError(400, 'denominator must be size or answered')
+    shares = crosstab(data, question, by, denominator)
+    return {'question': question, 'title': q.title, 'by': by, 'denominator': denominator,
+            'groups': list(shares.index), 'columns': list(shares.columns),
+            'percentages': shares.to_numpy(dtype = float)}
+
+
+def likert_view(data, question, source = 'All'):
+    _question(question, (LIKERT,))
+    _group(level_counts(data, question)['groups'], source)
+    xdata, ydata, levels = likert_data(data, question, source)
+    return {'question': question, 'source': source, 'items': ydata, 'levels': levels, 'percentages': xdata}
+
+
+def ranks_view(data, question, source = 'All'):
+    q = _question(question, (RANK,))
+    r = rank_summary(data, question)
+    g = _group(r['groups'], source)
+    return {'question': question, 'source': source, 'items': [q.labels.get(i, i) for i in r['items']],
+            'ranks': [q.codes[l] for l in r['levels']], 'respondents': r['ranked'][g],
+            'percentages': r['shares'][g], 'mean_rank': r['mean_rank'][g], 'borda': r['borda'][g],
+            'pairwise': r['pairwise'][g]}
+
+
+#aggregate endpoints: view(data, question, **query) and the questions besides the
+#requested one it reads
+VIEWS = {'crosstab': (crosstab_view, lambda query: [query.get('by', 'source')]),
+         'likert': (likert_view, lambda query: []),
+         'ranks': (ranks_view, lambda query: [])}
+
+
+def questions_view():
+    return {'questions': [{'key': q.key, 'kind': q.kind, 'title': q.title,
+                           'items': [{'column': c, 'label': q.labels.get(c)} for c in q.columns],
+                           'codes': [{'code': code, 'label': label} for code, label in q.codes.items()]}
+                          for q in QUESTIONS.values()]}
+
+
+def _body(payload):
+    return json.dumps(_plain(payload), allow_nan = False).encode()
+
+
+def _etag(body):
+    return '"' + hashlib.sha256(body).hexdigest()[:32] + '"'
+
+
+def _store(key, entry):
+    #insert as most recently used, then evict the least recently used past the byte budget
+    size = len(entry[1])
+    if size > API_CACHE_BYTES:
+        return
+    if key in _RESPONSES:
+        _STATS['bytes'] -= len(_RESPONSES.pop(key)[1])
+    _RESPONSES[key] = entry
+    _STATS['bytes'] += size
+    while _STATS['bytes'] > API_CACHE_BYTES:
+        _, old = _RESPONSES.popitem(last = False)
+        _STATS['bytes'] -= len(old[1])
+        _STATS['evictions'] += 1
+
+
+def aggregate_response(endpoint, question, query):
+    #(body, etag, dataset version) of an aggregate endpoint, from the response cache when
+    #it holds one built from the current version of the wave
+    view, extra = VIEWS[endpoint]
+    query = dict(query)
+    names = waves()
+    wave = query.pop('wave', names[-1])
+    unknown = set(query) - set(list(inspect.signature(view).parameters)[2:])
+    if unknown:
+        raise ApiError(400, f'unknown parameters for {endpoint}: {", ".join(sorted(unknown))}')
+    if wave not in names:
+        raise ApiError(404, f'no survey wave {wave!r}')
+    _question(question)
+    columns = [c for c in extra(query) if c in QUESTIONS]
+    data = load_wave(wave, columns_for(*GROUPINGS, question, *columns))
+    version = frame_version(data)
+    key = (wave, endpoint, question, tuple(sorted(query.items())))
+    with _LOCK:
+        entry = _RESPONSES.get(key)
+        if entry is not None and entry[0] == version:
+            _RESPONSES.move_to_end(key)
+            _STATS['hits'] += 1
+            return entry[1], entry[2], version
+        #responses built from an older version of the wave are stale
+        for k in [k for k, e in _RESPONSES.items() if k[0] == wave and e[0] != version]:
+            _STATS['bytes'] -= len(_RESPONSES.pop(k)[1])
+
+    payload = view(data, question, **query)
+    body = _body(dict(payload, wave = wave, dataset_version = version))
+    etag = _etag(body)
+    with _LOCK:
+        _STATS['misses'] += 1
+        _store(key, (version, body, etag))
+    return body, etag, version
+
+
+def respond(path):
+    #(status, body, etag, dataset version) of a GET request path
+    url = urlsplit(path)
+    parts = [p for p in url.path.split('/') if p]
+    query = dict(parse_qsl(url.query))
+    if parts == ['v1', 'waves']:
+        body = _body({'waves': waves()})
+        return 200, body, _etag(body), None
+    if parts == ['v1', 'questions']:
+        body = _body(questions_view())
+        return 200, body, _etag(body), None
+    if len(parts) == 3 and parts[0] == 'v1' and parts[1] in VIEWS:
+        return (200, *aggregate_response(parts[1], parts[2], query))
+    raise ApiError(404, f'no endpoint {url.path}')
+
+
+def _matches(etag, header):
+    #whether an If-None-Match header lists etag (weak comparison, as for GET)
+    if header is None:
+        return False
+    tags = [t.strip() for t in header.split(',')]
+    return '*' in tags or etag in [t[2:] if t.startswith('W/') else t for t in tags]
+
+
+class Handler(BaseHTTPRequestHandler):
+    server_version = 'mhdv-api/1'
+    protocol_version = 'HTTP/1.1'
+    quiet = False
+
+    def _send(self, head_only):
+        try:
+            status, body, etag, version = respond(self.path)
+        except ApiError as e:
+            status, body, etag, version = e.status, _body({'error': str(e)}), None, None
+        except Exception as e:
+            self.log_error('%s failed: %r', self.path, e)
+            status, body, etag, version = 500, _body({'error': 'internal error'}), None, None
+        if etag is not None and _matches(etag, self.headers.get('If-None-Match')):
+            status, body = 304, b''
+        self.send_response(status)
+        if status != 304:
+            self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        if etag is not None:
+            self.send_header('ETag', etag)
+            #clients may keep responses but must check them again (a 304 is cheap)
+            self.send_header('Cache-Control', 'no-cache')
+        if version is not None:
+            self.send_header('X-Dataset-Version', version)
+        self.end_headers()
+        if not head_only:
+            self.wfile.write(body)
+
+    def do_GET(self):
+        self._send(False)
+
+    def do_HEAD(self):
+        self._send(True)
+
+    def log_message(self, format, *args):
+        if not self.quiet:
+            super().log_message(format, *args)
+
+
+def cache_info():
+    with _LOCK:
+        return dict(_STATS, entries = len(_RESPONSES), budget = API_CACHE_BYTES)
+
+
+def clear_response_cache():
+    with _LOCK:
+        _RESPONSES.clear()
+        _STATS.update(hits = 0, misses = 0, evictions = 0, bytes = 0)
+
+
+def make_server(host = '127.0.0.1', port = 8600, quiet = False):
+    #the API server, not started; requests are served on their own threads
+    handler = type('Handler', (Handler,), {'quiet': quiet})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    return server
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1", help="address to listen on (default: localhost only)")
+    parser.add_argument("--port", type=int, default=8600)
+    parser.add_argument("--quiet", action="store_true", help="do not log requests")
+    args = parser.parse_args()
+    server = make_server(args.host, args.port, args.quiet)
+    print(f"serving survey aggregates on http://{args.host}:{server.server_address[1]}/v1/", file=sys.stderr)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
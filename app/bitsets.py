@@ -0,0 +1,37 @@
+"""Packed 0/1 respondent columns: one bit per respondent, 64 per uint64 word.
+
+A one-hot answer column or a group of respondents becomes a row of words, and the number
+of respondents in a group who picked an item is popcount(group & item), summed over the
+words. Counting uses np.bitwise_count where NumPy provides it (2.0+) and a byte lookup
+table otherwise.
+"""
+import numpy as np
+
+_BYTE_COUNTS = np.array([bin(i).count('1') for i in range(256)], dtype = 'uint8')
+
+
+def pack(mask):
+    #bitset words of a boolean vector, or of each row of a boolean matrix (rows x words)
+    mask = np.atleast_2d(np.asarray(mask, dtype = bool))
+    bits = np.packbits(mask, axis = -1, bitorder = 'little')
+    pad = -bits.shape[-1] % 8
+    if pad:
+        bits = np.pad(bits, [(0, 0), (0, pad)])
+    return np.ascontiguousarray(bits).view('<u8')
+
+
+def popcount(words):
+    #number of set bits in each row of bitset words (summed over the last axis)
+    if hasattr(np, 'bitwise_count'):
+        return np.bitwise_count(words).sum(axis = -1, dtype = 'int64')
+    words = np.ascontiguousarray(words)
+    return _BYTE_COUNTS[words.view('uint8')].sum(axis = -1, dtype = 'int64')
+
+
+def and_counts(a, b, chunk = 1 << 12):
+    #popcount(a[i] & b[j]) for every pair of rows of two bitset matrices. words are
+    #processed in chunks to bound the size of the intermediate AND
+    counts = np.zeros((len(a), len(b)), dtype = 'int64')
+    for start in range(0, a.shape[1], chunk):
+        counts += popcount(a[:, None, start:start + chunk] & b[None, :, start:start + chunk])
+    return counts
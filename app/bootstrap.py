@@ -0,0 +1,96 @@
+"""Bootstrap confidence intervals of the percentages the pages report.
+
+Respondents are resampled within each group (all respondents, each source, each fleet
+type), so every group keeps its size. Each percentage depends on the answers to one
+item only, and all that matters of a respondent is their answer pattern to it: resampling
+n respondents is the same as drawing multinomial counts of the item's few distinct
+patterns. All replicates of a group and item are then one (replicates x patterns) weight
+matrix W, and the replicate counts are W @ Y, with Y the patterns' answer indicators.
+Large jobs are split into shards of replicates run in worker processes. Results are
+memoized per dataset version.
+"""
+import os
+import warnings
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+from data_loader import memoize_on_version
+from aggregates import GROUPINGS, group_indicators, answer_indicators
+
+#bootstrap replicates per group; MHDV_BOOTSTRAP_REPLICATES overrides it
+N_BOOT = int(os.environ.get("MHDV_BOOTSTRAP_REPLICATES", 1000))
+#replicates drawn per shard, and the size (replicates x patterns x counts) from which
+#shards go to worker processes instead of running in this one. the size depends on the
+#answer patterns, not on the number of respondents: the rank questions of the survey
+#exceed the default. MHDV_BOOTSTRAP_POOL_THRESHOLD overrides it
+SHARD = 250
+POOL_THRESHOLD = int(os.environ.get("MHDV_BOOTSTRAP_POOL_THRESHOLD", 1 << 19))
+
+
+def _patterns(codes, width):
+    #distinct answer patterns (as 0/1 rows of `width` columns) among bit-coded rows, and
+    #how many respondents have each
+    counts = np.bincount(codes, minlength = 1 << width)
+    present = np.flatnonzero(counts)
+    return ((present[:, None] >> np.arange(width)) & 1).astype(float), counts[present]
+
+
+def _replicate_counts(task):
+    #column sums of y for `reps` bootstrap resamples of n respondents (runs in a worker
+    #process for large jobs). patterns are drawn with their observed frequencies
+    patterns, counts, reps, seed = task
+    n = counts.sum()
+    weights = np.random.default_rng(seed).multinomial(n, counts/n, size = reps)
+    return weights @ patterns
+
+
+@memoize_on_version
+def bootstrap_counts(data, key, n_boot = N_BOOT, seed = 0):
+    #group x replicate x column counts of answer_indicators(data, key) over n_boot
+    #resamples of each group's respondents
+    positions, groups = group_indicators(data, [g for g in GROUPINGS if g in data.columns])
+    columns, levels, y, blocks = answer_indicators(data, key)
+    members = [np.arange(len(data))] + [np.flatnonzero((positions == g).any(axis = 1)) for g in range(1, len(groups))]
+    codes = [y[:, cols].astype('int64') @ (1 << np.arange(len(cols))) for cols in blocks]
+
+    tasks, shards = [], []
+    for g, rows in enumerate(members):
+        if not len(rows):
+            continue
+        for j, cols in enumerate(blocks):
+            patterns, counts = _patterns(codes[j][rows], len(cols))
+            for i, start in enumerate(range(0, n_boot, SHARD)):
+                tasks.append((patterns, counts, min(SHARD, n_boot - start), [seed, g, j, i]))
+                shards.append((g, cols, start))
+
+    totals = np.full((len(groups), n_boot, y.shape[1]), np.nan)
+    work = sum(t[2]*t[0].size for t in tasks)
+    if work > POOL_THRESHOLD and len(tasks) > 1:
+        with ProcessPoolExecutor() as pool:
+            results = list(pool.map(_replicate_counts, tasks))
+    else:
+        results = map(_replicate_counts, tasks)
+    for (g, cols, start), counts in zip(shards, results):
+        totals[g][start:start + len(counts), cols] = counts
+    return {'groups': groups, 'items': columns, 'levels': levels, 'totals': totals,
+            'size': np.array([len(rows) for rows in members])}
+
+
+def share_intervals(data, key, level = 0.95, denominator = 'size', n_boot = N_BOOT):
+    #percentile bootstrap interval (low, high) of every percentage of a question, per group:
+    #group x item for multi-select questions (denominator 'size': every respondent of the
+    #group, 'answered': those who answered), group x item x level for coded questions
+    #(shares of the registered answers to each item)
+    b = bootstrap_counts(data, key, n_boot)
+    totals, m = b['totals'], len(b['items'])
+    with np.errstate(invalid = 'ignore', divide = 'ignore'):
+        if b['levels'] is None:
+            picked, answered = totals[..., :m], totals[..., m:]
+            #resampling within groups keeps their sizes
+            shares = 100*picked/(b['size'][:, None, None] if denominator == 'size' else answered)
+        else:
+            t = totals.reshape(totals.shape[:2] + (m, len(b['levels'])))
+            shares = 100*t/t.sum(axis = 3, keepdims = True)
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', RuntimeWarning)
+        low, high = np.nanpercentile(shares, [50*(1 - level), 50*(1 + level)], axis = 1)
+    return {'groups': b['groups'], 'items': b['items'], 'levels': b['levels'], 'low': low, 'high': high}
@@ -0,0 +1,478 @@
+import inspect
+from dataclasses import dataclass
+import pandas as pd
+import plotly.express as px
+import plotly.graph_objects as go
+from data_loader import INNOVATION_PATH, load_wave, waves, frame_version, file_version
+from data_processing import (likert_data, scatter_comparison_data, timeline_data, ranking_data, rank_distribution_data,
+                             role_data, fleet_size_data, composition_data, purchase_markets_data)
+from aggregates import block_shares, crosstab, group_rows
+from schema import QUESTIONS, BREAKDOWNS, columns_for
+from figures import stacked_bars, error_bars, COLORS_LIKERT_3, COLORS_LIKERT_4, COLORS_RANK_5
+from figure_cache import cached_figure
+
+SOURCES = ['Fleet managers', 'Owner-Operators', 'Other']
+#multi-select group states, the page default first
+COMPARED = [['Fleet managers', 'Owner-Operators'], ['Fleet managers'], ['Owner-Operators'], []]
+#states of the comparison charts: the source groups above, then all groups of each other attribute
+COMPARISONS = tuple({'groups': g} for g in COMPARED) + tuple({'groups': None, 'by': b} for b in BREAKDOWNS[1:])
+
+
+@dataclass(frozen = True, eq = False)
+class Chart:
+    page: str
+    key: str
+    build: object          # build(data, **widgets) -> plotly figure
+    questions: tuple = ()  # registered questions the chart reads from the survey table
+    states: tuple = ({},)  # every combination of widget values the page offers
+    path: str = None       # file the chart reads instead of the survey table
+
+    @property
+    def intervals(self):
+        #whether build takes intervals = True (95% bootstrap confidence intervals)
+        return 'intervals' in inspect.signature(self.build).parameters
+
+
+# page 1: respondent and company overview
+
+def current_role_chart(data):
+    d = role_data(data)
+    return px.bar(d, x='current_role', y='count', color = 'current_role', labels = {'count' : 'Percentage of respondents', 'current_role': 'Current role'}, template = 'ggplot2')
+
+
+def fleet_size_chart(data):
+    d = fleet_size_data(data)
+    return px.bar(d, x='fleet_size', y='proportion', labels = {'proportion' : 'Percentage of fleet managers', 'fleet_size': 'Fleet size'},
+                  template = 'ggplot2', width=900, height=400)
+
+
+def regions_chart(data, source = 'All'):
+    d_regions = block_shares(data, 'regions', 'All' if source == 'All' else 'source').loc[source]
+    d_regions = d_regions.rename_axis('region').reset_index(name = 'proportion')
+    d_regions = d_regions.replace(QUESTIONS['regions'].labels)
+    colors = px.colors.sequential.Sunset_r
+
+    f = px.bar(d_regions, x='region', y='proportion', labels = {'proportion' : 'Percentage of respondents', 'region': 'Region of operations'},
+                 template = 'ggplot2', width=900, height=400, color_discrete_sequence = colors)
+    f.update_layout(title = dict(text = f'Region of operations: {source}', x = 0))
+    return f
+
+
+def vocations_chart(data, source = 'All'):
+    d_fv = block_shares(data, 'vocations', 'All' if source == 'All' else 'source').loc[source]
+    d_fv = d_fv.rename_axis('fleet_vocation').reset_index(name = 'proportion')
+    d_fv['fleet_vocation'] = d_fv['fleet_vocation'].replace(QUESTIONS['vocations'].labels)
+    colors = px.colors.sequential.Sunset_r
+
+    f = px.bar(d_fv, x='fleet_vocation', y='proportion', labels = {'proportion' : 'Percentage of respondents', 'fleet_vocation': 'Fleet vocation'},
+                 template = 'ggplot2', width=900, height=400, color_discrete_sequence = colors[1:])
+    f.update_layout(title = dict(text = f'Fleet vocation: {source}', x = 0))
+    return f
+
+
+def composition_chart(data, source = 'Fleet managers', fleet_size = 'Less than 100 vehicles'):
+    colors = px.colors.sequential.Sunset_r
+    if source == 'Fleet managers':
+        fleet_types = {label: typ for typ, label in QUESTIONS['fleet_type'].codes.items()}
+        d = composition_data(data, fleet_types[fleet_size])
+
+        f = px.bar(d, x='veh_char', y='average', labels = {'veh_char' : 'Vehicle characteristics',
+                                                           'average': 'Average proportion of fleet'},
+                        template = 'ggplot2',
+                        width=900, height=400,
+                        color_discrete_sequence = colors[2:],
+                        range_y = [0,80]
+                        )
+        f.update_layout(title = dict(text = f'Fleet composition: {source} ({fleet_size})', x = 0))
+    else:
+        d = block_shares(data, 'oo_veh_char', 'source').loc[source, QUESTIONS['oo_veh_char'].shown()]
+        d = d.rename_axis('veh_char').reset_index(name = 'percentage').replace(QUESTIONS['oo_veh_char'].labels)
+        f = px.bar(d, x='veh_char', y='percentage', labels = {'veh_char' : 'Vehicle characteristics', 'percentage': 'Percentage of respondents'},
+                 template = 'ggplot2', width=900, height=400, color_discrete_sequence = colors[2:])
+        f.update_layout(title = dict(text = f'Fleet composition: {source}', x = 0))
+    return f
+
+
+# pages 2 and 3: turnover practices and fleet renewal
+
+def comparison_chart(data, question, groups, title, margin, height, template = 'ggplot2', intervals = False,
+                     by = 'source'):
+    #share of fleet managers and owner-operators picking each item of a multi-select question,
+    #with 95% bootstrap intervals when asked. with `by`, share of the selected groups of any
+    #other respondent attribute instead
+    if by != 'source':
+        return breakdown_chart(data, question, groups, by, title, margin, height, template)
+    df = scatter_comparison_data(data, question, intervals = intervals)
+    column = QUESTIONS[question].title
+    fig = go.Figure()
+
+    def errors(source):
+        if not intervals:
+            return {}
+        return {'error_x': error_bars(df[source], (df[f'{source} low'], df[f'{source} high']),
+                                      color='rgb(102, 102, 102)', thickness=1, width=4)}
+
+    if 'Fleet managers' in groups:
+        fig.add_trace(go.Scatter(
+            x=list(df['Fleet managers']),
+            y=list(df[column]),
+            name='Fleet managers',
+            marker=dict(
+                color='rgb(102, 102, 102)',
+                line_color='rgba(156, 165, 196, 1.0)',
+            ),
+            **errors('Fleet managers')
+        ))
+    if 'Owner-Operators' in groups:
+        fig.add_trace(go.Scatter(
+            x=list(df['Owner-Operators']),
+            y=list(df[column]),
+            name='Owner-operators',
+            marker=dict(
+                color='rgba(204, 204, 204, 0.95)',
+                line_color='rgba(217, 217, 217, 1.0)'
+            ),
+            **errors('Owner-Operators')
+        ))
+
+    fig.update_traces(mode='markers', marker=dict(line_width=1, symbol='circle', size=16))
+    fig.update_layout(
+        title=dict(text=title),
+        xaxis=dict(
+            showgrid=False,
+            showline=True,
+            linecolor='rgb(102, 102, 102)',
+            tickfont_color='rgb(102, 102, 102)',
+            showticklabels=True,
+            dtick=10,
+            ticks='outside',
+            tickcolor='rgb(102, 102, 102)',
+            title = 'Percentage of respondents'
+        ),
+        margin=margin,
+        legend=dict(
+            font_size=10,
+            orientation="h",
+            yanchor="bottom",
+            y=1.02,
+            xanchor="center",
+            x = 0.2
+        ),
+        width=800,
+        height=height,
+        paper_bgcolor='white',
+        plot_bgcolor='white',
+        hovermode='closest',
+    )
+    if template:
+        fig.update_layout(template = template)
+    return fig
+
+
+def breakdown_chart(data, question, groups, by, title, margin, height, template = 'ggplot2'):
+    #share of each selected group (all when groups is None) of a respondent attribute picking
+    #each item of a multi-select question, items ordered by their average share
+    df = crosstab(data, question, by).T
+    df = df.loc[df.mean(axis = 1).sort_values(kind = 'stable').index]
+    palette = px.colors.qualitative.Safe
+    fig = go.Figure([go.Scatter(
+        x=list(df[group]),
+        y=list(df.index),
+        name=group,
+        marker=dict(color=palette[i % len(palette)], line_color='white'),
+    ) for i, group in enumerate(df.columns) if groups is None or group in groups])
+
+    fig.update_traces(mode='markers', marker=dict(line_width=1, symbol='circle', size=14))
+    fig.update_layout(
+        title=dict(text=f'{title}<br><i>by {QUESTIONS[by].title.lower()}</i>'),
+        xaxis=dict(
+            showgrid=False,
+            showline=True,
+            linecolor='rgb(102, 102, 102)',
+            tickfont_color='rgb(102, 102, 102)',
+            showticklabels=True,
+            dtick=10,
+            ticks='outside',
+            tickcolor='rgb(102, 102, 102)',
+            title = 'Percentage of respondents'
+        ),
+        margin=margin,
+        legend=dict(font_size=10, orientation="h", yanchor="bottom", y=1.02, xanchor="center", x = 0.2),
+        width=800,
+        height=height,
+        paper_bgcolor='white',
+        plot_bgcolor='white',
+        hovermode='closest',
+    )
+    if template:
+        fig.update_layout(template = template)
+    return fig
+
+
+def priorities_chart(data, groups = (), intervals = False, by = 'source'):
+    return comparison_chart(data, 'turnover', groups, "Top priorities when evaluating fleet turnover options",
+                            dict(l=140, r=40, b=50, t=80), 600, intervals = intervals, by = by)
+
+
+def financial_chart(data, groups = (), intervals = False, by = 'source'):
+    return comparison_chart(data, 'financial', groups, "Primary cost and financial considerations influencing turnover decisions",
+                            dict(l=100, r=40, b=50, t=80), 650, template = None, intervals = intervals, by = by)
+
+
+def decision_tools_chart(data, source = 'Fleet managers', intervals = False):
+    xdata, ydata, top_labels, *errors = likert_data(data, "decision_tools", source = source, intervals = intervals)
+    return stacked_bars(xdata, ydata, top_labels, COLORS_LIKERT_3,
+                        title=dict(text=f"Use of tools to support fleet turnover decisions<br><i>{source}</i>"),
+                        height = 600, margin=dict(l=70, r=10, t=140, b=80), legend_y = 1.1,
+                        errors = errors[0] if errors else None)
+
+
+def replacement_chart(data):
+    replacement = QUESTIONS['replacement']
+    d = block_shares(data, 'replacement', 'All', denominator = 'answered').loc['All', replacement.shown()]
+    d = d.rename(replacement.labels)
+    d = d.rename_axis('Priorities').reset_index(name = 'Percentage').sort_values(by = 'Percentage', ascending = False)
+
+    f = px.bar_polar(
+        d,
+        r="Percentage",
+        theta="Priorities",
+        color="Percentage",
+        color_continuous_scale = px.colors.sequential.Sunset,
+        hover_name = 'Priorities',
+        hover_data = {'Priorities': False, 'Percentage': ':.1f'},
+        labels= {'Percentage': 'Percentage<br> of respondents'}
+        )
+
+    f.update_layout(
+        title = dict(text = 'Vehicles prioritized for replacement',
+                      y = 0.99, x = 0),
+        polar_hole=0.25,
+        height=500,
+        width=800,
+        margin=dict(b=50, t=60, l=50, r=0),
+        template = 'ggplot2',
+        polar = dict(radialaxis = dict(showticklabels = False, showline = False, ticks = ""))
+    )
+    f.update_coloraxes(colorbar_orientation='h', colorbar_y=-0.5)
+    return f
+
+
+def purchase_markets_chart(data, source = 'All'):
+    ds = purchase_markets_data(data, source)
+
+    f = px.bar_polar(
+        ds,
+        r="percentage",
+        theta="purchase_markets",
+        color="percentage",
+        color_continuous_scale = px.colors.sequential.Sunset,
+        hover_name = 'purchase_markets',
+        hover_data = {'purchase_markets': False, 'percentage': ':.1f'},
+        labels= {'percentage': 'Percentage of respondents', 'purchase_markets': 'Purchase markets'},
+        range_r = [0,80],
+        range_color = [0,60]
+        ).update_layout(
+        title = dict(text = f'Typical purchase markets: {source}',
+                      y = 0.99, x = 0),
+        polar_hole=0.25,
+        height=500,
+        width=800,
+        margin=dict(b=50, t=60, l=50, r=0),
+        template = 'ggplot2',
+        polar = dict(radialaxis = dict(showticklabels = False, showline = False, ticks = ""))
+        )
+    f.update_coloraxes(colorbar_orientation='h', colorbar_y=-0.5)
+    return f
+
+
+def replace_chart(data, intervals = False):
+    xdata, ydata, top_labels, *errors = timeline_data(data, "replace", intervals = intervals)
+    return stacked_bars(xdata, ydata, top_labels, COLORS_LIKERT_4,
+                        title=dict(text="Plans and timeline for replacing pre-2010 vehicles"), height = 400,
+                        errors = errors[0] if errors else None)
+
+
+def expand_chart(data, intervals = False):
+    xdata, ydata, top_labels, *errors = timeline_data(data, "expand", intervals = intervals)
+    return stacked_bars(xdata, ydata, top_labels, COLORS_LIKERT_4,
+                        title=dict(text="Plans and timeline for expanding fleet (Owner-operators)"),
+                        width = 750, height = 250, margin=dict(l=50, r=10, t=100, b=80), legend_y = 1.5,
+                        errors = errors[0] if errors else None)
+
+
+def innovation_chart(data, source = 'Fleet managers', intervals = False):
+    xdata, ydata, top_labels, *errors = likert_data(data, "innovation", source = source, intervals = intervals)
+    return stacked_bars(xdata, ydata, top_labels, COLORS_LIKERT_3,
+                        title=dict(text=f'Likelihood of pursuing fleet renewal strategies - {source}', x = 0),
+                        errors = errors[0] if errors else None)
+
+
+def rank_support_chart(data, source = 'All', intervals = False):
+    df = ranking_data(data, source, intervals = intervals)
+
+    plot = [go.Scatter(x = [QUESTIONS['rank_support'].labels[q] for q in df.question], y = list(df.percentage), mode = 'markers', marker = dict( size = 15),
+                       **({'error_y': error_bars(df.percentage, (df.low, df.high), color = 'black', thickness = 1, width = 6)}
+                          if intervals else {}))]
+    layout = go.Layout(
+        shapes=[dict(
+            type='line',
+            xref='x',
+            yref='y',
+            x0=i,
+            y0=0,
+            x1=i,
+            y1 = list(df.percentage)[i],
+            line=dict(
+                color='black',
+                width=2
+            ),
+            layer = 'below',
+        ) for i in range(len(df.question))],
+        template = 'ggplot2',
+        title = dict(text=f'Most helpful types of support for: {source}',x = 0),
+        annotations = [dict(xref='x', yref='y',
+                                x=i, y= list(df.percentage)[i] + 15,
+                                xanchor='center',
+                                text=f'Ranked #1 for <b>{list(df.percentage)[i]:.1f}%</b> <br> of respondents',
+                                font=dict(family='Arial', size=12,
+                                          color='rgb(102, 102, 102)'),
+                                showarrow=False, align='center') for i in range(len(df.question))],
+        width = 800,
+        height = 300,
+        margin = dict(t = 50, l = 20, r = 20, b = 0),
+        xaxis = dict(showgrid = False,
+                     showline=True,
+            linecolor='rgb(102, 102, 102)',
+            ),
+        yaxis = dict(visible = False,rangemode = 'tozero'),
+        paper_bgcolor='white',
+        plot_bgcolor='white',
+    )
+    return go.Figure(plot, layout)
+
+
+def rank_distribution_chart(data, source = 'All', intervals = False):
+    xdata, ydata, top_labels, mean_rank, *errors = rank_distribution_data(data, 'rank_support', source, intervals = intervals)
+    ydata = [f'{y} (mean rank {m:.1f})' for y, m in zip(ydata, mean_rank)]
+    return stacked_bars(xdata, ydata, top_labels, COLORS_RANK_5,
+                        title=dict(text=f'Rank given to each type of support - {source}', x = 0),
+                        height = 400, margin=dict(l=250, r=10, t=140, b=80),
+                        errors = errors[0] if errors else None)
+
+
+def barriers_chart(data, groups = (), intervals = False, by = 'source'):
+    return comparison_chart(data, 'barriers', groups, "Key barriers to fleet renewal",
+                            dict(l=140, r=40, b=50, t=80), 600, intervals = intervals, by = by)
+
+
+# page 4: open comments
+
+def innovation_treemap_chart(innov_df):
+    innov_df = innov_df.melt(id_vars = ['Category', 'Innovation'], value_vars = ['FM', 'OO', 'Other'], var_name = 'source', value_name = 'proportion')
+    innov_df['source'] = innov_df['source'].map({'FM': 'Fleet managers', 'OO': 'Owner-Operators', 'Other': 'Other'})
+
+    colors_tm = ["#f7f7f7","#92c5de", "#f4a582"]
+    f = px.treemap(innov_df, path =['source','Category', 'Innovation'], values = 'proportion',width=1000, height=500, template = 'ggplot2', color = 'Category', color_discrete_sequence = colors_tm, hover_data = ["source", "Category", "Innovation", "proportion"], hover_name = "Innovation")
+    f.update_traces(root_color='rgb(243,243,243)',
+                    hovertemplate=["Name=%{label}<br>Category=%{parent}<extra></extra>" if label in f.data[0].parents else "Category=%{parent}<br>Innovation=%{label}<br>Proportion=%{value}<extra></extra>" for label in f.data[0].ids])
+    f.update_layout(title = dict(text = 'Proportion of keywords mentions per group'), uniformtext=dict(minsize=14),)
+    return f
+
+
+CHARTS = {(c.page, c.key): c for c in [
+    Chart('overview', 'current_role', current_role_chart, ('source', 'current_role')),
+    Chart('overview', 'fleet_size', fleet_size_chart, ('fleet_size',)),
+    Chart('overview', 'regions', regions_chart, ('source', 'regions'),
+          tuple({'source': s} for s in ['All'] + SOURCES)),
+    Chart('overview', 'vocations', vocations_chart, ('source', 'vocations'),
+          tuple({'source': s} for s in ['All'] + SOURCES)),
+    Chart('overview', 'composition', composition_chart, ('source', 'fleet_type', 'fleet_composition', 'oo_veh_char'),
+          tuple({'source': 'Fleet managers', 'fleet_size': label} for label in QUESTIONS['fleet_type'].codes.values())
+          + ({'source': 'Owner-Operators', 'fleet_size': None},)),
+
+    Chart('turnover', 'priorities', priorities_chart, (*BREAKDOWNS, 'turnover'), COMPARISONS),
+    Chart('turnover', 'financial', financial_chart, (*BREAKDOWNS, 'financial'), COMPARISONS),
+    Chart('turnover', 'decision_tools', decision_tools_chart, ('source', 'decision_tools'),
+          tuple({'source': s} for s in SOURCES)),
+    Chart('turnover', 'replacement', replacement_chart, ('source', 'replacement')),
+    Chart('turnover', 'purchase_markets', purchase_markets_chart, ('source', 'purchase_markets'),
+          tuple({'source': s} for s in ['All'] + SOURCES)),
+
+    Chart('renewal', 'replace', replace_chart, ('source', 'replace')),
+    Chart('renewal', 'expand', expand_chart, ('source', 'expand')),
+    Chart('renewal', 'innovation', innovation_chart, ('source', 'innovation'), tuple({'source': s} for s in SOURCES)),
+    Chart('renewal', 'rank_support', rank_support_chart, ('source', 'rank_support'),
+          tuple({'source': s} for s in ['All'] + SOURCES)),
+    Chart('renewal', 'rank_distribution', rank_distribution_chart, ('source', 'rank_support'),
+          tuple({'source': s} for s in ['All'] + SOURCES)),
+    Chart('renewal', 'barriers', barriers_chart, (*BREAKDOWNS, 'barriers'), COMPARISONS),
+
+    Chart('comments', 'innovation_treemap', innovation_treemap_chart, path = INNOVATION_PATH),
+]}
+
+
+#questions each page reads from the survey table (one projection per page, shared by its charts)
+PAGE_QUESTIONS = {
+    'overview': ('source', 'current_role', 'fleet_size', 'fleet_type', 'fleet_composition', 'regions', 'vocations',
+                 'oo_veh_char'),
+    'turnover': (*BREAKDOWNS, 'purchase_markets', 'turnover', 'financial', 'decision_tools', 'replacement'),
+    'renewal': (*BREAKDOWNS, 'replace', 'expand', 'rank_support', 'innovation', 'barriers'),
+}
+
+
+def page_data(page, wave = None):
+    #the survey table as a page loads it: the columns of its questions, from one wave
+    return load_wave(wave, columns = columns_for(*PAGE_QUESTIONS[page]))
+
+
+def chart_data(chart):
+    #the table a chart is built from, loaded on its own (e.g. outside a page)
+    if chart.path:
+        return pd.read_csv(chart.path)
+    return load_wave(columns = columns_for(*chart.questions))
+
+
+def chart_figure(page, key, data = None, **widgets):
+    #figure of one chart for the given widget values, served from the figure cache.
+    #survey charts are keyed on the version of the (loader-issued) frame they are built from
+    chart = CHARTS[(page, key)]
+    if chart.path:
+        fingerprint = file_version(chart.path)
+    else:
+        data = chart_data(chart) if data is None else data
+        fingerprint = frame_version(data)
+    build = lambda: chart.build(chart_data(chart) if data is None else data, **widgets)
+    return cached_figure(page, key, widgets, fingerprint, build)
+
+
+def select_wave():
+    #wave the pages show, picked in the sidebar once the survey has more than one wave
+    import streamlit as st
+    names = waves()
+    if len(names) < 2:
+        return names[-1]
+    return st.sidebar.selectbox("Survey wave", names, index = len(names) - 1, key = "wave")
+
+
+def show_intervals():
+    #sidebar switch for 95% confidence intervals on the charts that support them
+    import streamlit as st
+    return st.sidebar.toggle("Show 95% confidence intervals", key = "intervals")
+
+
+def breakdown_controls(data, key):
+    #"break down by" selector and the groups to compare: fleet managers and owner-operators
+    #when broken down by source (the default), every group of any other attribute
+    import streamlit as st
+    by = st.selectbox("Break down by", BREAKDOWNS, format_func = lambda b: QUESTIONS[b].title, key = f"by_{key}")
+    if by == 'source':
+        return by, st.multiselect("Select group", ['Fleet managers','Owner-Operators'],
+                                  default=["Fleet managers", "Owner-Operators"], key=key)
+    options = group_rows(data, by)[0]
+    return by, st.multiselect("Select group", options, default = options, key = f"{key}_{by}")
+
+
+def show_chart(page, key, data = None, **widgets):
+    import streamlit as st
+    st.plotly_chart(chart_figure(page, key, data, **widgets))
@@ -0,0 +1,123 @@
+"""Themes (category1, category2) of open comments, assigned from the hand-labelled ones.
+
+Every comment, labelled or not, becomes a sparse TF-IDF vector in one pass over the text
+(the words of comments.term_counts, sublinear term frequencies, unit length). A theme's
+centroid is the mean vector of the labelled comments tagged with it, and a comment is
+scored against every centroid by cosine similarity, computed over the non-zero entries of
+the comment vectors only. The best theme becomes category1 and the runner-up category2
+when it scores close enough to the first; a comment resembling no theme closely enough is
+tagged 'None', as in the hand-labelled file.
+
+    python app/comment_classifier.py new_comments.csv -o text_df_new.csv
+    python app/comment_classifier.py new_comments.csv --seeds text_df.csv --relabel
+
+The comments file needs source and comment columns. Comments that already have a
+category1 keep their themes unless --relabel is given.
+"""
+import sys
+import argparse
+import numpy as np
+import pandas as pd
+from comments import COMMENTS_PATH, TOPIC_COLUMNS, term_counts
+
+#category1 of comments without a theme
+NO_THEME = 'None'
+#lowest similarity to a centroid for a theme, and lowest score of the second theme
+#relative to the first
+MIN_SCORE = 0.05
+SECOND_RATIO = 0.8
+
+
+class TfidfMatrix:
+    """Unit-length TF-IDF vectors of a column of comments, as (row, term, weight) triples."""
+
+    def __init__(self, comments):
+        self.terms, self.rows, counts, self.vocab, _ = term_counts(comments.reset_index(drop = True))
+        self.n = len(comments)
+        df = np.bincount(self.terms, minlength = len(self.vocab))
+        idf = np.log((1 + self.n)/(1 + df)) + 1
+        weights = (1 + np.log(counts))*idf[self.terms]
+        norms = np.sqrt(np.bincount(self.rows, weights = weights**2, minlength = self.n))
+        self.weights = weights/np.maximum(norms, 1e-12)[self.rows]
+
+    def sums(self, groups):
+        #vector sums of groups of rows: groups is a rows x groups 0/1 matrix, the result a
+        #dense groups x vocabulary matrix (the number of themes is small)
+        groups = np.asarray(groups, dtype = float)
+        return np.stack([np.bincount(self.terms, weights = self.weights*g[self.rows], minlength = len(self.vocab))
+                         for g in groups.T]).reshape(groups.shape[1], len(self.vocab))
+
+    def dot(self, dense):
+        #rows x groups products of every row vector with every row of a dense matrix
+        return np.stack([np.bincount(self.rows, weights = self.weights*d[self.terms], minlength = self.n)
+                         for d in dense], axis = 1).reshape(self.n, len(dense))
+
+
+def theme_matrix(data, themes):
+    #rows x themes 0/1 matrix of the themes each comment is tagged with (category1 or 2)
+    return np.stack([data[TOPIC_COLUMNS].eq(t).any(axis = 1).to_numpy() for t in themes], axis = 1) \
+        .reshape(len(data), len(themes))
+
+
+def theme_scores(data, seeds):
+    #(comments x themes cosine similarities, themes) of the comments in data to the
+    #centroids of the themes of the labelled seeds
+    themes = [t for t in pd.unique(seeds[TOPIC_COLUMNS].to_numpy().ravel())
+              if isinstance(t, str) and t != NO_THEME]
+    tfidf = TfidfMatrix(pd.concat([seeds['comment'], data['comment']], ignore_index = True))
+    tagged = np.zeros((tfidf.n, len(themes)))
+    tagged[:len(seeds)] = theme_matrix(seeds, themes)
+    centroids = tfidf.sums(tagged)
+    centroids /= np.maximum(np.linalg.norm(centroids, axis = 1, keepdims = True), 1e-12)
+    return tfidf.dot(centroids)[len(seeds):], np.array(themes, dtype = object)
+
+
+def assign_themes(scores, themes, min_score = MIN_SCORE, second_ratio = SECOND_RATIO):
+    #(category1, category2) arrays: the best theme of each comment and the runner-up when it
+    #scores within second_ratio of the best
+    n = len(scores)
+    if not len(themes):
+        return np.full(n, NO_THEME, dtype = object), np.full(n, None, dtype = object)
+    order = np.argsort(-scores, axis = 1, kind = 'stable')
+    best = scores[np.arange(n), order[:, 0]]
+    category1 = np.where(best >= min_score, themes[order[:, 0]], NO_THEME)
+    category2 = np.full(n, None, dtype = object)
+    if len(themes) > 1:
+        second = scores[np.arange(n), order[:, 1]]
+        keep = (best >= min_score) & (second >= np.maximum(min_score, second_ratio*best))
+        category2[keep] = themes[order[keep, 1]]
+    return category1, category2
+
+
+def classify(data, seeds, relabel = False, min_score = MIN_SCORE, second_ratio = SECOND_RATIO):
+    #data (source, comment[, category1, category2]) with the themes of its unlabelled comments
+    #(of all of them with relabel) assigned from the labelled seeds
+    out = data.reindex(columns = ['source', 'comment', *TOPIC_COLUMNS]).reset_index(drop = True)
+    seeds = seeds[seeds['category1'].notna()]
+    todo = np.ones(len(out), dtype = bool) if relabel else out['category1'].isna().to_numpy()
+    scores, themes = theme_scores(out[todo], seeds)
+    category1, category2 = assign_themes(scores, themes, min_score, second_ratio)
+    out[TOPIC_COLUMNS] = out[TOPIC_COLUMNS].astype(object)
+    out.loc[todo, 'category1'] = category1
+    out.loc[todo, 'category2'] = category2
+    return out
+
+
+def read_comments(path):
+    #a comment table; 'None' in category1 is a label (no theme), not a missing one
+    return pd.read_csv(path, encoding = 'utf-8-sig', keep_default_na = False, na_values = [''])
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("comments", help="csv of comments to tag (source, comment[, category1, category2])")
+    parser.add_argument("--seeds", default=COMMENTS_PATH, help="csv of labelled comments (default: text_df.csv)")
+    parser.add_argument("-o", "--output", default=None, help="output csv (default: overwrite the comments file)")
+    parser.add_argument("--relabel", action="store_true", help="also re-tag comments that already have themes")
+    parser.add_argument("--min-score", type=float, default=MIN_SCORE)
+    parser.add_argument("--second-ratio", type=float, default=SECOND_RATIO)
+    args = parser.parse_args()
+    tagged = classify(read_comments(args.comments), read_comments(args.seeds), args.relabel, args.min_score, args.second_ratio)
+    #the layout of text_df.csv: BOM and CRLF line endings
+    tagged.to_csv(args.output or args.comments, index=False, encoding='utf-8-sig', lineterminator='\r\n')
+    print(tagged['category1'].value_counts().to_string(), file=sys.stderr)
@@ -0,0 +1,179 @@
+"""Query engine for the open comments (text_df.csv).
+
+The comment table is indexed once per version of the file: every word of every comment
+gets a posting list (the sorted row positions of the comments containing it), and so
+does every source and every topic (category1 or category2). A query intersects the
+posting lists of its parts, shortest first, and ranks the comments by BM25 relevance to
+its keywords. The vocabulary is sorted, so a keyword matches every word it is a prefix of
+('regul' finds 'regulation' and 'regulations') through one contiguous range of postings.
+"""
+import os
+import re
+import threading
+import numpy as np
+import pandas as pd
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+except ImportError:
+    pa = None
+from data_loader import APP_DIR, file_version
+
+COMMENTS_PATH = os.path.join(APP_DIR, 'text_df.csv')
+TOPIC_COLUMNS = ['category1', 'category2']
+#words: runs of letters and digits, in comments and queries alike
+TOKEN = r"[^\W_]+"
+#the separators between them, for Arrow's (RE2) splitter
+SEPARATOR = r"[^\pL\pN]+"
+#BM25 term frequency saturation and length normalization
+K1, B = 1.2, 0.75
+
+_INDEXES = {}
+_LOCK = threading.Lock()
+_EMPTY = np.empty(0, dtype = 'int32')
+
+
+def tokenize(text):
+    return re.findall(TOKEN, text.lower())
+
+
+def _union(lists, n):
+    #sorted positions (below n) in any of the sorted lists
+    lists = [l for l in lists if len(l)]
+    if len(lists) <= 1:
+        return lists[0] if lists else _EMPTY
+    mask = np.zeros(n, dtype = bool)
+    for l in lists:
+        mask[l] = True
+    return np.flatnonzero(mask).astype('int32')
+
+
+def _intersect(a, b):
+    #sorted positions in both sorted lists: each of the shorter is looked up in the longer
+    if len(a) > len(b):
+        a, b = b, a
+    if not len(a):
+        return a
+    i = np.minimum(np.searchsorted(b, a), len(b) - 1)
+    return a[b[i] == a]
+
+
+def term_counts(comments):
+    #(terms, rows, counts, vocab, lengths): how many times word terms[i] of the sorted
+    #vocabulary occurs in comment rows[i], in word then row order (each word's rows are one
+    #sorted run), and the number of words of every comment
+    n, m = len(comments), max(len(comments), 1)
+    term, vocab, rows = _words(comments)
+    pairs, counts = np.unique(term.astype('int64')*m + rows, return_counts = True)
+    return pairs//m, (pairs % m).astype('int32'), counts, vocab, np.bincount(rows, minlength = n)
+
+
+def _words(comments):
+    #(term, vocab, rows): every word of every comment, in order, as its position in the
+    #sorted vocabulary, and the row of the comment it is in
+    n = len(comments)
+    if pa is None or not n:
+        tokens = comments.fillna('').astype(str).str.lower().str.findall(TOKEN)
+        lengths = tokens.str.len().to_numpy()
+        words = np.fromiter((w for t in tokens for w in t), dtype = object, count = lengths.sum())
+        term, vocab = pd.factorize(words, sort = True)
+        return term, np.asarray(vocab, dtype = str), np.repeat(np.arange(n), lengths)
+    #the same words split off by Arrow's kernels, several times faster than str.findall
+    parts = pc.split_pattern_regex(pc.utf8_lower(pa.array(comments.fillna(''), type = pa.string())), SEPARATOR)
+    words = parts.flatten()
+    keep = pc.not_equal(words, '').to_numpy(zero_copy_only = False)
+    rows = np.repeat(np.arange(n), np.diff(parts.offsets.to_numpy()))[keep]
+    encoded = words.filter(pa.array(keep)).dictionary_encode()
+    order = pc.array_sort_indices(encoded.dictionary).to_numpy()
+    rank = np.empty_like(order)
+    rank[order] = np.arange(len(order))
+    vocab = encoded.dictionary.take(pa.array(order)).to_numpy(zero_copy_only = False).astype(str)
+    return rank[encoded.indices.to_numpy(zero_copy_only = False)], vocab, rows
+
+
+class CommentIndex:
+    """Posting lists of the words, sources and topics of a comment table."""
+
+    def __init__(self, data):
+        self.data = data.reset_index(drop = True)
+        n, m = len(self.data), max(len(self.data), 1)
+        terms, self.postings, tf, self.vocab, self.lengths = term_counts(self.data['comment'])
+        lengths = self.lengths
+        self.offsets = np.searchsorted(terms, np.arange(len(self.vocab) + 1))
+        df = np.diff(self.offsets)
+        idf = np.log(1 + (n - df + 0.5)/(df + 0.5))
+        norm = K1*(1 - B + B*lengths/max(lengths.sum()/m, 1))
+        self.weights = idf[terms]*tf*(K1 + 1)/(tf + norm[self.postings])
+
+        self.sources = self._values(self.data['source'])
+        topics = [self._values(self.data[c]) for c in TOPIC_COLUMNS]
+        self.topics = {t: _union([p.get(t, _EMPTY) for p in topics], n) for t in dict.fromkeys(k for p in topics for k in p)}
+        self._sort_keys = {'length': self.lengths}
+
+    def _values(self, column):
+        #posting list of every value of a column, in order of first appearance
+        codes, values = pd.factorize(column)
+        order = np.argsort(codes, kind = 'stable').astype('int32')
+        bounds = np.searchsorted(codes[order], np.arange(len(values) + 1))
+        return {v: order[bounds[i]:bounds[i + 1]] for i, v in enumerate(values)}
+
+    def _keyword(self, word):
+        #rows containing a word starting with `word`, and their BM25 weights for it
+        lo, hi = np.searchsorted(self.vocab, [word, word + '\U0010ffff'])
+        start, stop = self.offsets[lo], self.offsets[hi]
+        scores = np.bincount(self.postings[start:stop], weights = self.weights[start:stop], minlength = len(self.data))
+        return np.flatnonzero(scores).astype('int32'), scores
+
+    def query(self, sources = None, topics = None, keywords = ''):
+        #(row positions, scores) of the comments by any of `sources`, on any of `topics` and
+        #containing every keyword (as a word or word prefix). empty or None sources/topics
+        #do not restrict. ranked by relevance to the keywords, in table order without any
+        lists, scores = [], np.zeros(len(self.data))
+        if sources:
+            lists.append(_union([self.sources.get(s, _EMPTY) for s in sources], len(self.data)))
+        if topics:
+            lists.append(_union([self.topics.get(t, _EMPTY) for t in topics], len(self.data)))
+        for word in tokenize(keywords or ''):
+            rows, weights = self._keyword(word)
+            lists.append(rows)
+            scores += weights
+        if not lists:
+            return np.arange(len(self.data)), scores
+        rows = lists.pop(np.argmin([len(l) for l in lists]))
+        for l in sorted(lists, key = len):
+            rows = _intersect(rows, l)
+        rows = rows[np.argsort(-scores[rows], kind = 'stable')]
+        return rows, scores[rows]
+
+    def sort_key(self, column):
+        #rank of every comment's value of a column ('length': its number of words), missing
+        #values last. computed once per column
+        key = self._sort_keys.get(column)
+        if key is None:
+            codes, values = pd.factorize(self.data[column], sort = True)
+            key = self._sort_keys[column] = np.where(codes < 0, len(values), codes)
+        return key
+
+    def page(self, rows, start = 0, size = 50, sort = None, descending = False):
+        #the comments at positions start to start + size of rows (as returned by query) once
+        #ordered by a column (see sort_key); sort None keeps the order of rows. only these
+        #comments are taken out of the table
+        if sort is not None:
+            key = self.sort_key(sort)[rows]
+            rows = rows[np.argsort(-key if descending else key, kind = 'stable')]
+        return self.data.iloc[rows[start:start + size]]
+
+    def search(self, sources = None, topics = None, keywords = ''):
+        #the matching comments themselves, best match first
+        rows, _ = self.query(sources, topics, keywords)
+        return self.data.iloc[rows]
+
+
+def comment_index(path = COMMENTS_PATH):
+    #index of the comment table at path, built once per version of the file
+    version = file_version(path)
+    with _LOCK:
+        entry = _INDEXES.get(path)
+        if entry is None or entry[0] != version:
+            entry = _INDEXES[path] = (version, CommentIndex(pd.read_csv(path, encoding = 'utf-8-sig')))
+        return entry[1]
@@ -0,0 +1,551 @@
+import os
+import hashlib
+import threading
+import functools
+import contextlib
+import weakref
+import numpy as np
+import pandas as pd
+from pandas.api.types import union_categoricals
+from schema import QUESTIONS, ONEHOT_COLUMNS, CATEGORICAL_COLUMNS
+
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+#survey table used when no path is given; MHDV_DATA_PATH points the app at another file
+DATA_PATH = os.environ.get("MHDV_DATA_PATH", os.path.join(APP_DIR, "data_full_app.csv"))
+#one survey table per wave, <wave>.csv or <wave>.parquet, in MHDV_WAVES_DIR. without any
+#partition the table at DATA_PATH is the only wave
+WAVES_DIR = os.environ.get("MHDV_WAVES_DIR", os.path.join(APP_DIR, "waves"))
+DEFAULT_WAVE = 'Wave 1'
+#hand-coded keyword shares of the innovation comments, shown on the open comments page for
+#every wave (innovation_keywords.py computes them from the raw answers, for review only)
+INNOVATION_PATH = os.path.join(APP_DIR, "innovation_best_worst.csv")
+#name of the shared memory published by shared_data.py. when set, tables published there
+#are attached rather than read, falling back to the files for anything not published
+SHARED_DATA = os.environ.get("MHDV_SHARED_DATA")
+#directory of report bundles written by report.py. aggregates found there for the version of
+#a table are used instead of being computed
+REPORT_BUNDLE = os.environ.get("MHDV_REPORT_BUNDLE")
+
+_CACHE = {}
+_LOCK = threading.Lock()
+_ISSUED = weakref.WeakValueDictionary()
+_MEMOS = {}
+_PUBLISHED = {}
+_BUNDLED = {}
+_RECORDING = threading.local()
+_HASHES = {}
+_APPENDS = {}
+_LAYOUTS = {}
+#set MHDV_GUARD_DATA to run the whole app under guard_shared_data()
+GUARD_DATA = bool(os.environ.get("MHDV_GUARD_DATA"))
+
+
+def _file_hasher(path):
+    #running sha1 over the file, kept so appended bytes can be hashed on their own
+    h = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            h.update(block)
+    return h
+
+
+def _file_hash(path):
+    return _file_hasher(path).hexdigest()
+
+
+def columnar_path(path = DATA_PATH):
+    return os.path.splitext(path)[0] + '.parquet'
+
+
+def read_survey_csv(path = DATA_PATH, columns = None):
+    #parse the survey table with compact dtypes
+    header = pd.read_csv(path, nrows=0).columns
+    if columns is not None:
+        header = [c for c in header if c in columns]
+    #one-hot columns are parsed as float32 (NaN-safe) and shrunk to int8 when fully answered
+    dtypes = {c: 'float32' for c in header if c in ONEHOT_COLUMNS}
+    dtypes.update({c: 'category' for c in CATEGORICAL_COLUMNS if c in header})
+    d = pd.read_csv(path, dtype=dtypes, usecols=columns)
+
+    for c in dtypes:
+        if dtypes[c] == 'float32' and not d[c].isna().any():
+            d[c] = d[c].astype('int8')
+    if columns is not None:
+        d = d[list(columns)]
+    return d
+
+
+def write_columnar(path = DATA_PATH, out_path = None):
+    #convert the csv to parquet so pages can read only the columns they need
+    out_path = out_path or columnar_path(path)
+    read_survey_csv(path).to_parquet(out_path, index=False)
+    return out_path
+
+
+def _source_path(path):
+    #the parquet copy is used only while it is at least as new as the csv
+    if path.endswith('.parquet'):
+        return path
+    columnar = columnar_path(path)
+    if os.path.exists(columnar) and os.stat(columnar).st_mtime_ns >= os.stat(path).st_mtime_ns:
+        return columnar
+    return path
+
+
+def _read(source, columns):
+    if source.endswith('.parquet'):
+        return pd.read_parquet(source, columns=columns, memory_map=True)
+    return read_survey_csv(source, columns)
+
+
+def _freeze(data):
+    #mark the arrays behind every column read-only: in-place writes to a shared table fail.
+    #other extension arrays (Arrow strings from shared memory) are immutable already
+    for c in data.columns:
+        if isinstance(data[c].dtype, pd.CategoricalDtype):
+            values = data[c].array.codes
+        elif isinstance(data[c].dtype, np.dtype):
+            values = data[c].to_numpy()
+        else:
+            continue
+        while isinstance(values, np.ndarray):
+            values.flags.writeable = False
+            values = values.base
+
+
+def _issue(data, version):
+    #hand a freshly read table out as the shared, read-only copy of one dataset version
+    _freeze(data)
+    data.attrs['dataset_version'] = version
+    _ISSUED[id(data)] = data
+    _LAYOUTS[id(data)] = (tuple(data.columns), len(data))
+    weakref.finalize(data, _LAYOUTS.pop, id(data), None)
+    return data
+
+
+def load_data(path = None, columns = None):
+    #survey table parsed once per process, reloaded when the file changes on disk.
+    #with `columns`, only that projection is read (and cached separately)
+    path = path or DATA_PATH
+    if SHARED_DATA:
+        data = _attached(path)
+        if data is not None:
+            return data
+    source = _source_path(path)
+    stat = os.stat(source)
+    stamp = (stat.st_mtime_ns, stat.st_size)
+    key = (path, None if columns is None else tuple(columns))
+
+    with _LOCK:
+        entry = _CACHE.get(key)
+        if entry is not None and entry['source'] == source and entry['stamp'] == stamp:
+            return entry['data']
+
+        hasher = _file_hasher(source)
+        version = hasher.hexdigest()
+        if entry is None or entry['version'] != version:
+            data = _issue(_read(source, None if columns is None else list(columns)), version)
+            entry = {'version': version, 'data': data}
+        entry.update(source=source, stamp=stamp, hasher=hasher)
+        _CACHE[key] = entry
+        return entry['data']
+
+
+def _attached(path):
+    #the table published for path in shared memory, or None. the whole table is returned
+    #for any projection: its columns cost nothing to attach. a new published version is
+    #attached on the first load after the publisher moved to it
+    from shared_data import published, attach, _release
+
+    for attempt in range(3):
+        current = published(SHARED_DATA).get(os.path.abspath(path))
+        if current is None:
+            return None
+        with _LOCK:
+            entry = _CACHE.get((path, None))
+            if entry is not None and entry.get('segment') is not None and entry['version'] == current['version']:
+                return entry['data']
+            try:
+                segment, payload = attach(current['segment'])
+            except FileNotFoundError:
+                #replaced by a newer version since the header was read
+                continue
+            version = payload['version']
+            data = _issue(payload['data'], version)
+            old = entry.get('segment') if entry is not None else None
+            entry = None
+            for key in [k for k in _CACHE if k[0] == path]:
+                del _CACHE[key]
+            _CACHE[(path, None)] = {'version': version, 'data': data, 'source': path, 'stamp': None,
+                                    'hasher': None, 'segment': segment}
+            live = {e['version'] for e in _CACHE.values()}
+            for v in [v for v in _PUBLISHED if v not in live]:
+                del _PUBLISHED[v]
+            _PUBLISHED[version] = payload['results']
+            #released once the table and results over the old segment are dropped from here
+            if old is not None:
+                _release(old)
+            return data
+    return None
+
+
+def _extend(data, rows):
+    #data followed by rows (same columns), keeping compact dtypes where the new values allow
+    columns = {}
+    for c in data.columns:
+        old, new = data[c], rows[c]
+        if isinstance(old.dtype, pd.CategoricalDtype):
+            #as objects: a batch without any answer would give float categories
+            columns[c] = pd.Series(union_categoricals([old.array, pd.Categorical(new.astype(object))],
+                                                      sort_categories = True))
+            continue
+        if old.dtype == 'int8' and new.isna().any():
+            old = old.astype('float32')
+        if old.dtype.kind in 'iuf' and new.dtype != old.dtype:
+            new = pd.to_numeric(new)
+            if old.dtype.kind == 'f' or not new.isna().any():
+                new = new.astype(old.dtype)
+        columns[c] = pd.concat([old, new], ignore_index = True)
+    return pd.DataFrame(columns)
+
+
+def append_data(batch, path = None):
+    #append rows (survey columns, already validated) to the survey csv. tables already loaded
+    #are extended rather than re-read, the new version is hashed from the appended bytes only,
+    #and aggregates memoized with a merge are updated from the batch alone
+    path = path or DATA_PATH
+    if path.endswith('.parquet'):
+        raise ValueError('responses are appended to the survey csv, not to its parquet copy')
+    header = list(pd.read_csv(path, nrows=0).columns)
+    rows = batch.reindex(columns = header).reset_index(drop = True)
+
+    with _LOCK:
+        current = []
+        for key, entry in list(_CACHE.items()):
+            if key[0] != path:
+                continue
+            stat = os.stat(entry['source'])
+            if entry['stamp'] == (stat.st_mtime_ns, stat.st_size):
+                current.append((key, entry))
+            else:
+                del _CACHE[key]
+        #running row number of the unnamed index column written by DataFrame.to_csv
+        n = len(current[0][1]['data']) if current else len(pd.read_csv(path, usecols = [0]))
+        for c in header:
+            if c.startswith('Unnamed: '):
+                rows[c] = range(n, n + len(rows))
+
+        hasher = next((e['hasher'] for _, e in current if e['source'] == path), None)
+        hasher = (hasher or _file_hasher(path)).copy()
+        with open(path, 'rb+') as f:
+            f.seek(-1, os.SEEK_END)
+            blob = rows.to_csv(header = False, index = False).encode()
+            if f.read(1) != b'\n':
+                blob = b'\n' + blob
+            f.write(blob)
+        hasher.update(blob)
+        version = hasher.hexdigest()
+        stat = os.stat(path)
+
+        parents = set()
+        for key, entry in current:
+            parents.add(entry['version'])
+            data = _issue(_extend(entry['data'], rows[list(entry['data'].columns)]), version)
+            _CACHE[key] = {'version': version, 'data': data, 'source': path,
+                           'stamp': (stat.st_mtime_ns, stat.st_size), 'hasher': hasher.copy()}
+        live = {e['version'] for e in _CACHE.values()}
+        for v in [v for v in _APPENDS if v not in live]:
+            del _APPENDS[v]
+        _APPENDS[version] = (parents, rows)
+    return version
+
+
+def wave_paths(root = None):
+    #partition file of each wave, in wave name order. a csv's parquet copy is found by load_data
+    root = root or WAVES_DIR
+    paths = {}
+    if os.path.isdir(root):
+        for name in sorted(os.listdir(root)):
+            wave, ext = os.path.splitext(name)
+            if ext == '.csv' or (ext == '.parquet' and wave not in paths):
+                paths[wave] = os.path.join(root, name)
+    return dict(sorted(paths.items())) or {DEFAULT_WAVE: DATA_PATH}
+
+
+def waves(root = None):
+    return list(wave_paths(root))
+
+
+def load_wave(wave = None, columns = None):
+    #table of one wave (the latest by default). partitions are read only when first asked
+    #for, and cached like load_data
+    paths = wave_paths()
+    wave = list(paths)[-1] if wave is None else wave
+    if wave not in paths:
+        raise KeyError(f'no survey wave {wave!r} (waves: {", ".join(paths)})')
+    return load_data(paths[wave], columns)
+
+
+def write_wave(wave, path = DATA_PATH, root = None):
+    #store a survey csv as the (parquet) partition of one wave
+    root = root or WAVES_DIR
+    os.makedirs(root, exist_ok = True)
+    return write_columnar(path, os.path.join(root, f'{wave}.parquet'))
+
+
+def wave_aggregate_path(wave, name):
+    #file of an aggregate of one wave, stored next to its partition for the partition's
+    #current version: aggregates/<wave>/<version>/<name>.parquet. the version is the content
+    #hash of the file, found without parsing its rows
+    path = wave_paths()[wave]
+    version = file_version(_source_path(path))
+    return os.path.join(os.path.dirname(path), 'aggregates', wave, version[:16], f'{name}.parquet')
+
+
+def dataset_version(path = None):
+    #content hash of the file currently backing the survey table
+    path = path or DATA_PATH
+    load_data(path)
+    return _CACHE[(path, None)]['version']
+
+
+def file_version(path):
+    #content hash of any other data file, recomputed only when it changes on disk
+    stat = os.stat(path)
+    stamp = (stat.st_mtime_ns, stat.st_size)
+    with _LOCK:
+        entry = _HASHES.get(path)
+        if entry is None or entry[0] != stamp:
+            entry = _HASHES[path] = (stamp, _file_hash(path))
+        return entry[1]
+
+
+def _live_versions(appended = False):
+    #versions of the loaded tables, and with appended those they were extended from, read
+    #under _LOCK: sessions load and append tables on their own threads
+    with _LOCK:
+        live = {e['version'] for e in _CACHE.values()}
+        if appended:
+            live.update(*[_APPENDS[v][0] for v in live if v in _APPENDS])
+        return live
+
+
+def frame_version(data):
+    #dataset version of a frame handed out by load_data, None for any other frame
+    if _ISSUED.get(id(data)) is not data:
+        return None
+    return data.attrs.get('dataset_version')
+
+
+def memoize_on_version(fn = None, merge = None):
+    #cache fn(data, ...) for frames from load_data, keyed on dataset version and columns.
+    #results for versions no longer loaded are dropped; other frames are never cached.
+    #with merge, a table extended by append_data gets merge(result before, fn(new rows)).
+    #results published in shared memory with the table, or found in the report bundle, are
+    #used as they are
+    if fn is None:
+        return functools.partial(memoize_on_version, merge = merge)
+    name = f'{fn.__module__}.{fn.__qualname__}'
+    memo = {}
+    lock = threading.Lock()
+
+    @functools.wraps(fn)
+    def wrapper(data, *args, **kwargs):
+        version = frame_version(data)
+        if version is None:
+            return fn(data, *args, **kwargs)
+        key = (version, tuple(data.columns), args, tuple(sorted(kwargs.items())))
+        calls = getattr(_RECORDING, 'calls', None)
+        if calls is None:
+            return lookup(data, key, args, kwargs)
+        depth = _RECORDING.depth
+        _RECORDING.depth += 1
+        try:
+            result = lookup(data, key, args, kwargs)
+        finally:
+            _RECORDING.depth = depth
+        if not depth:
+            calls.append((name, key, result))
+        return result
+
+    def lookup(data, key, args, kwargs):
+        version = key[0]
+        with lock:
+            if key not in memo:
+                result = _PUBLISHED.get(version, {}).get(name, {}).get(key)
+                if result is None and REPORT_BUNDLE:
+                    result = _bundled(version).get(name, {}).get(key)
+                parents, rows = _APPENDS.get(version, ((), None))
+                previous = [memo[(v,) + key[1:]] for v in parents if (v,) + key[1:] in memo]
+                if result is None and merge is not None and previous:
+                    result = merge(previous[0], fn(rows[list(data.columns)], *args, **kwargs))
+                #results for the table before an append stay until the next append
+                live = _live_versions(appended = True)
+                for k in [k for k in list(memo) if k[0] not in live]:
+                    memo.pop(k, None)
+                memo[key] = fn(data, *args, **kwargs) if result is None else result
+            return memo[key]
+
+    wrapper.cache_clear = memo.clear
+    _MEMOS[name] = memo
+    return wrapper
+
+
+def _bundled(version):
+    #{function: {memo key: result}} of the report bundle for a dataset version ({} without
+    #one), read again when the bundle is rewritten
+    from report import bundle_manifest, read_bundle
+
+    manifest = bundle_manifest(REPORT_BUNDLE, version)
+    stamp = os.stat(manifest).st_mtime_ns if os.path.exists(manifest) else None
+    with _LOCK:
+        entry = _BUNDLED.get(version)
+        if entry is None or entry[0] != stamp:
+            entry = _BUNDLED[version] = (stamp, read_bundle(REPORT_BUNDLE, version) if stamp else {})
+        return entry[1]
+
+
+@contextlib.contextmanager
+def record_memoized():
+    #list of (function, memo key, result) of the memoized calls made in the block by this
+    #thread, outermost calls only (what a caller with the same table would look up)
+    calls = []
+    _RECORDING.calls, _RECORDING.depth = calls, 0
+    try:
+        yield calls
+    finally:
+        _RECORDING.calls = None
+
+
+def unload(path = None):
+    #forget the tables loaded from path and the aggregates memoized for them
+    path = path or DATA_PATH
+    with _LOCK:
+        for key in [k for k in _CACHE if k[0] == path]:
+            del _CACHE[key]
+    live = _live_versions()
+    for memo in list(_MEMOS.values()):
+        for k in [k for k in list(memo) if k[0] not in live]:
+            memo.pop(k, None)
+
+
+def clear_caches(memos_only = False):
+    #forget memoized aggregates and, unless memos_only, every loaded table
+    for memo in _MEMOS.values():
+        memo.clear()
+    if not memos_only:
+        with _LOCK:
+            _CACHE.clear()
+            _HASHES.clear()
+            _APPENDS.clear()
+            _PUBLISHED.clear()
+            _BUNDLED.clear()
+
+
+class SharedDataError(RuntimeError):
+    """Code copied a whole shared survey table or changed one."""
+
+
+#DataFrame methods (and properties) that return a copy of every column, and methods that
+#change a frame. indexing ([], .loc, .iloc) is guarded against row selections of every
+#column, which copy every column too, and against assignments
+_FULL_COPIES = ('copy', 'melt', 'to_numpy', 'astype', 'fillna', 'replace', 'apply', 'dropna',
+                'sort_values', 'reset_index', 'merge', 'query', 'transpose', 'T')
+_MUTATIONS = ('__setitem__', '__delitem__', 'insert', 'pop')
+
+
+def _shared(frame):
+    return _ISSUED.get(id(frame)) is frame
+
+
+def _copies_rows(key):
+    #whether .loc[key] or .iloc[key] selects rows of every column: a copy, unless the rows
+    #are a slice (a view) or a single row
+    rows, columns = key if isinstance(key, tuple) else (key, slice(None))
+    if columns is not Ellipsis and not (isinstance(columns, slice) and columns == slice(None)):
+        return False
+    return not (isinstance(rows, slice) or pd.api.types.is_scalar(rows))
+
+
+def _guarded(name, method):
+    @functools.wraps(method)
+    def guarded(self, *args, **kwargs):
+        if _shared(self):
+            if name in _MUTATIONS:
+                raise SharedDataError(f'DataFrame.{name} changes a shared survey table')
+            if name != '__getitem__':
+                raise SharedDataError(f'DataFrame.{name} copies a whole shared survey table; select the columns needed first')
+            if isinstance(args[0], (pd.Series, np.ndarray)) and args[0].dtype == bool:
+                raise SharedDataError('a boolean row filter copies a whole shared survey table; select the columns needed first')
+        return method(self, *args, **kwargs)
+    return guarded
+
+
+def _guarded_indexer(name, method):
+    #.loc / .iloc lookups and assignments of a shared table
+    @functools.wraps(method)
+    def guarded(self, key, *args):
+        if _shared(self.obj):
+            if name == '__setitem__':
+                raise SharedDataError(f'DataFrame.{self.name}[...] = ... changes a shared survey table')
+            if _copies_rows(key):
+                raise SharedDataError(f'DataFrame.{self.name} with a row selection copies a whole shared survey table; '
+                                      f'select the columns needed first')
+        return method(self, key, *args)
+    return guarded
+
+
+def _install_guard():
+    #wrap the copying and mutating DataFrame methods and indexers; returns the originals
+    from pandas.core.indexing import _LocationIndexer
+
+    originals = {(pd.DataFrame, name): getattr(pd.DataFrame, name) for name in ('__getitem__',) + _FULL_COPIES + _MUTATIONS}
+    originals.update({(_LocationIndexer, name): vars(_LocationIndexer)[name] for name in ('__getitem__', '__setitem__')})
+    for (owner, name), method in originals.items():
+        if owner is _LocationIndexer:
+            setattr(owner, name, _guarded_indexer(name, method))
+        elif isinstance(method, property):
+            setattr(owner, name, property(_guarded(name, method.fget)))
+        else:
+            setattr(owner, name, _guarded(name, method))
+    return originals
+
+
+@contextlib.contextmanager
+def guard_shared_data():
+    #debugging and test aid: inside the block, copying a whole table from load_data (copy,
+    #melt, to_numpy, query, T, ..., a boolean row filter or a .loc / .iloc row selection of
+    #every column) or adding, removing or assigning its columns raises SharedDataError.
+    #writes into its values fail anyway: its arrays are read-only
+    originals = _install_guard()
+    try:
+        yield
+    finally:
+        for (owner, name), method in originals.items():
+            setattr(owner, name, method)
+    for key, layout in list(_LAYOUTS.items()):
+        data = _ISSUED.get(key)
+        if data is not None and (tuple(data.columns), len(data)) != layout:
+            raise SharedDataError(f'the columns of a shared survey table changed (version {data.attrs["dataset_version"]})')
+
+
+@memoize_on_version
+def resolve(data, key):
+    #columns of a registered question that data holds, and their positions in data
+    columns = [c for c in QUESTIONS[key].columns if c in data.columns]
+    return columns, data.columns.get_indexer(columns)
+
+
+if GUARD_DATA:
+    _install_guard()
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Convert the survey csv to the columnar (parquet) format")
+    parser.add_argument("csv", nargs="?", default=DATA_PATH)
+    parser.add_argument("-o", "--output", default=None)
+    parser.add_argument("--wave", default=None, help="store as the partition of this wave in the waves directory")
+    args = parser.parse_args()
+    print(write_wave(args.wave, args.csv) if args.wave else write_columnar(args.csv, args.output))
@@ -1,153 +1,272 @@
+import os
+import shutil
+import tempfile
 import pandas as pd
 import numpy as np
+from data_loader import memoize_on_version, load_wave, waves, wave_aggregate_path
+from aggregates import GROUPINGS, _groups, block_shares, level_counts, rank_pairs
+from bootstrap import share_intervals
+from schema import QUESTIONS, MULTI_SELECT, columns_for
+
+
+def _wave_data(data, wave, question):
+    #the table to aggregate: data itself, or the columns the question needs from one wave's
+    #partition, the latest without data or wave (the same projection for every caller, so
+    #its aggregates are shared)
+    if data is not None and wave is not None:
+        raise ValueError('pass either data or a wave, not both')
+    if data is not None:
+        return data
+    return load_wave(wave, columns_for(*GROUPINGS, question))
+
+
+def _group(source):
+    return ('All', 'All') if source == 'All' else ('source', source)
+
+
+def scatter_comparison_data(data = None, question = 'turnover', wave = None, intervals = False):
+    #format data for scatter comparison plots: percentage of each source selecting each
+    #labelled item of any registered multi-select question, in data or in one wave.
+    #with intervals, '<source> low' and '<source> high' columns bound the 95% bootstrap interval
+    return _scatter_comparison_data(_wave_data(data, wave, question), question, intervals)
 
-def scatter_comparison_data(data, question = 'turnover'):
-    #format data for scatter comparison plots 
-    d = data.copy()
-    tot_groups = d.groupby('source').size().reset_index()
-       
-    if question == 'turnover':
-        q = [f'turnover_priorities_{i}' for i in range(1,9)]
-        map_labels = {'turnover_priorities_1':'Cost savings', 
-              'turnover_priorities_2':'Vehicle reliability',
-              'turnover_priorities_3':'Emissions reduction',
-              'turnover_priorities_4':'Regulatory compliance',
-              'turnover_priorities_5':'Operational efficiency',
-              'turnover_priorities_6':'Driver comfort and satisfaction',
-              'turnover_priorities_7':'Technology integration', 
-              'turnover_priorities_8':'Brand image'}
-        column_name = 'Priorities'
-    elif question == 'financial':
-        q = [f'turnover_financial_{i}' for i in range(1,10)]
-        map_labels = {'turnover_financial_1':'Upfront vehicle acquisition', 
-              'turnover_financial_2':'Fuel and energy',
-              'turnover_financial_3':'Maintenance and repairs',
-              'turnover_financial_4':'Depreciation',
-              'turnover_financial_5':'Insurance premiums',
-              'turnover_financial_6':'Tax incentives',
-              'turnover_financial_7':'Financing or leasing terms', 
-              'turnover_financial_8':'Lifecycle cost optimization', 
-            'turnover_financial_9':'Budget stability'}
-        column_name = "Financial"
-    elif question == 'barriers':
-        q=  [f'renewal_barriers_{i}' for i in range(1,12)]
-        map_labels = {'renewal_barriers_1':'Capital costs<br> for new vehicles', 
-              'renewal_barriers_2':'Limited availability of<br> suitable models',
-              'renewal_barriers_3':'Operational disruptions<br> during the transition',
-              'renewal_barriers_4':'Uncertainty around future<br> regulations',
-              'renewal_barriers_5':'Insufficient charging/fueling<br> infrastructure',
-              'renewal_barriers_6':'Limited internal capacity<br> for planning and implementation',
-              'renewal_barriers_7':'Lack of access to <br>financing or incentives', 
-              'renewal_barriers_8':'Concerns about vehicle <br>performance or reliability', 
-            'renewal_barriers_9':'Data or technology <br>integrations challenges',
-               'renewal_barriers_10': 'Resistance to change <br>within the organization',
-                    'renewal_barriers_11': 'Other'}
-        column_name = "Barriers"
-    else: 
-        return None
 
-    d = d.groupby('source')[q].sum().reset_index()
-    d['total'] = tot_groups[0]
+@memoize_on_version
+def _scatter_comparison_data(data, question, intervals = False):
+    if question not in QUESTIONS or QUESTIONS[question].kind != MULTI_SELECT:
+        return None
+    meta = QUESTIONS[question]
 
-    for c in q:
-        d[c] = 100*d[c]/d['total']
+    #items in column-name order (as pivot_table gave them) so ties keep their order
+    q = sorted(meta.shown())
+    d = block_shares(data, question, 'source')[q].T.rename(index = meta.labels)
+    d = d.rename_axis(index = meta.title, columns = 'source').reset_index()
+    ordered_df = d.sort_values(by='Fleet managers').reset_index(drop = True)
 
-    d = d.drop('total', axis = 1).pivot_table(columns = 'source').reset_index()
-    d['index'] = d['index'].map(map_labels)
-    ordered_df = d.sort_values(by='Fleet managers').rename(columns = {'index': column_name}).reset_index(drop = True)
-    
+    if intervals:
+        ci = share_intervals(data, question)
+        for source in d.columns[1:]:
+            g = ci['groups'].get_loc(_group(source))
+            for bound in ('low', 'high'):
+                b = pd.Series(ci[bound][g], index = ci['items']).rename(meta.labels)
+                ordered_df[f'{source} {bound}'] = ordered_df[meta.title].map(b)
     return ordered_df
 
-def likert_data(data, question = 'decision_tools', source = 'Fleet managers'):
-    d = data.copy()
-
-    if question == "decision_tools":
-        q = [c for c in d.columns if c.startswith(question)&(c != 'decision_tools_other')]
-        likert_map = {2: "Rarely or never", 3: "Sometimes", 4: "Often"}
-        top_labels = ['Rarely or never', 'Sometimes', 'Often']
-        q_labels = {'decision_tools_cost':'Cost analysis tools', 
-            'decision_tools_maintenance': 'Maintenance and <br> performance tracking', 
-            'decision_tools_telematics':'Telematics or vehicle <br>usage data', 
-            'decision_tools_emissions':'Emissions performance <br> or reduction target', 
-            'decision_tools_regulations':'Regulatory compliance<br> assessment',
-            'decision_tools_consulting': 'External consulting <br> or advisory services',
-            'decision_tools_AI': 'A.I. tools'}
-
-    elif question == "innovation": 
-        q = [c for c in d.columns if c.startswith(question)&(c not in ['innovation_other', 'innovation_other_TEXT', 'innovation_best_TEXT', 'innovation_worst_TEXT'])]
-        likert_map = {1: "Not likely", 2: "Somewhat likely", 3: "Very likely"}
-        top_labels = ['Not likely', 'Somewhat likely', 'Very likely']
-        q_labels = {'innovation_ice': 'Replacing older ICE <br>with newer ICE',
-            'innovation_hybrid':'Transitioning to <br>hybrid vehicles', 
-            'innovation_bev':'Transitioning to BEV',  
-            'innovation_hydrogen':'Transitioning to hydrogen<br> fuel cell vehicles', 
-            'innovation_telematic': 'Adopting telematics, <br>smart fleet management tools', 
-            'innovation_ai': 'Adopting A.I. tools for <br>planning and operations', 
-            'innovation_route':'Implementing route optimization<br> and logistics innovation'}
-
-    d = d[[c for c in d.columns if c=='source' or c in q]]
-
-    d = d.melt(id_vars="source", var_name="question", value_name="response")
-    d["response"] = d["response"].map(likert_map)
-
-    group_counts = d.groupby(["source", "question", "response"]).size().reset_index(name="count")
-
-    # Pivot for stacked bar plot (absolute counts)
-    group_props = group_counts.pivot_table(index=["source", "question"],columns="response",values="count",fill_value=0)
-
-    # Normalize to proportions 
-    group_props_norm = group_props.div(group_props.sum(axis=1), axis=0).reset_index()
-
-    for col in top_labels:
-        group_props_norm[col] = group_props_norm[col]*100
-
-    d = group_props_norm[group_props_norm.source == source].sort_values(by = top_labels[-1])
-    xdata = d[top_labels].values
-    ydata = [q_labels[x] for x in d['question'].values]
+def likert_data(data = None, question = 'decision_tools', source = 'Fleet managers', wave = None, intervals = False):
+    #percentage of each answer level per item for one source (or 'All'), sliced from the
+    #group x item x level tensor, which is computed once per dataset version. with
+    #intervals, (low, high) arrays shaped like xdata bound the 95% bootstrap interval
+    meta = QUESTIONS[question]
+    top_labels = list(meta.codes.values())
+
+    data = _wave_data(data, wave, question)
+    t = level_counts(data, question)
+    c = t['counts'][t['groups'].get_loc(_group(source))]
 
+    #items in column-name order (as the former pivot gave them) so ties keep their order
+    items = np.argsort(t['items'])
+    shares = c[items]/c[items].sum(axis = 1, keepdims = True)*100
+    order = np.argsort(shares[:, -1], kind = 'quicksort')
+    xdata = shares[order]
+    ydata = [meta.labels[t['items'][i]] for i in items[order]]
+
+    if intervals:
+        ci = share_intervals(data, question)
+        g = ci['groups'].get_loc(_group(source))
+        return xdata, ydata, top_labels, tuple(ci[bound][g][items[order]] for bound in ('low', 'high'))
     return xdata, ydata, top_labels
 
 
-def timeline_data(data, question = 'replace'):
+def timeline_data(data = None, question = 'replace', wave = None, intervals = False):
+    #percentage of each (applicable) answer per source for a single-choice question,
+    #sliced from the group x item x level counts. with intervals, (low, high) arrays shaped
+    #like xdata bound the 95% bootstrap interval
+    data = _wave_data(data, wave, question)
+    t = level_counts(data, question)
+    by_source = (t['groups'].get_level_values('by') == 'source')
+    c = t['counts'][by_source, 0, :]
+    answered = c.sum(axis = 1) > 0
 
-    d = data.copy()
+    top_labels = list(QUESTIONS[question].codes.values())
+    xdata = c[answered]/(.01*c[answered].sum(axis = 1, keepdims = True))
+    ydata = t['groups'][by_source][answered].get_level_values('group').values
 
-    if question == "replace":
-        column = "replace_pre2010"
-    elif question == "expand":
-        column = "expand_fleet"
+    if intervals:
+        ci = share_intervals(data, question)
+        return xdata, ydata, top_labels, tuple(ci[bound][by_source, 0][answered] for bound in ('low', 'high'))
+    return xdata, ydata, top_labels
 
-    d = d.groupby(['source', column]).size().reset_index(name="count")
-    d = d[d[column] != 5] #remove non applicable answers 
 
-    labels = {1: 'Yes, within <br>the next 3 years', 2:'Yes, in more <br> than 3 years', 3: 'No', 4: 'Not sure'}
-    d[column] = d[column].map(labels)
+def _wave_shares(wave, question, by):
+    #one wave's rows of wave_comparison, from the aggregates of its partition
+    meta = QUESTIONS[question]
+    data = _wave_data(None, wave, question)
+    if meta.kind == MULTI_SELECT:
+        d = block_shares(data, question, by)[meta.shown()]
+        d = d.rename(columns = meta.labels).rename_axis(index = by, columns = meta.title)
+        return d.stack().rename('percentage').reset_index()
+    t = level_counts(data, question)
+    rows = t['groups'].get_level_values('by') == by
+    c = t['counts'][rows]
+    shares = 100*c/np.maximum(c.sum(axis = 2, keepdims = True), 1)
+    index = pd.MultiIndex.from_product([t['groups'][rows].get_level_values('group'), t['items'],
+                                        [meta.codes[l] for l in t['levels']]],
+                                       names = [by, meta.title or 'item', 'answer'])
+    d = pd.Series(shares.ravel(), index = index, name = 'percentage').reset_index()
+    d[meta.title or 'item'] = d[meta.title or 'item'].map(lambda c: meta.labels.get(c, c))
+    return d
 
-    d = d.pivot_table(index="source",columns=column,values="count",fill_value=0)
-    d = d.div(.01*d.sum(axis=1), axis=0).reset_index()
 
-    top_labels = ['No', 'Not sure',  'Yes, in more <br> than 3 years', 'Yes, within <br>the next 3 years']
-    xdata = d[top_labels].values
-    ydata = d.source.values    
-    return xdata, ydata, top_labels
+def wave_comparison(question, selected = None, by = 'source'):
+    #percentage of each group giving each answer, wave by wave: items picked for multi-select
+    #questions, answer levels per item for coded ones. a wave's percentages are stored next
+    #to its partition for the partition's version (data_loader.wave_aggregate_path): the
+    #partition is read (only the question's columns) the first time, later comparisons read
+    #the stored percentages alone
+    frames = []
+    for wave in selected or waves():
+        path = wave_aggregate_path(wave, f'{question}.{by}')
+        if os.path.exists(path):
+            d = pd.read_parquet(path)
+        else:
+            d = _wave_shares(wave, question, by)
+            _store_aggregate(path, d)
+        frames.append(d.assign(wave = wave))
+    d = pd.concat(frames, ignore_index = True)
+    return d[['wave'] + [c for c in d.columns if c != 'wave']]
+
+
+def _store_aggregate(path, d):
+    #write a wave aggregate (through a temporary file of its own, as sessions may store the
+    #same aggregate at once) and, once it is in place, drop those stored for older versions
+    #of the wave. partitions on a read-only file system are simply aggregated again next time
+    folder = os.path.dirname(path)
+    try:
+        os.makedirs(folder, exist_ok = True)
+        handle, tmp = tempfile.mkstemp(dir = folder, suffix = '.tmp')
+        os.close(handle)
+        try:
+            d.to_parquet(tmp, index = False)
+            os.replace(tmp, path)
+        except BaseException:
+            os.remove(tmp)
+            raise
+    except OSError:
+        return
+    wave_dir = os.path.dirname(folder)
+    for old in os.listdir(wave_dir):
+        if old != os.path.basename(folder):
+            shutil.rmtree(os.path.join(wave_dir, old), ignore_errors = True)
+
+
+@memoize_on_version
+def rank_summary(data, key = 'rank_support'):
+    #every statistic of a rank question, for all respondents and every group of GROUPINGS, from
+    #the group x item x rank counts (level_counts) and the pairwise counts (rank_pairs):
+    #'shares' of each rank among the respondents ranking each item, 'mean_rank', 'borda'
+    #(share of all Borda points: n - 1 for a first place, 0 for the last) and 'pairwise',
+    #the percentage preferring item i to item j among those ranking either of them
+    t = level_counts(data, key)
+    pairs = rank_pairs(data, key)['counts']
+    counts, ranks = t['counts'], np.array(t['levels'])
+    ranked = counts.sum(axis = 2)
+    points = counts @ (len(ranks) - ranks)
+    with np.errstate(invalid = 'ignore', divide = 'ignore'):
+        return dict(t, ranked = ranked,
+                    shares = 100*counts/ranked[:, :, None],
+                    mean_rank = counts @ ranks/ranked,
+                    borda = 100*points/points.sum(axis = 1, keepdims = True),
+                    pairwise = 100*pairs/(pairs + pairs.transpose(0, 2, 1)))
+
+
+def ranking_data(data, source = "Fleet managers", intervals = False):
+    #share of respondents ranking each type of support first, out of all respondents of the
+    #source who ranked financial support, whether or not they ranked the other items. with
+    #intervals, 'low' and 'high' columns bound the 95% bootstrap interval
+    r = rank_summary(data, 'rank_support')
+    g, first = r['groups'].get_loc(_group(source)), r['levels'].index(1)
+    positions, _ = _groups(data)
+    ranked = data['rank_support_financial'].notna().to_numpy()
+    tot = ranked.sum() if g == 0 else (ranked & (positions == g).any(axis = 1)).sum()
+    dfirst = pd.DataFrame({'question': r['items'], 'response': 1.0, 'counts': r['counts'][g, :, first]})
+    dfirst['percentage'] = 100*dfirst['counts']/tot
+    #sorted from supports in column-name order (as the former groupby gave them), so ties
+    #come out in the same order
+    dfirst = dfirst[dfirst.counts > 0].sort_values(by = 'question')
+    dfirst = dfirst.sort_values(by = 'counts', ascending = False).reset_index(drop = True)
+
+    if intervals:
+        ci = share_intervals(data, 'rank_support')
+        g = ci['groups'].get_loc(_group(source))
+        for bound in ('low', 'high'):
+            dfirst[bound] = dfirst['question'].map(pd.Series(ci[bound][g][:, first], index = ci['items']))
+    return dfirst
+
+
+def rank_distribution_data(data, question = 'rank_support', source = 'All', intervals = False):
+    #percentage of respondents giving each rank to each item for one source (or 'All'),
+    #items from the worst mean rank up (the best is drawn on top), with their mean ranks. sliced from rank_summary, so
+    #changing the source recomputes nothing. with intervals, (low, high) arrays shaped like
+    #xdata bound the 95% bootstrap interval
+    meta = QUESTIONS[question]
+    r = rank_summary(data, question)
+    g = r['groups'].get_loc(_group(source))
+    order = np.argsort(-r['mean_rank'][g], kind = 'stable')
+    xdata = r['shares'][g][order]
+    ydata = [meta.labels[r['items'][i]] for i in order]
+    top_labels = [meta.codes[l] for l in r['levels']]
+    mean_rank = r['mean_rank'][g][order]
+
+    if intervals:
+        ci = share_intervals(data, question)
+        g = ci['groups'].get_loc(_group(source))
+        return xdata, ydata, top_labels, mean_rank, tuple(ci[bound][g][order] for bound in ('low', 'high'))
+    return xdata, ydata, top_labels, mean_rank
+
+@memoize_on_version
+def role_data(data):
+    #percentage of respondents in each current role
+    roles = data['current_role'].map(QUESTIONS['current_role'].codes)
+    return (100*roles.value_counts()/len(data)).reset_index()
+
+
+@memoize_on_version
+def fleet_size_data(data):
+    #percentage of fleet managers in each fleet size class, every class in display order
+    fleet_sizes = QUESTIONS['fleet_size'].codes
+    d = data['fleet_size'].map(fleet_sizes).value_counts(normalize = True, dropna = True, sort = False)
+    d = d.reindex(list(fleet_sizes.values()), fill_value = 0)
+
+    d = d*100
+    return d.reset_index()
+
 
+@memoize_on_version
+def composition_data(data, fleet_type):
+    #average proportion of each vehicle characteristic in the fleets of one fleet type
+    #(fleet managers who described their whole fleet)
+    composition = list(QUESTIONS['fleet_composition'].columns)
+    d = data.loc[data.fleet_type == fleet_type, composition].dropna(how = 'any')
+    d = d.mean(axis = 0).reset_index().rename(columns = {'index':'veh_char', 0: 'average'})
+    return d.replace(QUESTIONS['fleet_composition'].labels)
 
-def ranking_data(data, source = "Fleet managers"):
-    d = data.copy()
-    rank_support_q = [c for c in d.columns if c.startswith('rank_support')]
-    rank_support_q = rank_support_q[:-1]
 
-    if source == "All":
-        tot = len(d[~d['rank_support_financial'].isna()])
-    else:
-        d = d[d.source == source]
-        tot = len(d[(~d['rank_support_financial'].isna())& (d.source == source)])
-    
-    d = d.melt(id_vars = ['id'], value_vars = rank_support_q, var_name = 'question', value_name = 'response').dropna()
-    d = d.groupby(['question', 'response']).size().reset_index().rename(columns = {0: 'counts'})
-    dmax = d.groupby(['question', 'response'])['counts'].sum().reset_index()
-    dmax['percentage'] = 100*dmax['counts']/tot
+@memoize_on_version
+def purchase_markets_data(data, source = 'All'):
+    #percentage of one source (or of all respondents) buying in each purchase market,
+    #respondents who answered 'not applicable' aside
+    shown = data.purchase_markets != 7
+    df = pd.DataFrame({'source': data.source[shown],
+                       'purchase_markets': data.purchase_markets[shown].map(QUESTIONS['purchase_markets'].codes)})
 
-    dfirst = dmax[dmax.response == 1].sort_values(by = 'counts', ascending = False).reset_index(drop=True)
+    if source == 'All':
+        ds = df[['source','purchase_markets']].groupby('purchase_markets').size()
+        ds = ds.reset_index().rename(columns = {0: 'count'})
+        ds['percentage'] = 100*ds['count']/len(df)
+        return ds
 
-    return dfirst
\ No newline at end of file
+    d = df[['source','purchase_markets']].groupby(['source', 'purchase_markets'], observed = True).size()
+    d = d.reset_index().rename(columns = {0: 'count'})
+    tot_groups = d.groupby('source', observed = True)['count'].sum().to_dict()
+    d['percentage'] = d.apply(lambda x:100*x['count']/tot_groups[x['source']], axis = 1)
+    return d[d.source == source]
@@ -0,0 +1,307 @@
+"""Static snapshot of the dashboard: every page, every widget state, no Python backend.
+
+Each chart in the registry (charts.CHARTS) is built for all the widget states its page
+offers, in parallel worker processes, and written as figure JSON: charts that can show 95%
+confidence intervals get a second figure per state with them, which the page's "Show 95%
+confidence intervals" box switches to. The narrative of each page is captured by running
+it headlessly once. Only the latest wave is exported, and the comment table unfiltered;
+what a page leaves out is listed in its footer and in the manifest ('omitted'). The result
+is plain files that any web server can serve:
+
+    python app/export_static.py -o site --workers 8
+    python -m http.server -d site
+"""
+import os
+import re
+import sys
+import json
+import html
+import time
+import shutil
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+import pandas as pd
+import plotly
+import plotly.io as pio
+from data_loader import APP_DIR, dataset_version, wave_paths
+from charts import CHARTS, PAGE_QUESTIONS, chart_data
+
+PAGE_FILES = {'overview': '1_Respondent_and_Company_Overview.py',
+              'turnover': '2_Turnover_Practices.py',
+              'renewal': '3_Fleet_Renewal.py',
+              'comments': '4_Open_Comments.py'}
+
+#number inputs that page through a table, by page: the export shows the table's every page
+#at once, in place of the page on display
+PAGERS = {'comments': 'comment_page'}
+#the paged table's caption, and what it says in the export
+PAGED_CAPTION = (r'Displaying comments \d+-\d+ of (\d+)\.', r'Displaying all \1 comments.')
+#widgets of the comments page the export leaves at their defaults (every combination of
+#filters would be a table of its own)
+COMMENT_DEFAULTS = ['Filter by group, Filter by topic and Search comments: the table lists every '
+                    'categorized comment, unfiltered.',
+                    'Sort by and Comments per page: the table is in its default order, all pages at once.']
+
+PAGE_TEMPLATE = """<!DOCTYPE html>
+<html lang="en">
+<head>
+<meta charset="utf-8">
+<title>{title} - Northwestern MHDV Survey</title>
+<script src="plotly.min.js"></script>
+<style>
+body {{ font-family: sans-serif; max-width: 1000px; margin: 0 auto; padding: 1em 2em; color: #31333f; }}
+nav a {{ margin-right: 1em; }}
+blockquote {{ border-left: 3px solid #ccc; margin-left: 0; padding-left: 1em; color: #555; }}
+table {{ border-collapse: collapse; font-size: 13px; }}
+td, th {{ border: 1px solid #e6e6e6; padding: 4px 8px; vertical-align: top; text-align: left; }}
+.chart select {{ margin: .5em 0; padding: 4px; }}
+.intervals {{ display: block; margin: .5em 0; }}
+footer {{ margin-top: 2em; border-top: 1px solid #e6e6e6; color: #555; font-size: 13px; }}
+</style>
+</head>
+<body>
+<nav>{nav}</nav>
+{body}
+{footer}
+<script>
+var intervals = document.getElementById('intervals');
+document.querySelectorAll('.chart').forEach(function (chart) {{
+  var select = chart.querySelector('select'), plot = chart.querySelector('.plot');
+  var withIntervals = intervals && chart.dataset.intervals;
+  function show() {{
+    fetch(chart.dataset.figures + (select ? select.value : '0') + (withIntervals && intervals.checked ? '-ci' : '') + '.json')
+      .then(function (response) {{ return response.json(); }})
+      .then(function (figure) {{ Plotly.react(plot, figure.data, figure.layout); }});
+  }}
+  if (select) select.addEventListener('change', show);
+  if (withIntervals) intervals.addEventListener('change', show);
+  show();
+}});
+</script>
+</body>
+</html>
+"""
+
+
+def state_label(state):
+    #readable name of one combination of widget values
+    values = []
+    for value in state.values():
+        if isinstance(value, (list, tuple)):
+            value = ' + '.join(value) or 'None selected'
+        if value is not None:
+            values.append(str(value))
+    return ' / '.join(values) or 'Default'
+
+
+def _inline(text, allow_html):
+    text = text if allow_html else html.escape(text, quote = False)
+    text = re.sub(r'\[([^\]]+)\]\(([^)]+)\)', r'<a href="\2">\1</a>', text)
+    text = re.sub(r'\*\*(.+?)\*\*', r'<b>\1</b>', text)
+    return re.sub(r'(?<![\w*])\*(?!\s)(.+?)(?<!\s)\*(?![\w*])', r'<i>\1</i>', text)
+
+
+def markdown_html(text, allow_html = False):
+    #HTML of the markdown subset the pages use: headings, paragraphs, emphasis, links,
+    #lists and quotes. raw HTML is kept only where the page allowed it
+    if allow_html and text.lstrip().startswith('<'):
+        return text
+    out, kind, items = [], None, []
+
+    def flush():
+        if kind in ('ol', 'ul'):
+            out.append(f'<{kind}>' + ''.join(f'<li>{i}</li>' for i in items) + f'</{kind}>')
+        elif kind == 'blockquote':
+            out.append('<blockquote><p>' + ' '.join(items) + '</p></blockquote>')
+        elif kind == 'p':
+            out.append('<p>' + ' '.join(items) + '</p>')
+
+    for line in text.splitlines() + ['']:
+        stripped = line.strip()
+        heading = re.match(r'(#{1,6})\s+(.*)', stripped)
+        item = re.match(r'(\d+\.|[-*])\s+(.*)', stripped)
+        if heading:
+            line_kind, content = 'h', heading.group(2)
+        elif item and not stripped.startswith('**'):
+            line_kind, content = ('ol' if item.group(1)[0].isdigit() else 'ul'), item.group(2)
+        elif stripped.startswith('>'):
+            line_kind, content = 'blockquote', stripped[1:].strip()
+        elif stripped:
+            line_kind, content = 'p', stripped
+        else:
+            line_kind, content = None, None
+        if line_kind != kind or line_kind == 'h':
+            flush()
+            kind, items = line_kind, []
+        if line_kind == 'h':
+            n = len(heading.group(1))
+            out.append(f'<h{n}>{_inline(content, allow_html)}</h{n}>')
+            kind = None
+        elif content:
+            items.append(_inline(content, allow_html))
+    return '\n'.join(out)
+
+
+def figure_file(page, key, i, intervals = False):
+    #figure JSON of one chart state, relative to the site
+    return f'figures/{page}/{key}/{i}{"-ci" if intervals else ""}.json'
+
+
+def _render(task):
+    #figure JSON of one chart state, with or without intervals (runs in a worker process)
+    page, key, i, intervals = task
+    chart = CHARTS[(page, key)]
+    widgets = dict(chart.states[i], **({'intervals': True} if intervals else {}))
+    return task, pio.to_json(chart.build(chart_data(chart), **widgets), validate = False)
+
+
+def export_figures(out_dir, workers = None):
+    #build every state of every chart in parallel, with intervals too where the chart shows
+    #them, and write each figure to its figure_file
+    tasks = [(page, key, i, ci) for (page, key), chart in CHARTS.items() for i in range(len(chart.states))
+             for ci in ((False, True) if chart.intervals else (False,))]
+    with ProcessPoolExecutor(max_workers = workers) as pool:
+        for task, spec in pool.map(_render, tasks, chunksize = 4):
+            path = os.path.join(out_dir, figure_file(*task))
+            os.makedirs(os.path.dirname(path), exist_ok = True)
+            with open(path, 'w') as f:
+                f.write(spec)
+    return len(tasks)
+
+
+def _elements(node):
+    #page elements in display order, descending into containers
+    for child in getattr(node, 'children', {}).values():
+        if child.type in ('flex_container', 'vertical', 'horizontal', 'column'):
+            yield from _elements(child)
+        else:
+            yield child
+
+
+def _chart_html(page, key):
+    chart = CHARTS[(page, key)]
+    select = ''
+    if len(chart.states) > 1:
+        options = ''.join(f'<option value="{i}">{html.escape(state_label(s))}</option>'
+                          for i, s in enumerate(chart.states))
+        select = f'<select aria-label="Filter">{options}</select>'
+    intervals = ' data-intervals="1"' if chart.intervals else ''
+    return (f'<div class="chart" data-figures="figures/{page}/{key}/"{intervals}>{select}'
+            f'<div class="plot"></div></div>')
+
+
+def _every_page(at, key):
+    #the rows of every page of a paged table (its pager: the number input `key`), in order.
+    #the app is left on its last page
+    pager = at.number_input(key = key)
+    frames = [at.dataframe[0].value]
+    for number in range(pager.value + 1, int(pager.max) + 1):
+        at.number_input(key = key).set_value(number).run()
+        if at.exception:
+            raise RuntimeError(f'page {number} of the table: {at.exception[0].value}')
+        frames.append(at.dataframe[0].value)
+    return pd.concat(frames)
+
+
+def omitted_states(wave_names):
+    #{page: notes} on the widget states of each page that the export does not offer
+    omitted = {page: [] for page in PAGE_FILES}
+    if len(wave_names) > 1:
+        for page in PAGE_QUESTIONS:
+            omitted[page].append(f'Survey wave: only {wave_names[-1]} is exported, not '
+                                 f'{", ".join(wave_names[:-1])}.')
+    for page in {p for (p, _), chart in CHARTS.items() if any('by' in s for s in chart.states)}:
+        omitted[page].append('Break down by an attribute other than the group: all its groups are '
+                             'shown together, not a selection of them.')
+    omitted['comments'] += COMMENT_DEFAULTS
+    return {page: notes for page, notes in omitted.items() if notes}
+
+
+def footer_html(notes):
+    if not notes:
+        return ''
+    items = ''.join(f'<li>{html.escape(n)}</li>' for n in notes)
+    return f'<footer><p>Not in this snapshot:</p><ul>{items}</ul></footer>'
+
+
+def page_html(script, page = None):
+    #body of one page: its text as rendered with default widget values, charts replaced by
+    #selectable snapshots of the registry chart at the same position, and paged tables
+    #(PAGERS) shown whole
+    from streamlit.testing.v1 import AppTest
+
+    at = AppTest.from_file(script, default_timeout = 600).run()
+    if at.exception:
+        raise RuntimeError(f'{script}: {at.exception[0].value}')
+    charts = [key for (p, key) in CHARTS if p == page]
+    body = []
+    for element in _elements(at.main):
+        if element.type in ('header', 'subheader', 'title'):
+            tag, anchor = element.proto.tag, element.proto.anchor
+            anchor = f' id="{html.escape(anchor)}"' if anchor else ''
+            body.append(f'<{tag}{anchor}>{html.escape(element.value)}</{tag}>')
+        elif element.type == 'markdown':
+            text = re.sub(*PAGED_CAPTION, element.value) if page in PAGERS else element.value
+            body.append(markdown_html(text, element.proto.allow_html))
+        elif element.type == 'plotly_chart':
+            body.append(_chart_html(page, charts.pop(0)))
+        elif element.type == 'arrow_data_frame':
+            table = len(body)
+            body.append(element.value)
+    if charts:
+        raise RuntimeError(f'{script}: charts {charts} were not displayed')
+    if page in PAGERS:
+        body[table] = _every_page(at, PAGERS[page])
+    body = [b.to_html(index = False, na_rep = '', border = 0) if isinstance(b, pd.DataFrame) else b for b in body]
+    if any(chart.intervals for (p, _), chart in CHARTS.items() if p == page):
+        #the page's sidebar toggle, for every chart of the page that shows intervals
+        body.insert(min(1, len(body)), '<label class="intervals"><input type="checkbox" id="intervals"> '
+                       'Show 95% confidence intervals</label>')
+    return '\n'.join(body)
+
+
+def export_site(out_dir, workers = None):
+    #write the static site: index, one html file per page, figure JSON and plotly.js
+    start = time.perf_counter()
+    os.makedirs(out_dir, exist_ok = True)
+    n = export_figures(out_dir, workers)
+    shutil.copy(os.path.join(os.path.dirname(plotly.__file__), 'package_data', 'plotly.min.js'), out_dir)
+
+    #pages open their data files relative to the repository root
+    cwd = os.getcwd()
+    os.chdir(os.path.dirname(APP_DIR))
+    try:
+        pages = {'index': ('Introduction', page_html(os.path.join(APP_DIR, 'Introduction.py')))}
+        for page, script in PAGE_FILES.items():
+            title = script[2:-3].replace('_', ' ')
+            pages[page] = (title, page_html(os.path.join(APP_DIR, 'pages', script), page))
+    finally:
+        os.chdir(cwd)
+
+    paths = wave_paths()
+    omitted = omitted_states(list(paths))
+    nav = ' '.join(f'<a href="{page}.html">{html.escape(title)}</a>' for page, (title, _) in pages.items())
+    for page, (title, body) in pages.items():
+        with open(os.path.join(out_dir, f'{page}.html'), 'w', encoding = 'utf-8') as f:
+            f.write(PAGE_TEMPLATE.format(title = html.escape(title), nav = nav, body = body,
+                                         footer = footer_html(omitted.get(page))))
+
+    wave, path = list(paths.items())[-1]
+    manifest = {'wave': wave, 'dataset_version': dataset_version(path), 'generated': time.strftime('%Y-%m-%dT%H:%M:%S'),
+                'omitted': omitted,
+                'charts': {f'{page}/{key}': [dict({'file': figure_file(page, key, i), 'label': state_label(s), 'widgets': s},
+                                                  **({'intervals_file': figure_file(page, key, i, True)} if chart.intervals else {}))
+                                             for i, s in enumerate(chart.states)]
+                           for (page, key), chart in CHARTS.items()}}
+    with open(os.path.join(out_dir, 'manifest.json'), 'w') as f:
+        json.dump(manifest, f, indent = 1)
+    return n, time.perf_counter() - start
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("-o", "--output", default="site", help="output directory")
+    parser.add_argument("--workers", type=int, default=None, help="worker processes (default: one per CPU)")
+    args = parser.parse_args()
+    n, elapsed = export_site(os.path.abspath(args.output), args.workers)
+    print(f"{n} figures written to {args.output} in {elapsed:.1f}s", file=sys.stderr)
@@ -0,0 +1,76 @@
+import os
+import json
+import threading
+from collections import OrderedDict
+import plotly.io as pio
+import plotly.graph_objects as go
+
+#bytes of serialized figures kept per process; MHDV_FIGURE_CACHE_BYTES overrides it
+FIGURE_CACHE_BYTES = int(os.environ.get("MHDV_FIGURE_CACHE_BYTES", 32 << 20))
+
+_FIGURES = OrderedDict()
+_LOCK = threading.Lock()
+_STATS = {'hits': 0, 'misses': 0, 'evictions': 0, 'bytes': 0}
+
+
+def _freeze(value):
+    #hashable form of a widget value; multi-select values are order-insensitive
+    if isinstance(value, dict):
+        return tuple(sorted((k, _freeze(v)) for k, v in value.items()))
+    if isinstance(value, (list, tuple, set)):
+        return tuple(sorted((_freeze(v) for v in value), key = repr))
+    return value
+
+
+def figure_key(page, chart, widgets, fingerprint):
+    return (page, chart, _freeze(widgets), fingerprint)
+
+
+def _store(key, spec):
+    #insert as most recently used, then evict the least recently used past the byte budget
+    if len(spec) > FIGURE_CACHE_BYTES:
+        return
+    if key in _FIGURES:
+        _STATS['bytes'] -= len(_FIGURES.pop(key))
+    _FIGURES[key] = spec
+    _STATS['bytes'] += len(spec)
+    while _STATS['bytes'] > FIGURE_CACHE_BYTES:
+        _, old = _FIGURES.popitem(last = False)
+        _STATS['bytes'] -= len(old)
+        _STATS['evictions'] += 1
+
+
+def figure_json(key, build):
+    #serialized (utf-8 JSON) figure for key, from build() on a miss. keys without a dataset
+    #fingerprint (last element None) are never cached
+    if key[-1] is None:
+        return pio.to_json(build(), validate = False).encode()
+    with _LOCK:
+        spec = _FIGURES.get(key)
+        if spec is not None:
+            _FIGURES.move_to_end(key)
+            _STATS['hits'] += 1
+            return spec
+
+    spec = pio.to_json(build(), validate = False).encode()
+    with _LOCK:
+        _STATS['misses'] += 1
+        _store(key, spec)
+    return spec
+
+
+def cached_figure(page, chart, widgets, fingerprint, build):
+    #figure of one chart configuration, rebuilt from its cached JSON without re-validation
+    spec = figure_json(figure_key(page, chart, widgets, fingerprint), build)
+    return go.Figure(json.loads(spec), _validate = False)
+
+
+def cache_info():
+    with _LOCK:
+        return dict(_STATS, entries = len(_FIGURES), budget = FIGURE_CACHE_BYTES)
+
+
+def clear_figure_cache():
+    with _LOCK:
+        _FIGURES.clear()
+        _STATS.update(hits = 0, misses = 0, evictions = 0, bytes = 0)
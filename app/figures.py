@@ -0,0 +1,75 @@
+import numpy as np
+import plotly.graph_objects as go
+
+COLORS_LIKERT_3 = ["#ef8a62","#c7c7c7", "#67a9cf"]
+COLORS_LIKERT_4 = ["#ef8a62","#c7c7c7", "#92c5de", "#0571b0"]
+#ranks from first (darkest) to last
+COLORS_RANK_5 = ["#0571b0", "#92c5de", "#c7c7c7", "#f4a582", "#ca0020"]
+
+
+def error_bars(x, errors, **style):
+    #asymmetric plotly error bars for values x from (low, high) interval bounds
+    low, high = (np.asarray(b) for b in errors)
+    x = np.asarray(x)
+    return dict(type='data', symmetric=False, array=list(high - x), arrayminus=list(x - low), **style)
+
+
+def stacked_bars(xdata, ydata, top_labels, colors, title, width = 950, height = 500,
+                 margin = None, legend_y = 1.2, errors = None):
+    #horizontal stacked bars of the percentage of each answer level (columns of xdata) for each
+    #item or group (ydata): one trace per level, items labelled on the y axis. errors, (low, high)
+    #arrays shaped like xdata, are drawn at the end of each segment
+    xdata = np.asarray(xdata)
+    ydata = [str(y) for y in ydata]
+    fig = go.Figure([go.Bar(
+        x=xdata[:, i], y=ydata,
+        orientation='h',
+        name=label,
+        marker=dict(
+            color=colors[i],
+            line=dict(color='ghostwhite', width=1),
+        ),
+        legendgroup=label,
+        **({} if errors is None else
+           {'error_x': error_bars(xdata[:, i], [b[:, i] for b in errors], color='rgb(68, 68, 68)', thickness=1, width=3)}),
+    ) for i, label in enumerate(top_labels)])
+
+    fig.update_layout(
+        title=title,
+        xaxis=dict(
+            showgrid=False,
+            showline=True,
+            linecolor='rgb(102, 102, 102)',
+            tickfont_color='rgb(102, 102, 102)',
+            showticklabels=True,
+            dtick=10,
+            ticks='outside',
+            tickcolor='rgb(102, 102, 102)',
+            title = 'Percentage of respondents',
+        ),
+        yaxis=dict(
+            showgrid=False,
+            showline=False,
+            zeroline=False,
+            type='category',
+            categoryorder='array',
+            categoryarray=ydata,
+            ticksuffix='  ',
+            tickfont=dict(family='Arial', size=14, color='dimgray'),
+        ),
+        barmode='stack',
+        paper_bgcolor='white',
+        plot_bgcolor='white',
+        margin=margin or dict(l=120, r=10, t=140, b=80),
+        width = width,
+        height = height,
+        legend=dict(
+            font_size=10,
+            orientation="h",
+            yanchor="top",
+            y=legend_y,
+            xanchor="center",
+            x = 0.5
+        ),
+    )
+    return fig
@@ -0,0 +1,106 @@
+"""Appending new survey responses to the live survey table.
+
+A batch of respondents (a CSV with the survey's column names; columns left out are
+unanswered) is checked against the schema and the table it joins, then appended to the
+survey csv. Tables already loaded by the dashboard are extended in memory, the dataset
+version moves to the hash of the new file, and the group counts of multi-select, Likert,
+single-choice and rank questions are updated from the new rows alone:
+
+    python app/ingest.py new_responses.csv
+"""
+import sys
+import argparse
+import numpy as np
+import pandas as pd
+from data_loader import DATA_PATH, load_data, append_data
+from schema import QUESTIONS, MULTI_SELECT, RANK, NUMERIC, TEXT, ONEHOT_COLUMNS, CATEGORICAL_COLUMNS
+
+
+def _is_text(column):
+    return column.endswith('_TEXT') or any(q.kind == TEXT and column in q.columns for q in QUESTIONS.values())
+
+
+def _rows(mask):
+    rows = list(np.flatnonzero(mask)[:5])
+    return ', '.join(map(str, rows)) + (', ...' if mask.sum() > 5 else '')
+
+
+def validate_batch(batch, path = None):
+    #the batch in survey column order and loader dtypes, or a ValueError listing every problem
+    path = path or DATA_PATH
+    header = [c for c in pd.read_csv(path, nrows=0).columns if not c.startswith('Unnamed: ')]
+    batch = batch.drop(columns = [c for c in batch.columns if str(c).startswith('Unnamed: ')])
+    batch = batch.reset_index(drop = True)
+    errors = []
+
+    unknown = [c for c in batch.columns if c not in header]
+    if unknown:
+        errors.append(f'unknown columns: {", ".join(map(str, unknown))}')
+    rows = batch.reindex(columns = header)
+
+    ids = rows['id']
+    if ids.isna().any():
+        errors.append(f'id: missing in rows {_rows(ids.isna())}')
+    if ids.duplicated().any():
+        errors.append(f'id: repeated in rows {_rows(ids.duplicated().to_numpy())}')
+    known = ids.isin(load_data(path, columns = ['id'])['id'])
+    if known.any():
+        errors.append(f'id: already in the survey in rows {_rows(known.to_numpy())}')
+    if rows['source'].isna().any():
+        errors.append(f'source: missing in rows {_rows(rows["source"].isna())}')
+
+    for c in header:
+        if c == 'id' or c in CATEGORICAL_COLUMNS or _is_text(c):
+            continue
+        values = pd.to_numeric(rows[c], errors = 'coerce')
+        bad = values.isna() & rows[c].notna()
+        if bad.any():
+            errors.append(f'{c}: not a number in rows {_rows(bad)}')
+        rows[c] = values
+
+    for q in QUESTIONS.values():
+        columns = [c for c in q.columns if c in header]
+        if not columns or q.kind in (TEXT, NUMERIC):
+            continue
+        x = rows[columns]
+        if q.kind == MULTI_SELECT:
+            bad = (x.notna() & ~x.isin([0, 1])).any(axis = 1)
+            what = 'not 0/1'
+        elif q.kind == RANK:
+            #ranks of the answered items must be 1..k, each once
+            ranks = np.sort(x.to_numpy(dtype = float), axis = 1)
+            bad = ~((ranks == np.arange(1, len(columns) + 1)) | np.isnan(ranks)).all(axis = 1)
+            what = 'not a ranking 1..k'
+        elif columns[0] in CATEGORICAL_COLUMNS:
+            bad = (x.notna() & ~x.isin(list(q.codes))).any(axis = 1)
+            what = f'not one of {", ".join(map(str, q.codes))}'
+        else:
+            #coded answers; codes outside the registry (e.g. 'not applicable') are kept but not charted
+            bad = (x.notna() & ((x % 1 != 0) | (x < 0))).any(axis = 1)
+            what = 'not an answer code'
+        if bad.any():
+            errors.append(f'{q.key}: {what} in rows {_rows(np.asarray(bad))}')
+
+    if errors:
+        raise ValueError('invalid survey responses:\n  ' + '\n  '.join(errors))
+    for c in header:
+        if c in ONEHOT_COLUMNS:
+            rows[c] = rows[c].astype('float32')
+    return rows
+
+
+def append_responses(batch, path = None):
+    #validate a batch of new respondents and append it; returns the new dataset version
+    return append_data(validate_batch(batch, path), path)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("csv", help="new responses")
+    parser.add_argument("--data", default=None, help="survey csv to append to (default: the app's)")
+    args = parser.parse_args()
+    try:
+        version = append_responses(pd.read_csv(args.csv), args.data)
+    except ValueError as e:
+        sys.exit(str(e))
+    print(version)
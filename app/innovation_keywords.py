@@ -0,0 +1,154 @@
+"""Innovation keyword shares (innovation_best_worst.csv) computed from the raw answers.
+
+The free-text answers to the most and least promising innovations (innovation_best_TEXT,
+innovation_worst_TEXT) are normalized (case, accents, acronym dots, punctuation) and
+matched against a table of innovations and their synonyms, compiled into a single regex
+with one named group per innovation. An answer mentions an innovation at most once; the
+share of an innovation is its mentions over all mentions by the same group of respondents.
+The survey table is read in chunks of rows, so memory stays bounded however many
+responses a wave has.
+
+The keyword matching does not reproduce the hand-coded innovation_best_worst.csv that the
+treemap shows and the page text quotes (e.g. owner-operators' best mileage share: 31.8
+here against 43.8 there), so the pipeline is not wired into the dashboard: the treemap
+always reads the hand-coded data_loader.INNOVATION_PATH, for every wave. Each wave's table
+is written next to it, to innovation_keywords/<wave>.csv in the app directory (wherever
+the script is run from), for review; point -o at the hand-coded file only to replace it
+deliberately:
+
+    python app/innovation_keywords.py                   # latest wave -> app/innovation_keywords/<wave>.csv
+    python app/innovation_keywords.py --wave "Wave 2" -o wave2_innovations.csv
+    python app/innovation_keywords.py --synonyms my_synonyms.csv
+
+A synonyms file has columns Innovation and Synonym (a regular expression over the
+normalized text: lower case, words separated by single spaces), one row per synonym.
+"""
+import os
+import re
+import sys
+import argparse
+import numpy as np
+import pandas as pd
+from data_loader import DEFAULT_WAVE, INNOVATION_PATH, wave_paths
+
+QUESTIONS = {'Best': 'innovation_best_TEXT', 'Worst': 'innovation_worst_TEXT'}
+#table columns of the groups of respondents
+GROUPS = {'Fleet managers': 'FM', 'Owner-Operators': 'OO', 'Other': 'Other'}
+CHUNK_ROWS = 50_000
+#default outputs, one per wave, next to (and apart from) the hand-coded INNOVATION_PATH
+OUTPUT_DIR = os.path.join(os.path.dirname(INNOVATION_PATH), 'innovation_keywords')
+
+SYNONYMS = {
+    'ai': [r'ai', r'artificial intelligence'],
+    'autonomous/self-driving': [r'autonomous', r'self driving', r'driverless', r'auto driving', r'automation',
+                                r'robot trucks?'],
+    'electric/ev/evs': [r'electri\w*', r'evs?', r'bevs?', r'batter(?:y|ies)'],
+    'fleet management systems/services': [r'fleet management'],
+    'hybrid': [r'hybrids?', r'phevs?'],
+    'hydrogen': [r'hydrogen', r'fuel cells?'],
+    'improved GPS + route planning/optimization': [r'gps', r'routes?', r'routing', r'navigation', r'maps?',
+                                                   r'trip planning'],
+    'infrastructure': [r'infr[au]structure', r'charging'],
+    'mileage/fuel efficiency': [r'mil(?:e)?age', r'fuel (?:economy|consumption|savings?)', r'ef+ic\w*', r'effecien\w*'],
+    'predictive maintenance': [r'predictive maint\w*', r'condition base(?:d)? maint\w*'],
+    'real-time data/information': [r'real time'],
+    'regulations': [r'regulat\w*', r'epa', r'mandates?', r'restrictions?'],
+    'telematics': [r'telemat\w*', r'telemetr\w*', r'eld', r'geotab', r'dash cams?'],
+    'tracking': [r'track(?:ing|er|ers)?'],
+}
+
+
+def load_synonyms(path):
+    #{innovation: [synonym patterns]} of a csv with Innovation and Synonym columns
+    table = pd.read_csv(path, dtype = str).dropna()
+    return {k: list(g['Synonym']) for k, g in table.groupby('Innovation', sort = False)}
+
+
+def compile_synonyms(synonyms):
+    #one regex matching any synonym as whole words; group k<i> is set for the i-th innovation
+    groups = [f'(?P<k{i}>{"|".join(sorted(patterns, key = len, reverse = True))})'
+              for i, patterns in enumerate(synonyms.values())]
+    return re.compile(r'\b(?:' + '|'.join(groups) + r')\b')
+
+
+def normalize(text):
+    #lower case ascii-folded words separated by single spaces; 'A.I.' reads 'ai', "EV's" 'evs'
+    text = text.str.lower().str.replace(r"\b(\w)\.(?=\w\b)", r'\1', regex = True).str.replace(r"['\u2019]", '', regex = True)
+    text = text.str.replace(r'[\W_]+', ' ', regex = True)
+    return text.str.normalize('NFKD').str.encode('ascii', 'ignore').str.decode('ascii').str.strip()
+
+
+def mentions(text, pattern, n_innovations):
+    #answers x innovations 0/1 matrix: which innovations each answer mentions. each distinct
+    #answer is matched once
+    codes, answers = pd.factorize(text)
+    #the last row stands for missing answers
+    found = np.zeros((len(answers) + 1, n_innovations), dtype = bool)
+    for i, answer in enumerate(normalize(pd.Series(answers, dtype = object))):
+        for match in pattern.finditer(answer):
+            found[i, int(match.lastgroup[1:])] = True
+    return found[codes]
+
+
+def _chunks(path, columns, chunk_rows):
+    #the columns of the survey table at path, chunk_rows rows at a time
+    if path.endswith('.parquet'):
+        import pyarrow.parquet as pq
+
+        for batch in pq.ParquetFile(path).iter_batches(batch_size = chunk_rows, columns = columns):
+            yield batch.to_pandas()
+    else:
+        yield from pd.read_csv(path, usecols = columns, chunksize = chunk_rows)
+
+
+def innovation_counts(path, synonyms = SYNONYMS, chunk_rows = CHUNK_ROWS):
+    #mentions of every innovation: question x group x innovation counts
+    pattern = compile_synonyms(synonyms)
+    groups = list(GROUPS)
+    counts = np.zeros((len(QUESTIONS), len(groups), len(synonyms)), dtype = 'int64')
+    for chunk in _chunks(path, ['source', *QUESTIONS.values()], chunk_rows):
+        group = pd.Categorical(chunk['source'], categories = groups).codes
+        for q, column in enumerate(QUESTIONS.values()):
+            hits = mentions(chunk[column].where(group >= 0), pattern, len(synonyms))
+            for g in range(len(groups)):
+                counts[q, g] += hits[group == g].sum(axis = 0)
+    return counts
+
+
+def innovation_table(path, synonyms = SYNONYMS, chunk_rows = CHUNK_ROWS):
+    #percentage of each group's mentions that name each innovation, per question, in the
+    #shape of innovation_best_worst.csv: Category, Innovation, then one column per group
+    counts = innovation_counts(path, synonyms, chunk_rows)
+    totals = counts.sum(axis = 2, keepdims = True)
+    shares = np.round(100*counts/np.maximum(totals, 1), 1)
+    index = pd.MultiIndex.from_product([list(QUESTIONS), list(synonyms)], names = ['Category', 'Innovation'])
+    table = pd.DataFrame(shares.transpose(0, 2, 1).reshape(-1, len(GROUPS)), index = index, columns = list(GROUPS.values()))
+    return table.reset_index()
+
+
+def output_path(wave):
+    #default output of a wave's table
+    return os.path.join(OUTPUT_DIR, f'{wave}.csv')
+
+
+def write_innovation_table(wave = None, out_path = None, synonyms = SYNONYMS, chunk_rows = CHUNK_ROWS):
+    #the treemap table of the raw answers of a wave (the latest by default), written to
+    #out_path (output_path(wave) by default)
+    paths = wave_paths()
+    wave = list(paths)[-1] if wave is None else wave
+    if out_path is None:
+        out_path = output_path(wave)
+        os.makedirs(OUTPUT_DIR, exist_ok = True)
+    innovation_table(paths[wave], synonyms, chunk_rows).to_csv(out_path, index = False, float_format = '%g')
+    return out_path
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--wave", default=None, help=f"survey wave to read (default: the latest, {DEFAULT_WAVE} without partitions)")
+    parser.add_argument("-o", "--output", default=None, help="output csv (default: innovation_keywords/<wave>.csv in the app directory)")
+    parser.add_argument("--synonyms", default=None, help="csv of Innovation, Synonym rows replacing the built-in table")
+    parser.add_argument("--chunk-rows", type=int, default=CHUNK_ROWS)
+    args = parser.parse_args()
+    synonyms = load_synonyms(args.synonyms) if args.synonyms else SYNONYMS
+    print(write_innovation_table(args.wave, args.output, synonyms, args.chunk_rows), file=sys.stderr)
@@ -1,8 +1,7 @@
 
 import streamlit as st
-import pandas as pd
-import numpy as np
-import plotly.express as px
+from charts import show_chart
+from comments import comment_index
 
 st.set_page_config(
     page_title="Northwestern MHDV Survey")
@@ -26,17 +25,7 @@ st.markdown("For the most promising innovations, **A.I.** is the most mentioned
 st.markdown("*Click on any cell to zoom in.*")
 
 
-innov_df = pd.read_csv("app/innovation_best_worst.csv")
-innov_df = innov_df.melt(id_vars = ['Category', 'Innovation'], value_vars = ['FM', 'OO', 'Other'], var_name = 'source', value_name = 'proportion')
-innov_df['source'] = innov_df['source'].map({'FM': 'Fleet managers', 'OO': 'Owner-Operators', 'Other': 'Other'})
-
-colors_tm = ["#f7f7f7","#92c5de", "#f4a582"]
-f = px.treemap(innov_df, path =['source','Category', 'Innovation'], values = 'proportion',width=1000, height=500, template = 'ggplot2', color = 'Category', color_discrete_sequence = colors_tm, hover_data = ["source", "Category", "Innovation", "proportion"], hover_name = "Innovation")
-f.update_traces(root_color='rgb(243,243,243)',
-                hovertemplate=["Name=%{label}<br>Category=%{parent}<extra></extra>" if label in f.data[0].parents else "Category=%{parent}<br>Innovation=%{label}<br>Proportion=%{value}<extra></extra>" for label in f.data[0].ids])
-f.update_layout(title = dict(text = 'Proportion of keywords mentions per group'), uniformtext=dict(minsize=14),)
-
-st.plotly_chart(f)
+show_chart('comments', 'innovation_treemap')
 
 st.subheader("Misunderstood aspects of fleet renewal", anchor = "misunderstood")
 
@@ -44,41 +33,55 @@ st.markdown("This table displays all comments made by respondents, categorized i
 
 st.markdown("Several similarities emerge across fleet managers, owner-operators, and others in how they responded. **Costs** and the true **total cost of ownership** were emphasized by all three groups, with respondents in each noting that organizations tend to focus on upfront expenses while overlooking long-term factors such as maintenance, downtime, depreciation, and residual value. Similarly, **regulatory issues** were raised in every group, particularly around emissions standards, compliance burdens, and inconsistent rules across jurisdictions. Finally, **emerging technologies** (such as EVs, AI, and automation) appeared as a cross-cutting theme, though the tone ranged from optimism to skepticism depending on the respondent.")
 
-data = pd.read_csv('app/text_df.csv', encoding = 'utf-8-sig')
-data = data[~data.category1.isna()]
+comments = comment_index()
+#the table lists the comments that were categorized
+categories = list(comments.data['category1'].dropna().unique())
+
+
+def first_page():
+    #new filters or a new order start over from the first page
+    st.session_state["comment_page"] = 1
 
-button_source = st.pills("Filter by group", ['Fleet managers', 'Owner-Operators', 'Other'],  selection_mode="multi", default=None, key="button_source2")
+
+button_source = st.pills("Filter by group", ['Fleet managers', 'Owner-Operators', 'Other'],  selection_mode="multi", default=None, key="button_source2", on_change=first_page)
 
 button_topic = st.pills("Filter by topic", ['Technology', 'Brand/Image', 'Cost', 'Regulation',
-       'Organization', 'Operations', 'Maintenance', 'Environment'],  selection_mode="multi", key="button_topic2", default=None)
+       'Organization', 'Operations', 'Maintenance', 'Environment'],  selection_mode="multi", key="button_topic2", default=None, on_change=first_page)
 
-categories = data[~data["category1"].isna()]['category1'].unique()
+keywords = st.text_input("Search comments", key = "comment_search", placeholder = "e.g. maintenance cost", on_change = first_page)
 
+rows = comments.query(button_source, button_topic or categories, keywords)[0]
 
-if button_source:
-    if button_topic:
-        mask = (data.source.isin(button_source))& (data.category1.isin(button_topic) | data.category2.isin(button_topic))
-    else:
-        mask = data.source.isin(button_source)
-    data_filt = data[mask]
-else:
-    if button_topic:
-        mask = (data.category1.isin(button_topic) | data.category2.isin(button_topic))
-        data_filt = data[mask]
-    else: 
-        data_filt = data
+#the browser only receives the page of comments on display
+SORTS = {'Best match': (None, False), 'Group': ('source', False), 'Category': ('category1', False),
+         'Longest first': ('length', True)}
+col1, col2, col3 = st.columns(3)
+with col1:
+    sort_by = st.selectbox("Sort by", list(SORTS), key = "comment_sort", on_change = first_page)
+with col2:
+    page_size = st.selectbox("Comments per page", [25, 50, 100], key = "comment_page_size", on_change = first_page)
+n_pages = max(-(-len(rows)//page_size), 1)
+if st.session_state.get("comment_page", 1) > n_pages:
+    st.session_state["comment_page"] = n_pages
+with col3:
+    page = st.number_input(f"Page (of {n_pages})", min_value = 1, max_value = n_pages, step = 1, key = "comment_page")
+start = (page - 1)*page_size
+data_page = comments.page(rows, start, page_size, *SORTS[sort_by])
 
 
 COLUMN_CONFIG = {
-    "source":st.column_config.MultiselectColumn(label = 'Group', options=set(data["source"].unique()), color="auto", width = 'medium'),
+    "source":st.column_config.MultiselectColumn(label = 'Group', options=set(comments.sources), color="auto", width = 'medium'),
     "comment":st.column_config.TextColumn(label = 'Comment', width = 'large'),
     "category1": st.column_config.MultiselectColumn(label = 'Category 1', options=categories, color="auto", width = 'medium'),
     "category2": st.column_config.MultiselectColumn(label = 'Category 2', options=categories, color="auto", width = 'medium')
 }
 
-f'*Displaying {len(data_filt)} comments. Click on any "comment" cell to read full comment.*'
+if len(rows):
+    f'*Displaying comments {start + 1}-{start + len(data_page)} of {len(rows)}. Click on any "comment" cell to read full comment.*'
+else:
+    '*No comments match these filters.*'
 
-st.dataframe(data_filt, hide_index = True, column_config = COLUMN_CONFIG)
+st.dataframe(data_page, hide_index = True, column_config = COLUMN_CONFIG)
 
 with st.container():
     st.markdown("""<div style="float: right;
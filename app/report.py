@@ -0,0 +1,217 @@
+"""Headless report builder: every aggregate behind the dashboard charts, in one bundle.
+
+Each survey chart of the registry (charts.CHARTS) is built for every widget state its page
+offers, with and without confidence intervals where it shows them, in parallel worker
+processes. The workers load the survey table as the pages do and record the memoized
+aggregates the charts ask data_processing and aggregates for (group x item x level counts,
+shares, rank statistics, bootstrap intervals, ...). The results are written as one bundle
+per dataset version:
+
+    <output>/<version>/manifest.json    wave, dataset version, and every aggregate: the
+                                        function, its arguments and the table projection
+                                        it was computed on, its value as JSON
+    <output>/<version>/frames/*.parquet tables and arrays the values refer to
+    <output>/index.json                 latest bundle of every wave
+
+    python app/report.py -o reports --workers 4
+    python app/report.py -o reports --wave "Wave 2" --no-intervals
+
+Dashboard processes started with MHDV_REPORT_BUNDLE=<output> use the aggregates of the
+bundle matching the version of the table they load instead of computing them; a bundle
+for another version is ignored.
+"""
+import os
+import sys
+import json
+import time
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+from data_loader import dataset_version, wave_paths, record_memoized
+
+FORMAT = 1
+
+
+def bundle_dir(root, version):
+    return os.path.join(root, version[:16])
+
+
+def bundle_manifest(root, version):
+    return os.path.join(bundle_dir(root, version), 'manifest.json')
+
+
+class _Writer:
+    #JSON form of aggregate values: containers and scalars inline, tables and arrays as
+    #parquet files next to the manifest
+    def __init__(self, folder):
+        self.folder = folder
+        self.files = 0
+        os.makedirs(os.path.join(folder, 'frames'), exist_ok = True)
+
+    def _frame(self, frame):
+        name = f'frames/{self.files}.parquet'
+        self.files += 1
+        frame.to_parquet(os.path.join(self.folder, name))
+        return name
+
+    def encode(self, value):
+        if value is None or isinstance(value, (bool, str)):
+            return value
+        if isinstance(value, (int, float, np.number, np.bool_)):
+            value = value.item() if isinstance(value, (np.number, np.bool_)) else value
+            return value if np.isfinite(value) else {'float': repr(value)}
+        if isinstance(value, tuple):
+            return {'tuple': [self.encode(v) for v in value]}
+        if isinstance(value, list):
+            return [self.encode(v) for v in value]
+        if isinstance(value, dict):
+            return {'dict': [[self.encode(k), self.encode(v)] for k, v in value.items()]}
+        if isinstance(value, np.ndarray):
+            return {'array': self._frame(pd.DataFrame({'values': value.ravel()})), 'shape': list(value.shape),
+                    'dtype': value.dtype.str}
+        if isinstance(value, pd.Index):
+            levels = pd.DataFrame({f'level_{i}': value.get_level_values(i) for i in range(value.nlevels)})
+            return {'index': self._frame(levels), 'names': self.encode(list(value.names)),
+                    'multi': isinstance(value, pd.MultiIndex)}
+        if isinstance(value, pd.Series):
+            return {'series': self._frame(value.to_frame(name = 'values')), 'name': self.encode(value.name)}
+        if isinstance(value, pd.DataFrame):
+            return {'frame': self._frame(value)}
+        raise TypeError(f'cannot write {type(value).__name__} to a report bundle')
+
+
+class _Reader:
+    def __init__(self, folder):
+        self.folder = folder
+
+    def _frame(self, name):
+        return pd.read_parquet(os.path.join(self.folder, name))
+
+    def decode(self, value):
+        if isinstance(value, list):
+            return [self.decode(v) for v in value]
+        if not isinstance(value, dict):
+            return value
+        (kind, content), *rest = value.items()
+        if kind == 'float':
+            return float(content)
+        if kind == 'tuple':
+            return tuple(self.decode(v) for v in content)
+        if kind == 'dict':
+            return {self.decode(k): self.decode(v) for k, v in content}
+        if kind == 'array':
+            values = self._frame(content)['values'].to_numpy()
+            return values.astype(value['dtype'], copy = False).reshape(value['shape'])
+        if kind == 'index':
+            frame, names = self._frame(content), self.decode(value['names'])
+            if value['multi']:
+                return pd.MultiIndex.from_frame(frame, names = names)
+            return pd.Index(frame.iloc[:, 0], name = names[0])
+        if kind == 'series':
+            return self._frame(content)['values'].rename(self.decode(value['name']))
+        if kind == 'frame':
+            return self._frame(content)
+        raise ValueError(f'unknown report bundle value {kind!r}')
+
+
+def read_bundle(root, version):
+    #{function: {memo key: result}} of the bundle for a dataset version
+    folder = bundle_dir(root, version)
+    with open(os.path.join(folder, 'manifest.json')) as f:
+        manifest = json.load(f)
+    if manifest['format'] != FORMAT or manifest['dataset_version'] != version:
+        return {}
+    reader = _Reader(folder)
+    projections = [tuple(p) for p in manifest['projections']]
+    results = {}
+    for r in manifest['aggregates']:
+        key = (version, projections[r['projection']], reader.decode(r['args']), reader.decode(r['kwargs']))
+        results.setdefault(r['function'], {})[key] = reader.decode(r['value'])
+    return results
+
+
+def report_tasks(intervals = True):
+    #(page, chart, state, intervals) of every survey chart state, page by page so that a
+    #worker's tasks share its memoized aggregates
+    from charts import CHARTS
+
+    tasks = []
+    for (page, key), chart in CHARTS.items():
+        if chart.path:
+            continue
+        with_intervals = intervals and chart.intervals
+        for i in range(len(chart.states)):
+            tasks += [(page, key, i, False)] + ([(page, key, i, True)] if with_intervals else [])
+    return tasks
+
+
+def _aggregate(task, wave):
+    #memoized aggregates of one chart state (runs in a worker process)
+    from charts import CHARTS, page_data
+
+    page, key, i, intervals = task
+    chart = CHARTS[(page, key)]
+    widgets = dict(chart.states[i], **({'intervals': True} if intervals else {}))
+    with record_memoized() as calls:
+        chart.build(page_data(page, wave), **widgets)
+    return calls
+
+
+def _aggregates(tasks, wave):
+    return [call for task in tasks for call in _aggregate(task, wave)]
+
+
+def build_report(out_dir, wave = None, workers = None, intervals = True):
+    #compute every aggregate of a wave (the latest by default) and write its bundle.
+    #returns (bundle folder, number of aggregates)
+    paths = wave_paths()
+    wave = list(paths)[-1] if wave is None else wave
+    version = dataset_version(paths[wave])
+    tasks = report_tasks(intervals)
+    workers = workers or os.cpu_count() or 1
+    #one batch of consecutive tasks per worker, so that a page's aggregates are mostly
+    #computed by a single worker
+    batches = [tasks[i*len(tasks)//workers:(i + 1)*len(tasks)//workers] for i in range(workers)]
+    batches = [b for b in batches if b]
+
+    results = {}
+    with ProcessPoolExecutor(max_workers = workers) as pool:
+        for calls in pool.map(_aggregates, batches, [wave]*len(batches)):
+            for name, key, result in calls:
+                if key[0] != version:
+                    raise RuntimeError(f'{wave} changed while the report was built')
+                results.setdefault((name, key[1:]), result)
+
+    folder = bundle_dir(out_dir, version)
+    writer = _Writer(folder)
+    projections = list(dict.fromkeys(key[0] for _, key in results))
+    aggregates = [{'function': name, 'projection': projections.index(key[0]), 'args': writer.encode(key[1]),
+                   'kwargs': writer.encode(key[2]), 'value': writer.encode(result)}
+                  for (name, key), result in results.items()]
+    manifest = {'format': FORMAT, 'wave': wave, 'dataset_version': version,
+                'generated': time.strftime('%Y-%m-%dT%H:%M:%S'),
+                'projections': [list(p) for p in projections], 'aggregates': aggregates}
+    #the manifest is written last and replaced in one step: a bundle is complete once it exists
+    with open(os.path.join(folder, 'manifest.json.tmp'), 'w') as f:
+        json.dump(manifest, f)
+    os.replace(os.path.join(folder, 'manifest.json.tmp'), os.path.join(folder, 'manifest.json'))
+
+    index_path = os.path.join(out_dir, 'index.json')
+    index = json.load(open(index_path)) if os.path.exists(index_path) else {}
+    index[wave] = {'dataset_version': version, 'bundle': os.path.basename(folder), 'generated': manifest['generated']}
+    with open(index_path, 'w') as f:
+        json.dump(index, f, indent = 1)
+    return folder, len(aggregates)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("-o", "--output", default="reports", help="bundle directory")
+    parser.add_argument("--wave", default=None, help="survey wave (default: the latest)")
+    parser.add_argument("--workers", type=int, default=None, help="worker processes (default: one per CPU)")
+    parser.add_argument("--no-intervals", action="store_true", help="skip the bootstrap confidence intervals")
+    args = parser.parse_args()
+    start = time.perf_counter()
+    folder, n = build_report(os.path.abspath(args.output), args.wave, args.workers, not args.no_intervals)
+    print(f"{n} aggregates written to {folder} in {time.perf_counter() - start:.1f}s", file=sys.stderr)
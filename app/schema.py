@@ -0,0 +1,173 @@
+from dataclasses import dataclass, field
+
+# question types
+MULTI_SELECT = 'multi_select'    # one 0/1 indicator column per item
+LIKERT = 'likert'                # one coded column per item, shared answer scale
+SINGLE_CHOICE = 'single_choice'  # one coded (or categorical) column
+RANK = 'rank'                    # one column per item holding its rank
+NUMERIC = 'numeric'              # one or more continuous columns
+TEXT = 'text'                    # free text
+
+
+@dataclass(frozen = True, eq = False)
+class Question:
+    key: str
+    kind: str
+    columns: tuple                                # survey columns, in item order
+    labels: dict = field(default_factory = dict)  # column -> item label (items shown in charts)
+    codes: dict = field(default_factory = dict)   # answer code -> label, in display order
+    title: str = ''                               # name of the item axis/column in charts
+
+    def shown(self):
+        #columns that have a label, i.e. the items charts display
+        return [c for c in self.columns if c in self.labels]
+
+
+def _numbered(prefix, n):
+    return tuple(f'{prefix}{i}' for i in range(1, n + 1))
+
+
+GROUP_LABELS = ['Fleet managers', 'Owner-Operators', 'Other']
+
+QUESTIONS = {q.key: q for q in [
+    # respondent attributes
+    Question('id', TEXT, ('id',)),
+    Question('source', SINGLE_CHOICE, ('source',), codes = {g: g for g in GROUP_LABELS}, title = 'Source'),
+    Question('fleet_type', SINGLE_CHOICE, ('fleet_type',), title = 'Fleet type',
+             codes = {'< 100 vehicles': 'Less than 100 vehicles', '> 100 vehicles': 'More than 100 vehicles'}),
+    Question('current_role', SINGLE_CHOICE, ('current_role',), title = 'Current role',
+             codes = {3: 'Owner operator', 1: 'Fleet manager', 2: 'Employed (non-manager)', 4: 'Other'}),
+    Question('fleet_size', SINGLE_CHOICE, ('fleet_size',), title = 'Fleet size',
+             codes = {1: 'Very small<br>(1-6 veh)', 2: 'Small<br>(7-19 veh)', 3: 'Medium<br>(20-100 veh)',
+                      4: 'Large<br>(101-2,000 veh)', 5: 'Very Large<br>(2,001-5,000 veh)', 6: 'Mega fleet<br>(5,001+)'}),
+    Question('regions', MULTI_SELECT, _numbered('region_', 6), title = 'Region of operations',
+             labels = {'region_1': 'Nationally, across the US',
+                       'region_2': 'Internationally',
+                       'region_3': 'Midwest',
+                       'region_4': 'South',
+                       'region_5': 'Northeast',
+                       'region_6': 'West'}),
+    Question('vocations', MULTI_SELECT, _numbered('fleet_vocation_', 6), title = 'Fleet vocation',
+             labels = {'fleet_vocation_1': 'Drayage',
+                       'fleet_vocation_2': 'Long-haul',
+                       'fleet_vocation_3': 'Regional',
+                       'fleet_vocation_4': 'Urban Logistics',
+                       'fleet_vocation_5': 'Mixed Use',
+                       'fleet_vocation_6': 'Other'}),
+    Question('fleet_composition', NUMERIC, ('percentage_pre_2010', 'percentage_class_6', 'percentage_urban_logistics'),
+             title = 'Vehicle characteristics',
+             labels = {'percentage_pre_2010': 'Pre-2010 engine',
+                       'percentage_class_6': 'Class 6+',
+                       'percentage_urban_logistics': 'Used for urban logistics'}),
+    Question('oo_veh_char', MULTI_SELECT, _numbered('oo_veh_char_', 4), title = 'Vehicle characteristics',
+             labels = {'oo_veh_char_1': 'Pre-2010 engine',
+                       'oo_veh_char_2': 'Class 6+',
+                       'oo_veh_char_3': 'Used for urban logistics'}),
+
+    # turnover practices
+    Question('turnover', MULTI_SELECT, _numbered('turnover_priorities_', 9), title = 'Priorities',
+             labels = {'turnover_priorities_1': 'Cost savings',
+                       'turnover_priorities_2': 'Vehicle reliability',
+                       'turnover_priorities_3': 'Emissions reduction',
+                       'turnover_priorities_4': 'Regulatory compliance',
+                       'turnover_priorities_5': 'Operational efficiency',
+                       'turnover_priorities_6': 'Driver comfort and satisfaction',
+                       'turnover_priorities_7': 'Technology integration',
+                       'turnover_priorities_8': 'Brand image'}),
+    Question('financial', MULTI_SELECT, _numbered('turnover_financial_', 10), title = 'Financial',
+             labels = {'turnover_financial_1': 'Upfront vehicle acquisition',
+                       'turnover_financial_2': 'Fuel and energy',
+                       'turnover_financial_3': 'Maintenance and repairs',
+                       'turnover_financial_4': 'Depreciation',
+                       'turnover_financial_5': 'Insurance premiums',
+                       'turnover_financial_6': 'Tax incentives',
+                       'turnover_financial_7': 'Financing or leasing terms',
+                       'turnover_financial_8': 'Lifecycle cost optimization',
+                       'turnover_financial_9': 'Budget stability'}),
+    Question('decision_tools', LIKERT,
+             ('decision_tools_cost', 'decision_tools_maintenance', 'decision_tools_emissions', 'decision_tools_telematics',
+              'decision_tools_regulations', 'decision_tools_consulting', 'decision_tools_AI'),
+             codes = {2: 'Rarely or never', 3: 'Sometimes', 4: 'Often'},
+             labels = {'decision_tools_cost': 'Cost analysis tools',
+                       'decision_tools_maintenance': 'Maintenance and <br> performance tracking',
+                       'decision_tools_telematics': 'Telematics or vehicle <br>usage data',
+                       'decision_tools_emissions': 'Emissions performance <br> or reduction target',
+                       'decision_tools_regulations': 'Regulatory compliance<br> assessment',
+                       'decision_tools_consulting': 'External consulting <br> or advisory services',
+                       'decision_tools_AI': 'A.I. tools'}),
+    Question('replacement', MULTI_SELECT, _numbered('replacement_priority_', 8), title = 'Priorities',
+             labels = {'replacement_priority_1': 'Oldest by age',
+                       'replacement_priority_2': 'Highest maintenance costs',
+                       'replacement_priority_3': 'Highest mileage',
+                       'replacement_priority_4': 'Outdated technology',
+                       'replacement_priority_5': 'Assigned to specific <br>vocations or duty cycles',
+                       'replacement_priority_6': 'Poor fuel efficiency',
+                       'replacement_priority_7': 'Highest emissions'}),
+    Question('purchase_markets', SINGLE_CHOICE, ('purchase_markets',), title = 'Purchase markets',
+             codes = {1: 'New', 2: 'Used', 3: 'Mix of new and used', 4: 'Leasing', 5: 'Other'}),
+
+    # fleet renewal
+    Question('replace', SINGLE_CHOICE, ('replace_pre2010',),
+             codes = {3: 'No', 4: 'Not sure', 2: 'Yes, in more <br> than 3 years', 1: 'Yes, within <br>the next 3 years'}),
+    Question('expand', SINGLE_CHOICE, ('expand_fleet',),
+             codes = {3: 'No', 4: 'Not sure', 2: 'Yes, in more <br> than 3 years', 1: 'Yes, within <br>the next 3 years'}),
+    Question('innovation', LIKERT,
+             ('innovation_ice', 'innovation_hybrid', 'innovation_bev', 'innovation_hydrogen',
+              'innovation_telematic', 'innovation_ai', 'innovation_route'),
+             codes = {1: 'Not likely', 2: 'Somewhat likely', 3: 'Very likely'},
+             labels = {'innovation_ice': 'Replacing older ICE <br>with newer ICE',
+                       'innovation_hybrid': 'Transitioning to <br>hybrid vehicles',
+                       'innovation_bev': 'Transitioning to BEV',
+                       'innovation_hydrogen': 'Transitioning to hydrogen<br> fuel cell vehicles',
+                       'innovation_telematic': 'Adopting telematics, <br>smart fleet management tools',
+                       'innovation_ai': 'Adopting A.I. tools for <br>planning and operations',
+                       'innovation_route': 'Implementing route optimization<br> and logistics innovation'}),
+    Question('rank_support', RANK,
+             ('rank_support_financial', 'rank_support_technical', 'rank_support_infrastructure',
+              'rank_support_certifications', 'rank_support_other'),
+             codes = {1: '#1', 2: '#2', 3: '#3', 4: '#4', 5: '#5'},
+             labels = {'rank_support_financial': 'Financial',
+                       'rank_support_technical': 'Technical',
+                       'rank_support_infrastructure': 'Infrastructure',
+                       'rank_support_certifications': 'Certifications',
+                       'rank_support_other': 'Other'}),
+    Question('barriers', MULTI_SELECT, _numbered('renewal_barriers_', 11), title = 'Barriers',
+             labels = {'renewal_barriers_1': 'Capital costs<br> for new vehicles',
+                       'renewal_barriers_2': 'Limited availability of<br> suitable models',
+                       'renewal_barriers_3': 'Operational disruptions<br> during the transition',
+                       'renewal_barriers_4': 'Uncertainty around future<br> regulations',
+                       'renewal_barriers_5': 'Insufficient charging/fueling<br> infrastructure',
+                       'renewal_barriers_6': 'Limited internal capacity<br> for planning and implementation',
+                       'renewal_barriers_7': 'Lack of access to <br>financing or incentives',
+                       'renewal_barriers_8': 'Concerns about vehicle <br>performance or reliability',
+                       'renewal_barriers_9': 'Data or technology <br>integrations challenges',
+                       'renewal_barriers_10': 'Resistance to change <br>within the organization',
+                       'renewal_barriers_11': 'Other'}),
+    Question('stakeholders', MULTI_SELECT, _numbered('key_stakeholders_', 10), title = 'Key stakeholders'),
+
+    # open comments
+    Question('innovation_best', TEXT, ('innovation_best_TEXT',)),
+    Question('innovation_worst', TEXT, ('innovation_worst_TEXT',)),
+]}
+
+
+def questions(kind = None):
+    #registered questions, optionally only those of one type
+    return [q for q in QUESTIONS.values() if kind is None or q.kind == kind]
+
+
+def columns_for(*keys):
+    #survey columns of the given questions, without duplicates, for column-projected loads
+    columns = []
+    for key in keys:
+        columns += [c for c in QUESTIONS[key].columns if c not in columns]
+    return columns
+
+
+#respondent attributes any question can be broken down by. a respondent belongs to every
+#group picked in a multi-select attribute (e.g. several regions)
+BREAKDOWNS = ['source', 'fleet_type', 'fleet_size', 'current_role', 'regions', 'vocations']
+
+ONEHOT_COLUMNS = frozenset(c for q in questions(MULTI_SELECT) for c in q.columns)
+CATEGORICAL_COLUMNS = [c for q in questions(SINGLE_CHOICE) for c in q.columns
+                       if all(isinstance(code, str) for code in q.codes)]
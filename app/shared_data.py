@@ -0,0 +1,232 @@
+"""Survey tables and their aggregates in shared memory, for several dashboard processes.
+
+One publisher process reads every survey wave, computes the aggregate cubes of every
+registered question and writes each table, with its cubes, into a shared memory segment.
+A small header segment maps each table to its current segment and dataset version.
+Dashboard processes started with MHDV_SHARED_DATA=<name> attach to the segments instead of
+reading the files: column arrays and cubes are NumPy arrays over the shared pages (pickle
+protocol 5, buffers out of band), so resident memory does not grow with the number of
+processes. When a file changes the publisher writes the new version to a new segment and
+switches the header; processes attach to it on their next load, and the old segment goes
+away once the last process lets go of it.
+
+    python app/shared_data.py --name mhdv &
+    MHDV_SHARED_DATA=mhdv streamlit run app/Introduction.py --server.port 8501
+    MHDV_SHARED_DATA=mhdv streamlit run app/Introduction.py --server.port 8502
+"""
+import os
+import sys
+import json
+import time
+import signal
+import struct
+import pickle
+import hashlib
+import argparse
+from multiprocessing import shared_memory, resource_tracker
+import pandas as pd
+try:
+    import pyarrow as pa
+except ImportError:
+    #text columns are then pickled as Python strings, copied into every process
+    pa = None
+import data_loader
+from data_loader import load_data, dataset_version, file_version, wave_paths, unload
+from aggregates import block_cube, level_counts, rank_pairs
+from schema import QUESTIONS, MULTI_SELECT, LIKERT, RANK, SINGLE_CHOICE
+
+#the header segment: magic, sequence number (odd while being rewritten), length of the
+#JSON table list that follows
+HEADER_SIZE = 1 << 16
+_MAGIC = b'MHDVSHM1'
+_HEAD = struct.Struct('<8sQQ')
+#segment layout: body length, buffer count, (offset, size) per buffer, pickle body, buffers
+_ALIGN = 64
+_RETIRED = []
+
+
+class _Segment(shared_memory.SharedMemory):
+    #an attached segment. it cannot be closed while arrays over it are alive; if it is
+    #dropped before them, the mapping simply lives as long as they do
+    def __del__(self):
+        try:
+            self.close()
+        except BufferError:
+            pass
+
+
+def _open(name):
+    #attach without handing the segment to this process's resource tracker, which would
+    #unlink it when the process exits (before Python 3.13 attaching registers it too)
+    try:
+        return _Segment(name, track = False)
+    except TypeError:
+        shm = _Segment(name)
+        resource_tracker.unregister(shm._name, 'shared_memory')
+        return shm
+
+
+def _create(name, size):
+    #a new segment; a leftover of a publisher that did not shut down cleanly is replaced
+    try:
+        return shared_memory.SharedMemory(name, create = True, size = size)
+    except FileExistsError:
+        _remove(shared_memory.SharedMemory(name))
+        return shared_memory.SharedMemory(name, create = True, size = size)
+
+
+def _remove(shm):
+    #unlink a segment this process created; processes attached to it keep their mapping
+    shm.close()
+    shm.unlink()
+
+
+def _release(shm):
+    #close a segment this process no longer uses. while arrays over it are alive (frames
+    #or results still referenced) it is kept and tried again later
+    _RETIRED.append(shm)
+    for s in list(_RETIRED):
+        try:
+            s.close()
+            _RETIRED.remove(s)
+        except BufferError:
+            pass
+
+
+def published(name):
+    #{table path: {'version', 'segment'}} as currently published under name ({} if nothing is)
+    try:
+        header = _open(name)
+    except FileNotFoundError:
+        return {}
+    try:
+        while True:
+            magic, seq, length = _HEAD.unpack_from(header.buf)
+            if magic != _MAGIC:
+                return {}
+            tables = bytes(header.buf[_HEAD.size:_HEAD.size + length])
+            if seq % 2 == 0 and _HEAD.unpack_from(header.buf)[1] == seq:
+                return json.loads(tables)
+            time.sleep(0.001)
+    finally:
+        header.close()
+
+
+def _write_header(header, tables):
+    blob = json.dumps(tables).encode()
+    if _HEAD.size + len(blob) > HEADER_SIZE:
+        raise ValueError(f'too many tables to publish ({len(tables)})')
+    seq = _HEAD.unpack_from(header.buf)[1]
+    _HEAD.pack_into(header.buf, 0, _MAGIC, seq + 1, 0)
+    header.buf[_HEAD.size:_HEAD.size + len(blob)] = blob
+    _HEAD.pack_into(header.buf, 0, _MAGIC, seq + 2, len(blob))
+
+
+def write_segment(name, payload):
+    #pickle payload into a new segment, every contiguous array stored once, out of band
+    buffers = []
+    body = pickle.dumps(payload, protocol = 5, buffer_callback = buffers.append)
+    raws = [b.raw() for b in buffers]
+    offset = 16 + 16*len(raws) + len(body)
+    spans = []
+    for raw in raws:
+        offset += -offset % _ALIGN
+        spans.append((offset, raw.nbytes))
+        offset += raw.nbytes
+    shm = _create(name, max(offset, 1))
+    struct.pack_into(f'<{2 + 2*len(spans)}Q', shm.buf, 0, len(body), len(spans), *[v for span in spans for v in span])
+    shm.buf[16 + 16*len(spans):16 + 16*len(spans) + len(body)] = body
+    for (start, size), raw in zip(spans, raws):
+        shm.buf[start:start + size] = raw
+    return shm
+
+
+def attach(name):
+    #(segment, payload) of a published segment; its arrays are views of the shared pages
+    shm = _open(name)
+    length, n = struct.unpack_from('<2Q', shm.buf)
+    spans = struct.unpack_from(f'<{2*n}Q', shm.buf, 16)
+    body = bytes(shm.buf[16 + 16*n:16 + 16*n + length])
+    views = [shm.buf[start:start + size] for start, size in zip(spans[::2], spans[1::2])]
+    return shm, pickle.loads(body, buffers = views)
+
+
+def _shareable(data):
+    #the table with text columns as Arrow strings, whose buffers can be shared like arrays
+    #(Python string objects would be copied into every process)
+    if pa is None:
+        return data
+    return pd.DataFrame({c: data[c].astype('string[pyarrow]') if data[c].dtype == object else data[c]
+                         for c in data.columns})
+
+
+def _cubes(data):
+    #the aggregate cubes of every registered question, memoized for data's version
+    for q in QUESTIONS.values():
+        if q.kind == MULTI_SELECT:
+            block_cube(data, q.key)
+        elif q.kind in (LIKERT, RANK) or (q.kind == SINGLE_CHOICE and isinstance(next(iter(q.codes)), int)):
+            level_counts(data, q.key)
+        if q.kind == RANK:
+            rank_pairs(data, q.key)
+
+
+def publish_table(name, path):
+    #write the table at path and its cubes to a new segment; returns (version, segment).
+    #the publisher keeps no copy of the table once it is in shared memory
+    data = _shareable(load_data(path))
+    version = dataset_version(path)
+    data_loader._issue(data, version)
+    _cubes(data)
+    key = tuple(data.columns)
+    results = {fn: {k: r for k, r in memo.items() if k[0] == version and k[1] == key}
+               for fn, memo in data_loader._MEMOS.items()}
+    segment = f'{name}-{hashlib.sha1(os.path.abspath(path).encode()).hexdigest()[:8]}-{version[:16]}'
+    shm = write_segment(segment, {'version': version, 'data': data, 'results': results})
+    unload(path)
+    if pa is not None:
+        #the text conversion leaves Arrow's allocator holding the table's size
+        pa.default_memory_pool().release_unused()
+    return version, shm
+
+
+def serve(name, interval = 5.0):
+    #publish every wave, then republish each one whose file changes, until interrupted
+    data_loader.SHARED_DATA = None
+    #stop (and remove the segments) on SIGTERM as on Ctrl-C
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+    header = _create(name, HEADER_SIZE)
+    tables, segments = {}, {}
+    try:
+        while True:
+            current = {}
+            for path in wave_paths().values():
+                key = os.path.abspath(path)
+                previous = tables.get(key)
+                if previous is None or previous['version'] != file_version(data_loader._source_path(path)):
+                    version, shm = publish_table(name, path)
+                    segments[shm.name] = shm
+                    current[key] = {'version': version, 'segment': shm.name}
+                    print(f'{path}: published version {version[:12]} as {shm.name}', file = sys.stderr)
+                else:
+                    current[key] = previous
+            if current != tables:
+                _write_header(header, current)
+                tables = current
+                for segment in set(segments) - {t['segment'] for t in tables.values()}:
+                    _remove(segments.pop(segment))
+            time.sleep(interval)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        _remove(header)
+        for shm in segments.values():
+            _remove(shm)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--name", default=os.environ.get("MHDV_SHARED_DATA", "mhdv"), help="shared memory name")
+    parser.add_argument("--interval", type=float, default=5.0, help="seconds between checks for changed files")
+    args = parser.parse_args()
+    serve(args.name, args.interval)
@@ -0,0 +1,240 @@
+"""Synthetic survey respondents for scale testing.
+
+The model is learned from the real survey table: the `source` marginal and, for each
+source, the observed missing-value patterns (whole rows, so skip logic carries over),
+the answer distribution of every column, the number of items picked in each multi-select
+question with each item's pick rate, and first-choice weights of each rank question.
+Respondents are drawn independently given their source, and written in chunks so any
+number of rows can be produced with bounded memory:
+
+    python app/synthetic_data.py 1000000 -o survey_1m.parquet --seed 0
+"""
+import numpy as np
+import pandas as pd
+from data_loader import DATA_PATH, read_survey_csv
+from schema import QUESTIONS, MULTI_SELECT, RANK
+
+
+def _companion(q):
+    #the '<prefix>_nan' column flagging that nothing was picked in a multi-select question
+    return q.columns[0].rsplit('_', 1)[0] + '_nan'
+
+
+def _holds_labels(dtype):
+    #text and categorical columns are sampled as objects, the others as floats
+    return dtype == object or isinstance(dtype, pd.CategoricalDtype)
+
+
+def fit_survey_model(path = None):
+    #distributions of the real survey table the generator samples from
+    real = read_survey_csv(path or DATA_PATH)
+    columns = list(real.columns)
+    blocks = {q.key: [columns.index(c) for c in q.columns if c in columns]
+              for q in QUESTIONS.values() if q.kind in (MULTI_SELECT, RANK)}
+
+    sources = real['source'].value_counts(sort = False)
+    model = {'columns': columns, 'dtypes': real.dtypes.to_dict(), 'sources': list(sources.index),
+             'source_p': (sources/sources.sum()).to_numpy(), 'by_source': {}}
+
+    for source in model['sources']:
+        d = real[real['source'] == source]
+        present = d.notna().to_numpy()
+        masks, mask_counts = np.unique(present, axis = 0, return_counts = True)
+        fit = {'masks': masks, 'mask_p': mask_counts/mask_counts.sum(),
+               'values': [d[c].dropna().to_numpy(dtype = object if _holds_labels(d[c].dtype) else float)
+                          for c in columns],
+               'picks': {}, 'ranks': {}}
+
+        for key, positions in blocks.items():
+            x = d.iloc[:, positions].to_numpy(dtype = float)
+            answered = ~np.isnan(x).all(axis = 1)
+            if not answered.any():
+                continue
+            if QUESTIONS[key].kind == MULTI_SELECT:
+                #how many items respondents pick (which keeps e.g. the 'up to 3' limit), for each
+                #pattern of items shown, and how often each item is picked
+                counts = _pick_counts(x[answered])
+                fit['picks'][key] = {'counts': counts, 'weights': _pick_weights(x[answered], counts)}
+            else:
+                fit['ranks'][key] = _plackett_luce(x[answered & ~np.isnan(x).any(axis = 1)])
+        model['by_source'][source] = fit
+    return model
+
+
+def _weighted_order(rng, weights, available):
+    #position of every column in a weighted random order of the available ones (Gumbel trick);
+    #columns that are unavailable or have zero weight get -1
+    with np.errstate(divide = 'ignore'):
+        keys = np.log(weights) + rng.gumbel(size = available.shape)
+    keys = np.where(available, keys, -np.inf)
+    position = np.argsort(np.argsort(-keys, axis = 1, kind = 'stable'), axis = 1)
+    return np.where(np.isfinite(keys), position, -1)
+
+
+def _pattern(available):
+    #the items shown to each row (not NaN), as one integer bit pattern
+    return available @ (1 << np.arange(available.shape[1]))
+
+
+def _pick_counts(x):
+    #distribution of the number of items picked, for each pattern of items shown
+    counts = {}
+    patterns = _pattern(~np.isnan(x))
+    for pattern in np.unique(patterns):
+        k, k_counts = np.unique(np.nansum(x[patterns == pattern], axis = 1).astype(int), return_counts = True)
+        counts[pattern] = (k, k_counts/k_counts.sum())
+    return counts
+
+
+def _draw_picks(rng, counts, available):
+    #number of items to pick for every row, given the items shown to it
+    k = np.zeros(len(available), dtype = int)
+    patterns = _pattern(available)
+    for pattern, (values, p) in counts.items():
+        rows = np.flatnonzero(patterns == pattern)
+        k[rows] = values[rng.choice(len(values), len(rows), p = p)]
+    return k
+
+
+def _pick_weights(x, counts, n = 20_000, iterations = 30):
+    #item weights whose weighted draws of k items without replacement reproduce the pick rate
+    #of every item, found by fixed-point iteration on a fixed simulated sample
+    available = ~np.isnan(x)
+    shown = available.sum(axis = 0)
+    rate = np.divide(np.nansum(x, axis = 0), shown, out = np.zeros(x.shape[1]), where = shown > 0)
+    rng = np.random.default_rng(0)
+    rows = rng.integers(0, len(x), n)
+    available, gumbel = available[rows], rng.gumbel(size = (n, x.shape[1]))
+    picks = _draw_picks(rng, counts, available)[:, None]
+
+    weights = rate.copy()
+    for _ in range(iterations):
+        with np.errstate(divide = 'ignore'):
+            keys = np.where(available & (weights > 0), np.log(weights) + gumbel, -np.inf)
+        position = np.argsort(np.argsort(-keys, axis = 1, kind = 'stable'), axis = 1)
+        picked = (position < picks) & np.isfinite(keys)
+        achieved = picked.sum(axis = 0)/np.maximum(available.sum(axis = 0), 1)
+        weights = np.where(achieved > 0, weights*rate/np.where(achieved > 0, achieved, 1), weights)
+    return weights
+
+
+def _plackett_luce(ranks, iterations = 50):
+    #Plackett-Luce item weights of complete rankings, by the MM algorithm (Hunter, 2004)
+    n, m = ranks.shape
+    if n == 0:
+        return np.ones(m)
+    stage = ranks.astype(int) - 1
+    order = np.argsort(stage, axis = 1)
+    wins = (stage < m - 1).sum(axis = 0) + .5
+    weights = np.ones(m)/m
+    for _ in range(iterations):
+        #weight of the items still unranked at each stage, and each item's share of 1/that
+        remaining = np.cumsum(weights[order][:, ::-1], axis = 1)[:, ::-1]
+        inverse = np.cumsum(1/remaining[:, :-1], axis = 1)
+        weights = wins/inverse[np.arange(n)[:, None], np.minimum(stage, m - 2)].sum(axis = 0)
+        weights /= weights.sum()
+    return weights
+
+
+def _sample_rows(model, fit, rng, n):
+    #n respondents of one source, as one array per column
+    columns = model['columns']
+    present = fit['masks'][rng.choice(len(fit['masks']), n, p = fit['mask_p'])]
+    out = []
+    for j, values in enumerate(fit['values']):
+        col = np.full(n, np.nan, dtype = values.dtype)
+        if len(values):
+            col[present[:, j]] = values[rng.integers(0, len(values), present[:, j].sum())]
+        out.append(col)
+
+    for key, p in fit['picks'].items():
+        q = QUESTIONS[key]
+        positions = [columns.index(c) for c in q.columns if c in columns]
+        available = present[:, positions]
+        order = _weighted_order(rng, p['weights'], available)
+        k = np.minimum(_draw_picks(rng, p['counts'], available), (order >= 0).sum(axis = 1))
+        picked = ((order >= 0) & (order < k[:, None])).astype(float)
+        picked[~available] = np.nan
+        for i, j in enumerate(positions):
+            out[j] = picked[:, i]
+        if _companion(q) in columns:
+            j = columns.index(_companion(q))
+            out[j] = np.where(present[:, j], (k == 0).astype(float), np.nan)
+
+    for key, weights in fit['ranks'].items():
+        positions = [columns.index(c) for c in QUESTIONS[key].columns if c in columns]
+        order = _weighted_order(rng, weights, present[:, positions])
+        for i, j in enumerate(positions):
+            out[j] = np.where(order[:, i] >= 0, order[:, i] + 1., np.nan)
+    return out
+
+
+def generate(model, n, seed = 0, chunk = 50_000):
+    #yield n synthetic respondents as frames of at most `chunk` rows, with the dtypes of the
+    #real table. chunk i is drawn from its own stream, so output depends only on seed and chunk
+    columns, dtypes = model['columns'], model['dtypes']
+    for i, start in enumerate(range(0, n, chunk)):
+        rng = np.random.default_rng([seed, i])
+        size = min(chunk, n - start)
+        source = rng.choice(len(model['sources']), size, p = model['source_p'])
+        rows = [np.full(size, np.nan, dtype = object if _holds_labels(dtypes[c]) else float) for c in columns]
+        for s, label in enumerate(model['sources']):
+            idx = np.flatnonzero(source == s)
+            for col, values in zip(rows, _sample_rows(model, model['by_source'][label], rng, len(idx))):
+                col[idx] = values
+
+        row = np.arange(start, start + size)
+        frame = {}
+        for c, values in zip(columns, rows):
+            if c == 'id':
+                #distinct 8-hex-digit ids: an odd multiplier permutes 32-bit integers
+                values = np.char.mod('%08x', (row*2654435761 + seed) % 2**32)
+            elif c.startswith('Unnamed: '):
+                values = row
+            dtype = dtypes[c]
+            if isinstance(dtype, pd.CategoricalDtype):
+                frame[c] = pd.Categorical(values, categories = dtype.categories)
+            elif dtype == object:
+                frame[c] = values
+            else:
+                frame[c] = values.astype(dtype)
+        yield pd.DataFrame(frame, index = row)
+
+
+def write_synthetic(n, out_path, path = None, seed = 0, chunk = 50_000):
+    #write n synthetic respondents learned from the survey table at `path` to a csv or,
+    #for a '.parquet' out_path, the columnar format load_data reads directly
+    model = fit_survey_model(path)
+    if out_path.endswith('.parquet'):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        schema = None
+        for frame in generate(model, n, seed, chunk):
+            if schema is None:
+                #text columns are fixed to strings, a chunk may not hold a single answer
+                schema = pa.Schema.from_pandas(frame, preserve_index = False)
+                schema = pa.schema([pa.field(f.name, pa.string()) if model['dtypes'][f.name] == object else f
+                                    for f in schema])
+                writer = pq.ParquetWriter(out_path, schema)
+            writer.write_table(pa.Table.from_pandas(frame, schema = schema, preserve_index = False))
+        writer.close()
+    else:
+        header = ['' if c.startswith('Unnamed: ') else c for c in model['columns']]
+        with open(out_path, 'w', newline = '') as f:
+            for i, frame in enumerate(generate(model, n, seed, chunk)):
+                frame.to_csv(f, header = header if i == 0 else False, index = False)
+    return out_path
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Write synthetic survey respondents learned from the survey csv")
+    parser.add_argument("n", type=int, help="number of respondents")
+    parser.add_argument("-o", "--output", required=True, help="output .csv or .parquet file")
+    parser.add_argument("--source", default=None, help="survey table to learn from")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--chunk", type=int, default=50_000, help="rows generated (and held in memory) at a time")
+    args = parser.parse_args()
+    print(write_synthetic(args.n, args.output, args.source, args.seed, args.chunk))
@@ -0,0 +1,165 @@
+"""Benchmarks for the data_processing aggregates and the dashboard pages.
+
+Times every aggregation function and every page script on synthetic survey tables
+(app/synthetic_data.py) of several sizes, reporting wall time (cold: caches cleared,
+warm: repeated call/rerun) and peak traced memory. Results are written as JSON and can be
+compared against a baseline. No baseline is committed, since timings only compare on the
+same machine: record one first with --save-baseline, then compare later runs against it:
+
+    python benchmarks/run_benchmarks.py --sizes 200 10000 --output bench.json
+    python benchmarks/run_benchmarks.py --save-baseline benchmarks/baseline.json
+    python benchmarks/run_benchmarks.py --baseline benchmarks/baseline.json --threshold 0.2
+
+Exits with status 1 when a benchmark is slower (or uses more memory) than the baseline by
+more than the threshold.
+"""
+import os
+import sys
+import gc
+import json
+import glob
+import time
+import argparse
+import platform
+import tempfile
+import tracemalloc
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+APP_DIR = os.path.join(ROOT, 'app')
+sys.path.insert(0, APP_DIR)
+
+import numpy as np
+import pandas as pd
+import data_loader
+from data_loader import load_data, clear_caches
+from data_processing import scatter_comparison_data, likert_data, timeline_data, ranking_data, rank_distribution_data
+from schema import columns_for
+from synthetic_data import write_synthetic
+from figure_cache import clear_figure_cache
+
+SIZES = [200, 10_000, 100_000, 1_000_000]
+
+FUNCTIONS = {
+    'scatter_comparison_data[turnover]': lambda d: scatter_comparison_data(d, 'turnover'),
+    'scatter_comparison_data[financial]': lambda d: scatter_comparison_data(d, 'financial'),
+    'scatter_comparison_data[barriers]': lambda d: scatter_comparison_data(d, 'barriers'),
+    'likert_data[decision_tools]': lambda d: likert_data(d, 'decision_tools', 'Fleet managers'),
+    'likert_data[innovation]': lambda d: likert_data(d, 'innovation', 'Owner-Operators'),
+    'timeline_data[replace]': lambda d: timeline_data(d, 'replace'),
+    'timeline_data[expand]': lambda d: timeline_data(d, 'expand'),
+    'ranking_data[All]': lambda d: ranking_data(d, 'All'),
+    'ranking_data[Fleet managers]': lambda d: ranking_data(d, 'Fleet managers'),
+    'rank_distribution_data[Owner-Operators]': lambda d: rank_distribution_data(d, 'rank_support', 'Owner-Operators'),
+}
+FUNCTION_COLUMNS = columns_for('id', 'source', 'fleet_type', 'turnover', 'financial', 'barriers',
+                               'decision_tools', 'innovation', 'replace', 'expand', 'rank_support')
+PAGES = sorted(glob.glob(os.path.join(APP_DIR, 'pages', '*.py')))
+
+
+def measure(fn, repeat = 3, cold = None):
+    #cold wall time (after `cold()` resets caches), best warm time, and peak traced memory
+    cold and cold()
+    gc.collect()
+    start = time.perf_counter()
+    fn()
+    cold_s = time.perf_counter() - start
+
+    warm = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        warm.append(time.perf_counter() - start)
+
+    cold and cold()
+    gc.collect()
+    tracemalloc.start()
+    fn()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return {'cold_s': cold_s, 'warm_s': min(warm), 'peak_mb': peak/2**20}
+
+
+def run_page(page):
+    from streamlit.testing.v1 import AppTest
+    at = AppTest.from_file(page, default_timeout = 600).run()
+    if at.exception:
+        raise RuntimeError(f'{page}: {at.exception[0].value}')
+
+
+def run(sizes, repeat = 3, pages = True):
+    results = {}
+    os.chdir(ROOT)
+    default_path = data_loader.DATA_PATH
+    with tempfile.TemporaryDirectory(prefix = 'mhdv-bench-') as workdir:
+        for n in sizes:
+            path = write_synthetic(n, os.path.join(workdir, f'survey_{n}.parquet'), default_path)
+            data_loader.DATA_PATH = path
+
+            data = load_data(path, columns = FUNCTION_COLUMNS)
+            for name, fn in FUNCTIONS.items():
+                r = measure(lambda: fn(data), repeat, cold = lambda: clear_caches(memos_only = True))
+                results[f'{name}@{n}'] = r
+                print(f"{name:<40} {n:>9,}  cold {r['cold_s']:8.4f}s  warm {r['warm_s']:8.4f}s  peak {r['peak_mb']:9.1f} MB")
+            del data
+
+            for page in PAGES if pages else []:
+                name = 'page:' + os.path.basename(page)
+                r = measure(lambda: run_page(page), repeat, cold = lambda: (clear_caches(), clear_figure_cache()))
+                results[f'{name}@{n}'] = r
+                print(f"{name:<40} {n:>9,}  cold {r['cold_s']:8.4f}s  warm {r['warm_s']:8.4f}s  peak {r['peak_mb']:9.1f} MB")
+
+            clear_caches()
+            data_loader.DATA_PATH = default_path
+    return results
+
+
+# absolute changes below these are treated as timer/allocator noise
+NOISE_FLOOR = {'cold_s': 0.005, 'warm_s': 0.005, 'peak_mb': 1.0}
+
+
+def compare(results, baseline, threshold):
+    #benchmarks whose cold/warm time or peak memory grew by more than threshold
+    regressions = []
+    for name, r in results.items():
+        base = baseline.get(name)
+        if base is None:
+            continue
+        for metric, floor in NOISE_FLOOR.items():
+            if r[metric] > base[metric]*(1 + threshold) and r[metric] - base[metric] > floor:
+                regressions.append((name, metric, base[metric], r[metric]))
+    return regressions
+
+
+def main(argv = None):
+    parser = argparse.ArgumentParser(description = __doc__, formatter_class = argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', type = int, nargs = '+', default = SIZES)
+    parser.add_argument('--repeat', type = int, default = 3, help = 'warm repetitions per benchmark')
+    parser.add_argument('--no-pages', action = 'store_true', help = 'only time the data_processing functions')
+    parser.add_argument('--output', default = None, help = 'write results to this JSON file')
+    parser.add_argument('--baseline', default = None, help = 'compare against this results file')
+    parser.add_argument('--threshold', type = float, default = 0.2, help = 'allowed relative slowdown (0.2 = 20%%)')
+    parser.add_argument('--save-baseline', default = None, help = 'store these results as the new baseline')
+    args = parser.parse_args(argv)
+
+    results = run(args.sizes, args.repeat, pages = not args.no_pages)
+    report = {'meta': {'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'), 'python': platform.python_version(),
+                       'numpy': np.__version__, 'pandas': pd.__version__, 'machine': platform.machine()},
+              'results': results}
+    for path in (args.output, args.save_baseline):
+        if path:
+            with open(path, 'w') as f:
+                json.dump(report, f, indent = 2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f)['results'], args.threshold)
+        for name, metric, before, after in regressions:
+            print(f'REGRESSION {name} {metric}: {before:.4f} -> {after:.4f} ({after/before - 1:+.0%})')
+        if regressions:
+            return 1
+        print(f'no regressions beyond {args.threshold:.0%}')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
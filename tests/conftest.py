@@ -0,0 +1,44 @@
+import os
+import sys
+import shutil
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+APP_DIR = os.path.join(ROOT, 'app')
+sys.path.insert(0, APP_DIR)
+
+import pandas as pd
+import data_loader
+from data_loader import load_data, clear_caches
+from figure_cache import clear_figure_cache
+
+
+@pytest.fixture(autouse = True)
+def fresh_caches():
+    #every test starts without loaded tables, memoized aggregates or cached figures
+    clear_caches()
+    clear_figure_cache()
+    yield
+    clear_caches()
+
+
+@pytest.fixture
+def survey():
+    #the survey table as the pages get it from the loader
+    return load_data()
+
+
+@pytest.fixture
+def raw_survey():
+    #the survey table as the original pages read it
+    return pd.read_csv(data_loader.DATA_PATH)
+
+
+@pytest.fixture
+def survey_copy(tmp_path, monkeypatch):
+    #a private copy of the survey csv the loader uses instead of the real one (no partitions)
+    path = str(tmp_path / 'data_full_app.csv')
+    shutil.copy(data_loader.DATA_PATH, path)
+    monkeypatch.setattr(data_loader, 'DATA_PATH', path)
+    monkeypatch.setattr(data_loader, 'WAVES_DIR', str(tmp_path / 'waves'))
+    return path
@@ -0,0 +1,149 @@
+import numpy as np
+import pandas as pd
+import pytest
+from aggregates import GROUPINGS, block_cube, block_shares, crosstab, level_counts, rank_pairs
+from bitsets import pack, popcount, and_counts
+from schema import QUESTIONS, MULTI_SELECT, LIKERT, SINGLE_CHOICE, RANK, columns_for
+
+BLOCKS = [q.key for q in QUESTIONS.values() if q.kind == MULTI_SELECT]
+CODED = [q.key for q in QUESTIONS.values() if q.kind in (LIKERT, RANK) or (q.kind == SINGLE_CHOICE and q.key not in GROUPINGS)]
+
+
+@pytest.fixture
+def resampled(survey):
+    #1000 respondents drawn from the survey (bitsets over several words), with answers
+    #knocked out at random
+    rng = np.random.default_rng(0)
+    d = survey.iloc[rng.integers(len(survey), size = 1000)].reset_index(drop = True)
+    columns = {}
+    for c in d.columns:
+        x = d[c]
+        if c not in GROUPINGS and x.dtype.kind in 'if':
+            x = x.astype('float32').mask(rng.random(len(d)) < 0.1)
+        columns[c] = x
+    return pd.DataFrame(columns)
+
+
+def _groups(data):
+    #(by, group) labels and row masks: everyone, then each level of each grouping
+    groups = [('All', 'All', np.ones(len(data), dtype = bool))]
+    for by in GROUPINGS:
+        groups += [(by, str(g), (data[by] == g).to_numpy()) for g in sorted(data[by].dropna().unique())]
+    return pd.MultiIndex.from_tuples([g[:2] for g in groups], names = ['by', 'group']), [g[2] for g in groups]
+
+
+def cube_reference(data, block):
+    #block_cube with pandas: picks, answers and respondents of every group
+    index, masks = _groups(data)
+    x = data[[c for c in QUESTIONS[block].columns if c in data.columns]]
+    return {'count': pd.DataFrame([x[m].eq(1).sum() for m in masks], index = index),
+            'answered': pd.DataFrame([x[m].notna().sum() for m in masks], index = index),
+            'size': pd.Series([m.sum() for m in masks], index = index)}
+
+
+@pytest.mark.parametrize('table', ['survey', 'resampled'])
+@pytest.mark.parametrize('block', BLOCKS)
+def test_block_cube_matches_pandas(request, table, block):
+    data = request.getfixturevalue(table)
+    cube, expected = block_cube(data, block), cube_reference(data, block)
+    for k in ('count', 'answered'):
+        pd.testing.assert_frame_equal(cube[k], expected[k], check_dtype = False, check_names = False)
+    pd.testing.assert_series_equal(cube['size'], expected['size'], check_dtype = False)
+
+
+def test_block_shares(survey):
+    picked = survey[list(QUESTIONS['barriers'].columns)].eq(1)
+    expected = 100*picked.groupby(survey['source'], observed = True).sum()
+    expected = expected.div(survey.groupby('source', observed = True).size(), axis = 0)
+    expected.index = expected.index.astype(str)
+    pd.testing.assert_frame_equal(block_shares(survey, 'barriers', 'source'), expected,
+                                  check_dtype = False, check_names = False)
+
+
+@pytest.mark.parametrize('table', ['survey', 'resampled'])
+@pytest.mark.parametrize('key', CODED)
+def test_level_counts_matches_pandas(request, table, key):
+    data = request.getfixturevalue(table)
+    t = level_counts(data, key)
+    index, masks = _groups(data)
+    assert t['groups'].equals(index)
+    assert t['levels'] == list(QUESTIONS[key].codes)
+    expected = np.array([[[(data.loc[m, c] == level).sum() for level in t['levels']] for c in t['items']]
+                         for m in masks])
+    np.testing.assert_array_equal(t['counts'], expected)
+
+
+@pytest.mark.parametrize('table', ['survey', 'resampled'])
+def test_rank_pairs_matches_pairwise_loop(request, table):
+    data = request.getfixturevalue(table)
+    t = rank_pairs(data, 'rank_support')
+    _, masks = _groups(data)
+    x = data[list(QUESTIONS['rank_support'].columns)].to_numpy(dtype = float)
+    x[~np.isin(x, list(QUESTIONS['rank_support'].codes))] = np.inf
+    m = x.shape[1]
+    expected = np.array([[[sum(a < b for a, b in zip(x[mask, i], x[mask, j])) for j in range(m)] for i in range(m)]
+                         for mask in masks])
+    np.testing.assert_array_equal(t['counts'], expected)
+
+
+@pytest.mark.parametrize('n', [1, 63, 64, 65, 1000])
+def test_bitset_counts(n):
+    rng = np.random.default_rng(n)
+    a, b = rng.random((3, n)) < 0.3, rng.random((4, n)) < 0.6
+    np.testing.assert_array_equal(popcount(pack(a)), a.sum(axis = 1))
+    np.testing.assert_array_equal(and_counts(pack(a), pack(b), chunk = 1), a.astype(int) @ b.T.astype(int))
+
+
+def test_memoized_cube_is_shared(survey):
+    data = survey[columns_for('source', 'fleet_type', 'turnover')]
+    assert block_cube(survey, 'turnover') is block_cube(survey, 'turnover')
+    assert block_cube(data, 'turnover') is not block_cube(data, 'turnover')
+
+
+def _attribute(raw, by):
+    #group label of every (respondent, group) pair of a respondent attribute, and the group
+    #labels in crosstab order: coded attributes (registered codes only) put a respondent in
+    #one group, multi-select ones in every group picked
+    q = QUESTIONS[by]
+    if q.kind == MULTI_SELECT:
+        return pd.concat([pd.Series(q.labels[c], index = raw.index[raw[c] == 1]) for c in q.shown()]), \
+            [q.labels[c] for c in q.shown()]
+    groups = raw[by].map({code: str(label).replace('<br>', ' ') for code, label in q.codes.items()}).dropna()
+    return groups, [str(l).replace('<br>', ' ') for c, l in q.codes.items() if (raw[by] == c).any()]
+
+
+def _pandas_crosstab(raw, question, by, denominator = 'size'):
+    #crosstab(data, question, by, denominator) computed with pd.crosstab, item by item
+    q = QUESTIONS[question]
+    groups, labels = _attribute(raw, by)
+    rows = raw.loc[groups.index]
+    if q.kind == MULTI_SELECT:
+        picked = True if denominator == 'size' else 1
+        shares = {}
+        for c in q.shown():
+            answers = rows[c].eq(1) if denominator == 'size' else rows[c]
+            table = pd.crosstab(groups.values, answers.values, normalize = 'index')
+            shares[q.labels.get(c, c)] = 100*table.reindex(columns = [picked], fill_value = 0)[picked]
+        expected = pd.DataFrame(shares)
+    else:
+        levels = list(q.codes)
+        parts = {}
+        for c in q.columns:
+            answered = rows[c].isin(levels).to_numpy()
+            table = pd.crosstab(groups.values[answered], rows[c].values[answered], normalize = 'index')
+            parts[q.labels.get(c, c)] = 100*table.reindex(columns = levels, fill_value = 0).rename(columns = q.codes)
+        expected = pd.concat(parts, axis = 1, names = [q.title or 'item', 'answer'])
+    return expected.reindex(labels)
+
+
+@pytest.mark.parametrize('by', ['fleet_size', 'regions'])
+@pytest.mark.parametrize('question, denominator', [('barriers', 'size'), ('barriers', 'answered'),
+                                                   ('decision_tools', 'size'), ('replace', 'size')])
+def test_crosstab_matches_pd_crosstab(survey, raw_survey, question, by, denominator):
+    got = crosstab(survey, question, by, denominator)
+    expected = _pandas_crosstab(raw_survey, question, by, denominator)
+    assert got.index.name == (QUESTIONS[by].title or by)
+    pd.testing.assert_frame_equal(got, expected, check_names = False, check_dtype = False,
+                                  check_index_type = False, check_column_type = False)
+    if question != 'barriers':
+        assert list(got.columns.names) == [QUESTIONS[question].title or 'item', 'answer']
@@ -0,0 +1,100 @@
+import json
+import threading
+import http.client
+import pandas as pd
+import pytest
+from api import make_server, clear_response_cache, cache_info
+from ingest import append_responses
+from schema import QUESTIONS
+
+
+@pytest.fixture(scope = 'module')
+def server():
+    server = make_server('127.0.0.1', 0, quiet = True)
+    thread = threading.Thread(target = server.serve_forever, daemon = True)
+    thread.start()
+    yield server.server_address[1]
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def get(server):
+    #status, headers and JSON body (None for an empty one) of a request to the server
+    clear_response_cache()
+
+    def get(path, method = 'GET', **headers):
+        connection = http.client.HTTPConnection('127.0.0.1', server, timeout = 60)
+        try:
+            connection.request(method, path, headers = headers)
+            response = connection.getresponse()
+            body = response.read()
+            return response.status, response.headers, json.loads(body) if body else None
+        finally:
+            connection.close()
+    return get
+
+
+def test_aggregate_has_an_etag(get):
+    status, headers, body = get('/v1/crosstab/barriers?by=fleet_type')
+    assert status == 200
+    assert headers['ETag'].startswith('"') and headers['X-Dataset-Version'] == body['dataset_version']
+    assert body['by'] == 'fleet_type' and len(body['percentages']) == len(body['groups'])
+    #the second request is answered from the response cache, with the same tag
+    assert get('/v1/crosstab/barriers?by=fleet_type')[1]['ETag'] == headers['ETag']
+    assert cache_info()['hits'] == 1
+
+
+@pytest.mark.parametrize('tag', ['{etag}', 'W/{etag}', '"other", {etag}', '*'])
+def test_if_none_match_gives_304(get, tag):
+    etag = get('/v1/likert/decision_tools')[1]['ETag']
+    for method in ('GET', 'HEAD'):
+        status, headers, body = get('/v1/likert/decision_tools', method, **{'If-None-Match': tag.format(etag = etag)})
+        assert (status, headers['ETag'], body) == (304, etag, None)
+    assert get('/v1/likert/decision_tools', **{'If-None-Match': '"other"'})[0] == 200
+
+
+def test_changed_wave_is_served_anew(get, survey_copy):
+    status, headers, body = get('/v1/ranks/rank_support')
+    assert status == 200
+    batch = pd.read_csv(survey_copy).iloc[:20].drop(columns = 'Unnamed: 0')
+    append_responses(batch.assign(id = [f'new_{i}' for i in range(len(batch))]), survey_copy)
+
+    status, changed, new = get('/v1/ranks/rank_support', **{'If-None-Match': headers['ETag']})
+    assert status == 200
+    assert changed['ETag'] != headers['ETag']
+    assert changed['X-Dataset-Version'] != headers['X-Dataset-Version']
+    assert sum(new['respondents']) > sum(body['respondents'])
+    #the stale response was dropped from the cache
+    assert cache_info()['entries'] == 1
+
+
+@pytest.mark.parametrize('path, status', [
+    ('/v1/crosstab/nothing', 404),
+    ('/v1/crosstab/id', 404),
+    ('/v1/crosstab/source', 404),
+    ('/v1/crosstab/fleet_type', 404),
+    ('/v1/crosstab/fleet_composition', 404),
+    ('/v1/crosstab/innovation_best', 404),
+    ('/v1/likert/barriers', 404),
+    ('/v1/ranks/decision_tools', 404),
+    ('/v1/nothing/barriers', 404),
+    ('/v2/waves', 404),
+    ('/v1/crosstab/barriers?wave=1900', 404),
+    ('/v1/crosstab/barriers?by=nothing', 400),
+    ('/v1/crosstab/barriers?denominator=nothing', 400),
+    ('/v1/crosstab/barriers?sort=1', 400),
+    ('/v1/likert/decision_tools?source=nothing', 400),
+    ('/v1/ranks/rank_support?source=nothing', 400),
+])
+def test_bad_requests(get, path, status):
+    got, headers, body = get(path)
+    assert (got, 'ETag' in headers) == (status, False)
+    assert body['error']
+
+
+@pytest.mark.parametrize('endpoint', ['crosstab', 'likert', 'ranks'])
+def test_no_question_is_an_internal_error(get, endpoint):
+    statuses = {key: get(f'/v1/{endpoint}/{key}')[0] for key in QUESTIONS}
+    assert set(statuses.values()) <= {200, 404}
+    assert any(status == 200 for status in statuses.values())
@@ -0,0 +1,26 @@
+import numpy as np
+import pytest
+import bootstrap
+from data_loader import clear_caches
+from bootstrap import bootstrap_counts, share_intervals
+
+
+def test_default_threshold_pools_the_rank_questions(survey, monkeypatch):
+    pooled = []
+    executor = bootstrap.ProcessPoolExecutor
+    monkeypatch.setattr(bootstrap, 'ProcessPoolExecutor', lambda *a, **k: pooled.append(1) or executor(*a, **k))
+    bootstrap_counts(survey, 'rank_support')
+    assert pooled
+
+
+@pytest.mark.parametrize('question', ['rank_support', 'barriers', 'decision_tools'])
+def test_pooled_and_in_process_intervals_are_identical(survey, monkeypatch, question):
+    results = []
+    for threshold in (0, float('inf')):
+        monkeypatch.setattr(bootstrap, 'POOL_THRESHOLD', threshold)
+        clear_caches(memos_only = True)
+        results.append((bootstrap_counts(survey, question, 300)['totals'], share_intervals(survey, question, n_boot = 300)))
+    (pooled, pooled_ci), (local, local_ci) = results
+    np.testing.assert_array_equal(pooled, local)
+    for bound in ('low', 'high'):
+        np.testing.assert_array_equal(pooled_ci[bound], local_ci[bound])
@@ -0,0 +1,58 @@
+import sys
+import subprocess
+import numpy as np
+import pandas as pd
+import pytest
+from conftest import APP_DIR
+from comments import COMMENTS_PATH, TOPIC_COLUMNS
+from comment_classifier import NO_THEME, classify, read_comments
+
+
+@pytest.fixture(scope = 'module')
+def seeds():
+    return read_comments(COMMENTS_PATH)
+
+
+def test_labelled_comments_keep_their_themes(seeds):
+    data = seeds.copy()
+    data.loc[:9, 'category1'], data.loc[:9, 'category2'] = 'Kept', 'Also kept'
+    data.loc[10:29, TOPIC_COLUMNS] = np.nan
+    out = classify(data, seeds)
+    assert (out.loc[:9, 'category1'] == 'Kept').all() and (out.loc[:9, 'category2'] == 'Also kept').all()
+    pd.testing.assert_frame_equal(out.iloc[30:], data.iloc[30:].astype({c: object for c in TOPIC_COLUMNS}))
+    themes = set(seeds['category1']) | {NO_THEME}
+    assert out.loc[10:29, 'category1'].isin(themes).all()
+    assert out.loc[10:29, 'category2'].dropna().isin(themes).all()
+
+    relabelled = classify(data, seeds, relabel = True)
+    assert relabelled['category1'].isin(themes).all()
+    assert not relabelled[TOPIC_COLUMNS].isin(['Kept', 'Also kept']).any(axis = None)
+
+
+def test_nothing_to_tag(seeds):
+    #every comment already labelled: the table comes back as it is
+    out = classify(seeds, seeds)
+    pd.testing.assert_frame_equal(out, seeds.astype({c: object for c in TOPIC_COLUMNS}))
+    assert classify(seeds.iloc[:0], seeds).empty
+
+
+def test_missing_and_empty_comments(seeds):
+    data = pd.DataFrame({'source': ['Other', 'Other', 'Fleet managers'],
+                         'comment': [np.nan, '', 'The total cost of ownership is misunderstood']})
+    out = classify(data, seeds)
+    assert list(out['category1'][:2]) == [NO_THEME, NO_THEME]
+    assert out['category2'][:2].isna().all()
+    assert out.loc[2, 'category1'] == 'Cost'
+
+
+def test_output_has_the_layout_of_text_df(seeds, tmp_path):
+    #comments with other columns and no themes yet, tagged from the command line
+    path = tmp_path / 'new.csv'
+    seeds[['comment', 'source']].assign(respondent = range(len(seeds))).iloc[:20].to_csv(path, index = False)
+    subprocess.run([sys.executable, 'comment_classifier.py', str(path)], cwd = APP_DIR, check = True, capture_output = True)
+    with open(COMMENTS_PATH, 'rb') as expected, open(path, 'rb') as got:
+        assert got.readline() == expected.readline()
+    out = read_comments(path)
+    assert list(out.columns) == list(seeds.columns)
+    assert out['category1'].notna().all()
+    pd.testing.assert_frame_equal(out[['source', 'comment']], seeds[['source', 'comment']].iloc[:20])
@@ -0,0 +1,120 @@
+import math
+import numpy as np
+import pandas as pd
+import pytest
+from comments import COMMENTS_PATH, TOPIC_COLUMNS, K1, B, CommentIndex, comment_index, tokenize
+
+
+@pytest.fixture(scope = 'module')
+def comments():
+    return pd.read_csv(COMMENTS_PATH, encoding = 'utf-8-sig')
+
+
+@pytest.fixture(scope = 'module')
+def index(comments):
+    return CommentIndex(comments)
+
+
+def _words(comments):
+    return comments['comment'].fillna('').map(tokenize)
+
+
+def _expected(comments, sources = None, topics = None, keywords = ''):
+    #row positions of the matching comments, from a pandas filter of the table
+    keep = pd.Series(True, index = comments.index)
+    if sources:
+        keep &= comments['source'].isin(sources)
+    if topics:
+        keep &= comments[TOPIC_COLUMNS].isin(topics).any(axis = 1)
+    for keyword in tokenize(keywords):
+        keep &= _words(comments).map(lambda words: any(w.startswith(keyword) for w in words))
+    return np.flatnonzero(keep)
+
+
+def _bm25(comments, keyword):
+    #BM25 score of every comment for one keyword prefix, word by matching word
+    words = _words(comments)
+    n, average = len(comments), words.str.len().mean()
+    scores = np.zeros(n)
+    for term in {w for ws in words for w in ws if w.startswith(keyword)}:
+        tf = words.map(lambda ws: ws.count(term))
+        idf = math.log(1 + (n - (tf > 0).sum() + .5)/((tf > 0).sum() + .5))
+        scores += (idf*tf*(K1 + 1)/(tf + K1*(1 - B + B*words.str.len()/average))).to_numpy()
+    return scores
+
+
+@pytest.mark.parametrize('sources, topics, keywords', [
+    (None, None, ''),
+    (['Fleet managers'], None, ''),
+    (['Owner-Operators', 'Other'], ['Cost'], ''),
+    (None, ['Maintenance'], ''),
+    (None, ['Regulation', 'Technology'], 'cost'),
+    (['Fleet managers'], ['Cost', 'Maintenance'], 'vehicle'),
+    (None, None, 'regul'),
+    (None, None, 'total cost'),
+    (['Nobody'], None, ''),
+    (None, None, 'zzzz'),
+])
+def test_query_matches_a_pandas_filter(comments, index, sources, topics, keywords):
+    rows, scores = index.query(sources, topics, keywords)
+    assert sorted(rows) == list(_expected(comments, sources, topics, keywords))
+    assert len(scores) == len(rows)
+
+
+def test_topics_match_either_category(comments, index):
+    #Maintenance is a second category more often than a first one
+    rows, _ = index.query(topics = ['Maintenance'])
+    assert set(rows) == set(np.flatnonzero(comments['category1'] == 'Maintenance')) | \
+        set(np.flatnonzero(comments['category2'] == 'Maintenance'))
+    assert (comments['category2'].iloc[rows] == 'Maintenance').any()
+
+
+def test_prefix_matches_every_longer_word(comments, index):
+    rows, _ = index.query(keywords = 'regul')
+    words = {w for ws in _words(comments).iloc[rows] for w in ws if w.startswith('regul')}
+    assert len(words) > 1
+    assert set(index.query(keywords = 'regulation')[0]) < set(rows)
+
+
+@pytest.mark.parametrize('keywords', ['cost', 'regul', 'maintenance cost'])
+def test_ranked_by_bm25(comments, index, keywords):
+    rows, scores = index.query(keywords = keywords)
+    expected = sum(_bm25(comments, k) for k in tokenize(keywords))
+    np.testing.assert_allclose(scores, expected[rows])
+    #best match first, ties in table order
+    assert list(rows) == sorted(rows, key = lambda r: (-round(expected[r], 9), r))
+
+
+@pytest.mark.parametrize('sort, descending', [(None, False), ('source', False), ('category1', True), ('length', True)])
+def test_pages_cover_the_sorted_result(comments, index, sort, descending):
+    rows, _ = index.query(topics = ['Cost'])
+    if sort is None:
+        expected = comments.iloc[rows]
+    else:
+        key = _words(comments).str.len() if sort == 'length' else comments[sort]
+        order = key.iloc[rows].rank(method = 'dense', na_option = 'bottom').to_numpy()
+        expected = comments.iloc[rows[np.argsort(-order if descending else order, kind = 'stable')]]
+    size = 10
+    pages = [index.page(rows, start, size, sort, descending) for start in range(0, len(rows), size)]
+    assert all(len(p) == size for p in pages[:-1]) and 0 < len(pages[-1]) <= size
+    assert len(pages[-1]) == len(rows) % size or len(rows) % size == 0
+    pd.testing.assert_frame_equal(pd.concat(pages), expected)
+
+
+def test_page_bounds(index):
+    rows, _ = index.query(sources = ['Owner-Operators'])
+    assert len(index.page(rows, len(rows) - 3, 10)) == 3
+    assert index.page(rows, len(rows), 10).empty
+    empty, scores = index.query(keywords = 'zzzz')
+    assert len(empty) == len(scores) == 0
+    assert index.page(empty, 0, 10, 'source').empty
+    assert list(index.page(empty).columns) == list(index.data.columns)
+
+
+def test_index_is_built_once_per_version(tmp_path, comments):
+    path = str(tmp_path / 'comments.csv')
+    comments.to_csv(path, index = False)
+    first = comment_index(path)
+    assert comment_index(path) is first
+    comments.iloc[:10].to_csv(path, index = False)
+    assert len(comment_index(path).data) == 10
@@ -0,0 +1,20 @@
+import data_loader
+from data_loader import load_data, unload
+from data_processing import scatter_comparison_data
+
+
+class _LockedScans(dict):
+    #the table cache, failing any scan of its entries made without data_loader._LOCK
+    def values(self):
+        assert data_loader._LOCK.locked(), 'loaded tables scanned without _LOCK'
+        return super().values()
+
+
+def test_loaded_tables_are_scanned_under_the_lock(survey_copy, monkeypatch):
+    monkeypatch.setattr(data_loader, '_CACHE', _LockedScans())
+    data = load_data(survey_copy)
+    scatter_comparison_data(data, 'turnover')
+    load_data(survey_copy, ['id', 'source'])
+    unload(survey_copy)
+    scatter_comparison_data(load_data(survey_copy), 'barriers')
+
@@ -0,0 +1,62 @@
+import numpy as np
+import pandas as pd
+import pytest
+import reference
+from data_processing import scatter_comparison_data, likert_data, timeline_data, ranking_data
+from data_loader import load_data
+from schema import GROUP_LABELS
+
+SOURCES = ['All'] + GROUP_LABELS
+
+
+@pytest.mark.parametrize('question', ['turnover', 'financial', 'barriers'])
+def test_scatter_comparison_data_matches_baseline(survey, raw_survey, question):
+    pd.testing.assert_frame_equal(scatter_comparison_data(survey, question),
+                                  reference.scatter_comparison_data(raw_survey, question))
+
+
+def test_scatter_comparison_data_unknown_question(survey):
+    assert scatter_comparison_data(survey, 'decision_tools') is None
+
+
+@pytest.mark.parametrize('question', ['decision_tools', 'innovation'])
+@pytest.mark.parametrize('source', GROUP_LABELS)
+def test_likert_data_matches_baseline(survey, raw_survey, question, source):
+    xdata, ydata, top_labels = likert_data(survey, question, source)
+    expected = reference.likert_data(raw_survey, question, source)
+    np.testing.assert_allclose(xdata, expected[0])
+    assert ydata == expected[1]
+    assert top_labels == expected[2]
+
+
+@pytest.mark.parametrize('question', ['replace', 'expand'])
+def test_timeline_data_matches_baseline(survey, raw_survey, question):
+    xdata, ydata, top_labels = timeline_data(survey, question)
+    expected = reference.timeline_data(raw_survey, question)
+    np.testing.assert_allclose(xdata, expected[0])
+    assert list(ydata) == list(expected[1])
+    assert top_labels == expected[2]
+
+
+@pytest.mark.parametrize('source', SOURCES)
+def test_ranking_data_matches_baseline(survey, raw_survey, source):
+    pd.testing.assert_frame_equal(ranking_data(survey, source), reference.ranking_data(raw_survey, source))
+
+
+def test_results_are_memoized_per_version(survey):
+    assert scatter_comparison_data(survey, 'turnover') is scatter_comparison_data(survey, 'turnover')
+    #frames not issued by the loader are computed every time
+    copy = survey[list(survey.columns)]
+    assert scatter_comparison_data(copy, 'turnover') is not scatter_comparison_data(copy, 'turnover')
+
+
+@pytest.mark.parametrize('source', SOURCES)
+def test_ranking_data_with_partial_rankings(survey_copy, source):
+    #respondents who ranked financial support but left technical support out still count
+    #in every item's denominator
+    raw = pd.read_csv(survey_copy)
+    partial = raw.index[raw['rank_support_financial'].notna()][::3][:30]
+    raw.loc[partial, 'rank_support_technical'] = np.nan
+    raw.to_csv(survey_copy, index = False)
+    pd.testing.assert_frame_equal(ranking_data(load_data(survey_copy), source),
+                                  reference.ranking_data(pd.read_csv(survey_copy), source))
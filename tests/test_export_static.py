@@ -0,0 +1,80 @@
+import os
+import html
+import json
+import pytest
+from charts import CHARTS
+from data_loader import waves
+from export_static import export_site, figure_file, omitted_states
+
+
+@pytest.fixture(scope = 'module')
+def site(tmp_path_factory):
+    out = str(tmp_path_factory.mktemp('site'))
+    export_site(out, workers = 1)
+    return out
+
+
+def _figure(site, file):
+    with open(os.path.join(site, file)) as f:
+        return json.load(f)
+
+
+def test_every_chart_state_is_exported(site):
+    with open(os.path.join(site, 'manifest.json')) as f:
+        manifest = json.load(f)
+    for (page, key), chart in CHARTS.items():
+        states = manifest['charts'][f'{page}/{key}']
+        assert len(states) == len(chart.states)
+        for i, state in enumerate(states):
+            assert state['file'] == figure_file(page, key, i)
+            assert os.path.exists(os.path.join(site, state['file']))
+            assert ('intervals_file' in state) == chart.intervals
+
+
+@pytest.mark.parametrize('page, key', [(page, key) for (page, key), chart in CHARTS.items() if chart.intervals])
+def test_interval_figures_have_error_bars(site, page, key):
+    figure = _figure(site, figure_file(page, key, 0, True))
+    assert any(trace.get(bar, {}).get('array') is not None or trace.get(bar, {}).get('arrayminus') is not None
+               for trace in figure['data'] for bar in ('error_x', 'error_y'))
+    assert not any(trace.get(bar, {}).get('array') is not None
+                   for trace in _figure(site, figure_file(page, key, 0))['data'] for bar in ('error_x', 'error_y'))
+
+
+def test_pages_offer_the_intervals_switch(site):
+    pages = {page for (page, _), chart in CHARTS.items() if chart.intervals}
+    for page in ('overview', 'turnover', 'renewal', 'comments'):
+        with open(os.path.join(site, f'{page}.html'), encoding = 'utf-8') as f:
+            assert ('id="intervals"' in f.read()) == (page in pages)
+
+
+def test_comment_table_is_exported_whole(site):
+    from comments import comment_index
+
+    comments = comment_index()
+    rows = comments.query(None, list(comments.data['category1'].dropna().unique()))[0]
+    with open(os.path.join(site, 'comments.html'), encoding = 'utf-8') as f:
+        page = f.read()
+    assert len(rows) > 25
+    assert f'Displaying all {len(rows)} comments.' in page and 'Displaying comments' not in page
+    table = page[page.index('<table'):page.index('</table>')]
+    assert table.count('<tr') == len(rows) + 1
+
+
+def test_omitted_states_are_listed(site):
+    with open(os.path.join(site, 'manifest.json')) as f:
+        omitted = json.load(f)['omitted']
+    assert omitted == omitted_states(waves())
+    assert set(omitted) == {'turnover', 'renewal', 'comments'}
+    for page, notes in omitted.items():
+        with open(os.path.join(site, f'{page}.html'), encoding = 'utf-8') as f:
+            footer = f.read().split('<footer>')[1]
+        assert all(html.escape(note) in footer for note in notes)
+    with open(os.path.join(site, 'overview.html'), encoding = 'utf-8') as f:
+        assert '<footer>' not in f.read()
+
+
+def test_other_waves_are_listed_as_omitted():
+    omitted = omitted_states(['Wave 1', 'Wave 2', 'Wave 3'])
+    for page in ('overview', 'turnover', 'renewal'):
+        assert 'Survey wave: only Wave 3 is exported, not Wave 1, Wave 2.' in omitted[page]
+    assert not any(note.startswith('Survey wave') for note in omitted['comments'])
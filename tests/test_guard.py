@@ -0,0 +1,71 @@
+import os
+import glob
+import pytest
+from conftest import ROOT, APP_DIR
+from data_loader import guard_shared_data, SharedDataError
+from charts import CHARTS, page_data
+
+PAGES = sorted(glob.glob(os.path.join(APP_DIR, 'pages', '*.py')))
+COPIES = {'copy': lambda d: d.copy(),
+          'melt': lambda d: d.melt(id_vars = 'source'),
+          'to_numpy': lambda d: d.to_numpy(),
+          'boolean filter': lambda d: d[d['source'] == 'Other'],
+          'loc rows': lambda d: d.loc[d['source'] == 'Other'],
+          'loc rows, every column': lambda d: d.loc[d['source'] == 'Other', :],
+          'iloc rows': lambda d: d.iloc[[0, 1]],
+          'query': lambda d: d.query('source == "Other"'),
+          'T': lambda d: d.T,
+          'transpose': lambda d: d.transpose()}
+CHANGES = {'new column': lambda d: d.__setitem__('x', 1),
+           'loc assignment': lambda d: d.loc.__setitem__((0, 'id'), 'x'),
+           'iloc assignment': lambda d: d.iloc.__setitem__((0, 0), 1),
+           'drop column': lambda d: d.pop('id')}
+SELECTIONS = {'columns': lambda d: d[['source', 'id']],
+              'loc rows of some columns': lambda d: d.loc[d['source'] == 'Other', ['id']],
+              'iloc columns': lambda d: d.iloc[:, [0, 1]],
+              'row slice': lambda d: d.iloc[:10],
+              'one row': lambda d: d.iloc[3]}
+
+
+@pytest.mark.parametrize('name', list(COPIES) + list(CHANGES))
+def test_guard_catches_copies_and_changes(survey, name):
+    with guard_shared_data(), pytest.raises(SharedDataError):
+        (COPIES.get(name) or CHANGES[name])(survey)
+
+
+@pytest.mark.parametrize('name', SELECTIONS)
+def test_guard_allows_column_selections(survey, name):
+    with guard_shared_data():
+        SELECTIONS[name](survey)
+        #other frames are not guarded
+        COPIES['loc rows'](survey[['source', 'id']])
+
+
+def test_values_are_read_only(survey):
+    with pytest.raises(ValueError):
+        survey['id'].to_numpy()[0] = 'x'
+
+
+def test_every_chart_state_under_guard():
+    with guard_shared_data():
+        for (page, key), chart in CHARTS.items():
+            if chart.path:
+                continue
+            data = page_data(page)
+            for state in chart.states:
+                chart.build(data, **state)
+                if chart.intervals:
+                    chart.build(data, intervals = True, **state)
+
+
+@pytest.mark.parametrize('script', PAGES, ids = os.path.basename)
+def test_pages_under_guard(monkeypatch, script):
+    from streamlit.testing.v1 import AppTest
+
+    #pages open their data files relative to the repository root
+    monkeypatch.chdir(ROOT)
+    with guard_shared_data():
+        at = AppTest.from_file(script, default_timeout = 600).run()
+        if 'intervals' in [t.key for t in at.sidebar.toggle]:
+            at.sidebar.toggle(key = 'intervals').set_value(True).run()
+    assert not at.exception, at.exception[0].value if at.exception else None
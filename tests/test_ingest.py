@@ -0,0 +1,94 @@
+import numpy as np
+import pandas as pd
+import pytest
+import aggregates
+from aggregates import GROUPINGS, block_cube, level_counts, rank_pairs
+from data_loader import load_data, frame_version, clear_caches
+from data_processing import scatter_comparison_data, likert_data, timeline_data, ranking_data, rank_summary
+from ingest import validate_batch, append_responses
+from schema import columns_for
+
+COLUMNS = columns_for('id', *GROUPINGS, 'turnover', 'barriers', 'decision_tools', 'replace', 'rank_support')
+
+
+def _batch(path, rows, first_id):
+    #respondents copied from the survey under new ids
+    batch = pd.read_csv(path).iloc[rows].drop(columns = 'Unnamed: 0')
+    return batch.assign(id = [f'new_{first_id + i}' for i in range(len(batch))])
+
+
+def _aggregates(data):
+    return {'cube': block_cube(data, 'turnover'), 'levels': level_counts(data, 'decision_tools'),
+            'timeline': level_counts(data, 'replace'), 'pairs': rank_pairs(data, 'rank_support'),
+            'scatter': scatter_comparison_data(data, 'barriers'),
+            'likert': likert_data(data, 'decision_tools', 'Owner-Operators'),
+            'replace': timeline_data(data, 'replace'), 'ranking': ranking_data(data, 'Other'),
+            'ranks': rank_summary(data, 'rank_support')}
+
+
+def _assert_same(a, b):
+    if isinstance(a, dict):
+        assert a.keys() == b.keys()
+        for k in a:
+            _assert_same(a[k], b[k])
+    elif isinstance(a, (tuple, list)):
+        assert len(a) == len(b)
+        for x, y in zip(a, b):
+            _assert_same(x, y)
+    elif isinstance(a, pd.DataFrame):
+        pd.testing.assert_frame_equal(a, b, check_dtype = False)
+    elif isinstance(a, pd.Series):
+        pd.testing.assert_series_equal(a, b, check_dtype = False)
+    elif isinstance(a, pd.Index):
+        assert a.equals(b)
+    else:
+        np.testing.assert_array_equal(a, b)
+
+
+@pytest.mark.parametrize('batches', [[range(0, 40)], [range(40, 45), range(160, 199)]])
+def test_append_updates_aggregates_like_a_recompute(survey_copy, monkeypatch, batches):
+    data = load_data(survey_copy, COLUMNS)
+    before = frame_version(data)
+    _aggregates(data)
+
+    sizes = []
+    packed = aggregates.packed_block
+    monkeypatch.setattr(aggregates, 'packed_block', lambda d, b: sizes.append(len(d)) or packed(d, b))
+    for i, rows in enumerate(batches):
+        sizes.clear()
+        append_responses(_batch(survey_copy, rows, 1000*i), survey_copy)
+        data = load_data(survey_copy, COLUMNS)
+        merged = _aggregates(data)
+    assert frame_version(data) != before
+    #the cubes of the extended table were merged from the batch's rows alone
+    assert sizes and set(sizes) == {len(batches[-1])}
+
+    clear_caches()
+    reread = load_data(survey_copy, COLUMNS)
+    pd.testing.assert_frame_equal(data, reread, check_dtype = False, check_categorical = False)
+    _assert_same(merged, _aggregates(reread))
+
+
+def test_append_with_missing_groups(survey_copy):
+    #a batch of owner-operators only, without a fleet type: groups absent from the batch
+    #keep their counts
+    data = load_data(survey_copy, COLUMNS)
+    _aggregates(data)
+    batch = _batch(survey_copy, range(len(data)), 0)
+    batch = batch[batch['source'] == 'Owner-Operators'].assign(fleet_type = np.nan)
+    append_responses(batch, survey_copy)
+    merged = _aggregates(load_data(survey_copy, COLUMNS))
+    clear_caches()
+    _assert_same(merged, _aggregates(load_data(survey_copy, COLUMNS)))
+
+
+def test_validate_batch_rejects_bad_rows(survey_copy):
+    batch = _batch(survey_copy, range(3), 0)
+    batch.loc[0, 'turnover_priorities_1'] = 2
+    batch.loc[1, 'id'] = load_data(survey_copy, ['id'])['id'][0]
+    batch.loc[2, 'rank_support_financial'] = batch.loc[2, 'rank_support_technical']
+    with pytest.raises(ValueError) as error:
+        validate_batch(batch.assign(unknown = 1), survey_copy)
+    message = str(error.value)
+    for problem in ('unknown columns: unknown', 'id: already in the survey in rows 1', 'turnover: not 0/1 in rows 0'):
+        assert problem in message
@@ -0,0 +1,43 @@
+import os
+import sys
+import subprocess
+import pandas as pd
+import innovation_keywords
+from conftest import ROOT, APP_DIR
+from data_loader import DATA_PATH, INNOVATION_PATH, file_version
+from innovation_keywords import SYNONYMS, output_path, innovation_table, write_innovation_table, compile_synonyms, normalize
+
+
+def test_default_output_is_per_wave_in_the_app_directory(survey_copy, tmp_path, monkeypatch):
+    assert os.path.dirname(innovation_keywords.OUTPUT_DIR) == os.path.dirname(INNOVATION_PATH)
+    monkeypatch.setattr(innovation_keywords, 'OUTPUT_DIR', str(tmp_path / 'innovation_keywords'))
+    version = file_version(INNOVATION_PATH)
+    for cwd in (ROOT, APP_DIR):
+        monkeypatch.chdir(cwd)
+        path = write_innovation_table()
+        assert path == output_path('Wave 1') == str(tmp_path / 'innovation_keywords' / 'Wave 1.csv')
+    pd.testing.assert_frame_equal(pd.read_csv(path), innovation_table(survey_copy))
+    assert file_version(INNOVATION_PATH) == version
+
+
+def test_table_has_the_shape_of_the_hand_coded_one():
+    table, coded = innovation_table(DATA_PATH), pd.read_csv(INNOVATION_PATH)
+    assert list(table.columns) == list(coded.columns)
+    pd.testing.assert_frame_equal(table[['Category', 'Innovation']], coded[['Category', 'Innovation']])
+    #shares of a group's mentions add up to 100 per question
+    for _, shares in table.groupby('Category'):
+        assert ((shares[['FM', 'OO', 'Other']].sum() - 100).abs() < 1).all()
+
+
+def test_synonyms_match_whole_normalized_words():
+    pattern = compile_synonyms(SYNONYMS)
+    text = normalize(pd.Series(["A.I. and EV's", 'Self-driving trucks', 'evening routes', 'Camions électriques']))
+    found = [[list(SYNONYMS)[int(m.lastgroup[1:])] for m in pattern.finditer(t)] for t in text]
+    assert found == [['ai', 'electric/ev/evs'], ['autonomous/self-driving'],
+                     ['improved GPS + route planning/optimization'], ['electric/ev/evs']]
+
+
+def test_import_does_not_load_the_charts():
+    code = 'import sys, innovation_keywords; print("charts" in sys.modules, "streamlit" in sys.modules)'
+    out = subprocess.run([sys.executable, '-c', code], cwd = APP_DIR, capture_output = True, text = True, check = True)
+    assert out.stdout.split() == ['False', 'False']
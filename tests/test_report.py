@@ -0,0 +1,74 @@
+import os
+import shutil
+import pandas as pd
+import pytest
+import data_loader
+import report
+from aggregates import level_counts
+from charts import page_data
+from data_loader import DATA_PATH, dataset_version, frame_version, clear_caches
+from report import build_report, read_bundle, bundle_dir
+from test_ingest import _assert_same
+
+
+@pytest.fixture(scope = 'module')
+def bundle(tmp_path_factory):
+    #report bundle of the survey (with intervals), and its dataset version
+    out = str(tmp_path_factory.mktemp('reports'))
+    folder, n = build_report(out, workers = 2)
+    assert n and os.path.exists(os.path.join(folder, 'manifest.json'))
+    return out, dataset_version(DATA_PATH)
+
+
+def _served(data, version, question = 'decision_tools'):
+    #level_counts of data, and whether it came from the bundle of version
+    key = (version, tuple(data.columns), (question,), ())
+    result = level_counts(data, question)
+    return result, result is data_loader._bundled(version).get('aggregates.level_counts', {}).get(key)
+
+
+def test_bundle_round_trip(bundle):
+    out, version = bundle
+    stored = read_bundle(out, version)
+    #the aggregates of every chart state, computed here as the pages compute them
+    computed = {}
+    for task in report.report_tasks():
+        for name, key, result in report._aggregate(task, None):
+            computed.setdefault(name, {})[key] = result
+    assert stored.keys() == computed.keys()
+    for name in computed:
+        assert stored[name].keys() == computed[name].keys()
+        for key, result in computed[name].items():
+            _assert_same(result, stored[name][key])
+
+
+def test_memoized_results_are_served_from_the_bundle(bundle, monkeypatch):
+    out, version = bundle
+    monkeypatch.setattr(data_loader, 'REPORT_BUNDLE', out)
+    clear_caches()
+    data = page_data('turnover')
+    assert frame_version(data) == version
+    assert _served(data, version)[1]
+
+
+def test_bundle_of_another_version_is_ignored(bundle, survey_copy, monkeypatch):
+    out, version = bundle
+    monkeypatch.setattr(data_loader, 'REPORT_BUNDLE', out)
+    #the copy of the survey is served from the bundle until it changes
+    assert _served(page_data('turnover'), version)[1]
+    pd.read_csv(survey_copy).iloc[:5].to_csv(survey_copy, mode = 'a', header = False, index = False)
+    data = page_data('turnover')
+    changed = frame_version(data)
+    assert changed != version
+
+    #a bundle in the new version's folder, left there by the old version, is not read either
+    shutil.copytree(bundle_dir(out, version), bundle_dir(out, changed))
+    assert read_bundle(out, changed) == {}
+    counts, served = _served(data, version)
+    assert not served and not _served(data, changed)[1]
+
+    monkeypatch.setattr(data_loader, 'REPORT_BUNDLE', None)
+    clear_caches(memos_only = True)
+    _assert_same(counts, level_counts(data, 'decision_tools'))
+    stale = read_bundle(out, version)['aggregates.level_counts']
+    assert counts['counts'].sum() > stale[(version, tuple(data.columns), ('decision_tools',), ())]['counts'].sum()
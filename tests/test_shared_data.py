@@ -0,0 +1,105 @@
+import gc
+import os
+import sys
+import time
+import uuid
+import subprocess
+import numpy as np
+import pandas as pd
+import pytest
+import data_loader
+import shared_data
+from conftest import APP_DIR
+from aggregates import block_cube, level_counts
+from data_loader import load_data, frame_version, clear_caches
+
+
+def _published(name, path, other_than = None, timeout = 60):
+    #{'version', 'segment'} of the table at path once the publisher lists it (in another version)
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        table = shared_data.published(name).get(os.path.abspath(path))
+        if table is not None and table['version'] != other_than:
+            return table
+        time.sleep(0.05)
+    raise TimeoutError(f'{path} was not published')
+
+
+@pytest.fixture
+def publisher(survey_copy, tmp_path, monkeypatch):
+    #shared_data.py publishing the survey copy, checked for changes every 0.1s; dashboard
+    #loads in this process attach to it
+    name = f'mhdv-test-{uuid.uuid4().hex[:8]}'
+    env = dict(os.environ, MHDV_DATA_PATH = survey_copy, MHDV_WAVES_DIR = str(tmp_path / 'waves'))
+    process = subprocess.Popen([sys.executable, 'shared_data.py', '--name', name, '--interval', '0.1'],
+                               cwd = APP_DIR, env = env, stderr = subprocess.DEVNULL)
+    try:
+        _published(name, survey_copy)
+        monkeypatch.setattr(data_loader, 'SHARED_DATA', name)
+        yield name
+    finally:
+        clear_caches()
+        process.terminate()
+        process.wait(30)
+
+
+def _attached_segment(path):
+    return data_loader._CACHE[(path, None)].get('segment')
+
+
+def test_load_data_attaches_the_published_table(survey_copy, publisher, monkeypatch):
+    table = _published(publisher, survey_copy)
+    monkeypatch.setattr(data_loader, 'SHARED_DATA', None)
+    expected = shared_data._shareable(load_data(survey_copy))
+    cube, levels = block_cube(expected, 'turnover'), level_counts(expected, 'decision_tools')
+    clear_caches()
+
+    monkeypatch.setattr(data_loader, 'SHARED_DATA', publisher)
+    data = load_data(survey_copy)
+    assert _attached_segment(survey_copy).name == table['segment']
+    assert frame_version(data) == table['version']
+    pd.testing.assert_frame_equal(data, expected)
+    #column arrays are read-only views of the shared pages
+    values = data['turnover_priorities_1'].to_numpy()
+    assert not values.flags.writeable
+    with pytest.raises(ValueError):
+        values[0] = 1
+    #any projection is the whole attached table
+    assert load_data(survey_copy, ['id', 'source']) is data
+
+    #the cubes come with the table, computed by the publisher
+    key = (table['version'], tuple(data.columns), ('turnover',), ())
+    assert block_cube(data, 'turnover') is data_loader._PUBLISHED[table['version']]['aggregates.block_cube'][key]
+    for k in ('count', 'answered'):
+        pd.testing.assert_frame_equal(block_cube(data, 'turnover')[k], cube[k], check_dtype = False)
+    np.testing.assert_array_equal(level_counts(data, 'decision_tools')['counts'], levels['counts'])
+
+
+def test_republish_replaces_and_releases_the_segment(survey_copy, publisher):
+    first = _published(publisher, survey_copy)
+    data = load_data(survey_copy)
+    old, n = _attached_segment(survey_copy), len(data)
+    assert old.name == first['segment']
+    del data
+    clear_caches(memos_only = True)
+
+    pd.read_csv(survey_copy).iloc[:5].to_csv(survey_copy, mode = 'a', header = False, index = False)
+    second = _published(publisher, survey_copy, other_than = first['version'])
+    assert second['segment'] != first['segment']
+    #the publisher removed the old segment once the header pointed at the new one
+    deadline = time.monotonic() + 10
+    while time.monotonic() < deadline:
+        try:
+            shared_data._open(first['segment']).close()
+        except FileNotFoundError:
+            break
+        time.sleep(0.05)
+    else:
+        pytest.fail('the old segment was not removed')
+
+    gc.collect()
+    data = load_data(survey_copy)
+    assert frame_version(data) == second['version'] and len(data) == n + 5
+    assert _attached_segment(survey_copy).name == second['segment']
+    #nothing here uses the old segment any more: it is closed, not kept for later
+    assert old.buf is None and old not in shared_data._RETIRED
@@ -0,0 +1,86 @@
+import os
+import threading
+import pandas as pd
+import pytest
+import data_processing
+from data_loader import load_data, load_wave, write_wave, waves, wave_aggregate_path
+from data_processing import scatter_comparison_data, likert_data, timeline_data, wave_comparison
+
+
+def test_latest_wave_without_data(survey_copy):
+    data = load_data(survey_copy)
+    pd.testing.assert_frame_equal(scatter_comparison_data(question = 'barriers'), scatter_comparison_data(data, 'barriers'))
+    for got, expected in zip(likert_data(question = 'innovation', source = 'Other'), likert_data(data, 'innovation', 'Other')):
+        assert list(map(list, got)) == list(map(list, expected))
+    assert timeline_data()[0].tolist() == timeline_data(data, 'replace')[0].tolist()
+
+
+@pytest.fixture
+def two_waves(survey_copy, tmp_path):
+    #Wave 1: the survey; Wave 2: its first 120 respondents
+    write_wave('Wave 1', survey_copy)
+    second = str(tmp_path / 'second.csv')
+    pd.read_csv(survey_copy).iloc[:120].to_csv(second, index = False)
+    write_wave('Wave 2', second)
+    return waves()
+
+
+@pytest.mark.parametrize('question', ['barriers', 'innovation', 'replace'])
+def test_wave_comparison_is_stored_per_wave(two_waves, monkeypatch, question):
+    assert two_waves == ['Wave 1', 'Wave 2']
+    first = wave_comparison(question)
+    for wave in two_waves:
+        assert os.path.exists(wave_aggregate_path(wave, f'{question}.source'))
+        part = first[first['wave'] == wave].drop(columns = 'wave').reset_index(drop = True)
+        pd.testing.assert_frame_equal(part, data_processing._wave_shares(wave, question, 'source'), check_dtype = False)
+
+    #later comparisons read the stored percentages, not the partitions
+    def no_loads(*args, **kwargs):
+        raise AssertionError('a partition was read')
+    monkeypatch.setattr(data_processing, 'load_wave', no_loads)
+    pd.testing.assert_frame_equal(wave_comparison(question), first)
+
+
+def test_wave_comparison_follows_a_changed_wave(two_waves, tmp_path):
+    before = wave_comparison('turnover')
+    old = wave_aggregate_path('Wave 2', 'turnover.source')
+    second = str(tmp_path / 'second.csv')
+    pd.read_csv(second).iloc[:60].to_csv(second, index = False)
+    write_wave('Wave 2', second)
+    after = wave_comparison('turnover')
+    assert wave_aggregate_path('Wave 2', 'turnover.source') != old and not os.path.exists(old)
+    pd.testing.assert_frame_equal(after[after['wave'] == 'Wave 1'], before[before['wave'] == 'Wave 1'])
+    expected = data_processing._wave_shares('Wave 2', 'turnover', 'source').assign(wave = 'Wave 2')
+    pd.testing.assert_frame_equal(after[after['wave'] == 'Wave 2'].reset_index(drop = True),
+                                  expected[after.columns], check_dtype = False)
+    assert len(load_wave('Wave 2', ['id'])) == 60
+
+
+def test_data_and_wave_together_are_rejected(two_waves):
+    with pytest.raises(ValueError):
+        scatter_comparison_data(load_wave('Wave 1'), 'barriers', wave = 'Wave 2')
+
+
+def test_concurrent_stores_of_an_aggregate(two_waves):
+    path = wave_aggregate_path('Wave 1', 'turnover.source')
+    d = data_processing._wave_shares('Wave 1', 'turnover', 'source')
+    threads = [threading.Thread(target = data_processing._store_aggregate, args = (path, d)) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    pd.testing.assert_frame_equal(pd.read_parquet(path), d)
+    assert os.listdir(os.path.dirname(path)) == [os.path.basename(path)]
+
+
+def test_failed_store_keeps_older_versions(two_waves, monkeypatch):
+    wave_comparison('turnover')
+    stored = wave_aggregate_path('Wave 1', 'turnover.source')
+    folder = os.path.join(os.path.dirname(os.path.dirname(stored)), 'newer')
+
+    def full_disk(self, path, **kwargs):
+        raise OSError('no space left on device')
+    monkeypatch.setattr(pd.DataFrame, 'to_parquet', full_disk)
+    data_processing._store_aggregate(os.path.join(folder, 'turnover.source.parquet'), pd.DataFrame())
+    assert os.path.exists(stored)
+    assert os.listdir(folder) == []